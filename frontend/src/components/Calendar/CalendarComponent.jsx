@@ -1,6 +1,9 @@
 import { useState, useEffect } from 'react';
 import { Calendar, dateFnsLocalizer } from "react-big-calendar";
-import { format, parse, getDay, startOfWeek } from 'date-fns';
+import {
+    format, parse, getDay, startOfWeek, endOfWeek,
+    startOfMonth, endOfMonth, startOfDay, addDays
+} from 'date-fns';
 import { enUS } from 'date-fns/locale';
 import { useAuth } from '../../contexts/AuthContext';
 import TaskModal from '../../components/TaskModal/TaskModal';
@@ -18,8 +21,24 @@ const localizer = dateFnsLocalizer({
     locales
 });
 
+// The dates a view shows around `date`, as [start, end)
+const visibleRange = (view, date) => {
+    switch (view) {
+        case 'month':
+            return [startOfWeek(startOfMonth(date)), startOfDay(addDays(endOfWeek(endOfMonth(date)), 1))];
+        case 'week':
+        case 'work_week':
+            return [startOfWeek(date), addDays(startOfWeek(date), 7)];
+        case 'day':
+            return [startOfDay(date), addDays(startOfDay(date), 1)];
+        default:
+            // Agenda lists 30 days from the date
+            return [startOfDay(date), addDays(startOfDay(date), 30)];
+    }
+};
+
 export default function CalendarPage() {
-    const { fetchWithAuth, API_URL } = useAuth();
+    const { fetchAllPages, API_URL } = useAuth();
     const [tasks, setTasks] = useState([]);
     const [view, setView] = useState('month');
     const [date, setDate] = useState(new Date());
@@ -63,15 +82,20 @@ export default function CalendarPage() {
 
     useEffect(() => {
         fetchTasks();
-    }, []);
+    }, [view, date]);
 
     const fetchTasks = async () => {
         try {
-            const response = await fetchWithAuth(`${API_URL}/api/tasks`);
-            const data = await response.json();
+            // Only fetch the visible range, recurring tasks are expanded within it
+            const [rangeStart, rangeEnd] = visibleRange(view, date);
+            const params = new URLSearchParams({
+                start: rangeStart.toISOString(),
+                end: rangeEnd.toISOString(),
+            });
+            const tasks = await fetchAllPages(`${API_URL}/api/tasks?${params}`, 'tasks');
 
             // Convert task dates from strings to Date objects
-            const formattedTasks = data.tasks.map(task => ({
+            const formattedTasks = tasks.map(task => ({
                 ...task,
                 start: new Date(task.start),
                 end: new Date(task.end),
@@ -1,11 +1,12 @@
 import { useState, useEffect } from "react";
 import { useAuth } from "../../contexts/AuthContext";
+import { subscribeToEvents } from "../../events";
 import "./PointsCounter.css";
 
 import pomTreatsIcon from "../../assets/icons/Pom_Treats_Icon.png";
 
 export default function PointsCounter() {
-  const { fetchWithAuth, API_URL } = useAuth();
+  const { fetchWithAuth, API_URL, token } = useAuth();
   const [dailyPoints, setDailyPoints] = useState(0);
   const [loading, setLoading] = useState(true);
   const DAILY_LIMIT = 50;
@@ -13,13 +14,22 @@ export default function PointsCounter() {
   useEffect(() => {
     fetchDailyPoints();
 
-    // Poll for updates every 5 seconds for live updates
-    const interval = setInterval(fetchDailyPoints, 5000);
+    // The server pushes every change; poll every 5 seconds only if it can't
+    let interval = null;
+    const unsubscribe = subscribeToEvents(
+      API_URL,
+      token,
+      { points: (data) => setDailyPoints(data.daily_points) },
+      () => {
+        interval = setInterval(fetchDailyPoints, 5000);
+      }
+    );
 
     return () => {
+      unsubscribe();
       clearInterval(interval);
     };
-  }, []);
+  }, [token]);
 
   const fetchDailyPoints = async () => {
     try {
@@ -99,6 +99,22 @@ export const AuthProvider = ({ children }) => {
     return response;
   };
 
+  // GET every page of a paginated list (`key` is the list's field), following next_cursor
+  const fetchAllPages = async (url, key) => {
+    const items = [];
+    let cursor = null;
+    do {
+      const pageUrl = new URL(url, window.location.origin);
+      if (cursor) pageUrl.searchParams.set('cursor', cursor);
+      const response = await fetchWithAuth(pageUrl.toString());
+      const data = await response.json();
+      if (!response.ok) throw new Error(data.error || `Request failed: ${response.status}`);
+      items.push(...data[key]);
+      cursor = data.next_cursor;
+    } while (cursor);
+    return items;
+  };
+
   const value = {
     user,
     token,
@@ -107,6 +123,7 @@ export const AuthProvider = ({ children }) => {
     login,
     logout,
     fetchWithAuth,
+    fetchAllPages,
     API_URL,
   };
 
@@ -97,12 +97,18 @@ export const SettingsProvider = ({ children }) => {
     }
   };
 
+  // Uploaded images are stored server-side and referenced by an API path
+  const getBackgroundImageUrl = () =>
+    settings.background_value?.startsWith("/")
+      ? `${API_URL}${settings.background_value}`
+      : settings.background_value;
+
   const getBackgroundStyle = () => {
     if (settings.background_type === "gradient") {
       return gradients[settings.background_value] || gradients["gradient-1"];
     } else if (settings.background_type === "image") {
       return {
-        backgroundImage: `url(${settings.background_value})`,
+        backgroundImage: `url(${getBackgroundImageUrl()})`,
         backgroundSize: "cover",
         backgroundPosition: "center",
         backgroundAttachment: "fixed",
@@ -117,6 +123,7 @@ export const SettingsProvider = ({ children }) => {
     updateSettings,
     uploadBackgroundImage,
     getBackgroundStyle,
+    getBackgroundImageUrl,
     toggleDarkMode,
   };
 
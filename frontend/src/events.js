@@ -0,0 +1,68 @@
+// Server-sent events from GET /api/events. Read with fetch rather than
+// EventSource so the token goes in the Authorization header, not the URL.
+const RETRY_MS = 5000;
+
+/**
+ * Calls handlers[eventName](data) for the user's push events until the
+ * returned function is called. Reconnects when the stream drops; calls
+ * onUnavailable once if the server answers with an error instead (e.g.
+ * plain Flask, which has no event stream), so callers can fall back to
+ * polling.
+ */
+export const subscribeToEvents = (API_URL, token, handlers, onUnavailable) => {
+  let stopped = false;
+  let controller = null;
+  let retryTimer = null;
+
+  const dispatch = (frame) => {
+    let event = "message";
+    let data = "";
+    for (const line of frame.split("\n")) {
+      if (line.startsWith("event: ")) event = line.slice(7);
+      else if (line.startsWith("data: ")) data += line.slice(6);
+    }
+    if (data && handlers[event]) {
+      handlers[event](JSON.parse(data));
+    }
+  };
+
+  const connect = async () => {
+    controller = new AbortController();
+    try {
+      const response = await fetch(`${API_URL}/api/events`, {
+        headers: { Authorization: `Bearer ${token}` },
+        signal: controller.signal,
+      });
+      if (!response.ok) {
+        // No stream here (or no longer a valid session): stop retrying
+        stopped = true;
+        if (onUnavailable) onUnavailable();
+        return;
+      }
+
+      const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+      let buffer = "";
+      while (!stopped) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += value;
+        let end;
+        while ((end = buffer.indexOf("\n\n")) !== -1) {
+          dispatch(buffer.slice(0, end));
+          buffer = buffer.slice(end + 2);
+        }
+      }
+    } catch (error) {
+      if (!stopped) console.error("Event stream error:", error);
+    }
+    if (!stopped) retryTimer = setTimeout(connect, RETRY_MS);
+  };
+
+  if (token) connect();
+
+  return () => {
+    stopped = true;
+    clearTimeout(retryTimer);
+    if (controller) controller.abort();
+  };
+};
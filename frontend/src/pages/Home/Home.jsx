@@ -11,7 +11,7 @@ import taskIcon from "../../assets/icons/Task_Icon.png";
 import pomTreatsIcon from "../../assets/icons/Pom_Treats_Icon.png";
 
 export default function Home() {
-  const { user, fetchWithAuth, API_URL } = useAuth();
+  const { user, fetchAllPages, API_URL } = useAuth();
   const [weekTasks, setWeekTasks] = useState([]);
   const [loading, setLoading] = useState(true);
 
@@ -21,10 +21,6 @@ export default function Home() {
 
   const fetchWeekTasks = async () => {
     try {
-      const response = await fetchWithAuth(`${API_URL}/api/tasks`);
-      const data = await response.json();
-
-      // Filter tasks for this week that aren't completed
       const now = new Date();
       const weekStart = new Date(now);
       weekStart.setDate(now.getDate() - now.getDay()); // Start of week (Sunday)
@@ -33,7 +29,15 @@ export default function Home() {
       const weekEnd = new Date(weekStart);
       weekEnd.setDate(weekStart.getDate() + 7);
 
-      const thisWeekTasks = data.tasks
+      // Only fetch this week's tasks
+      const params = new URLSearchParams({
+        start: weekStart.toISOString(),
+        end: weekEnd.toISOString(),
+      });
+      const tasks = await fetchAllPages(`${API_URL}/api/tasks?${params}`, 'tasks');
+
+      // Filter tasks for this week that aren't completed
+      const thisWeekTasks = tasks
         .filter((task) => {
           const taskDate = new Date(task.start);
           return taskDate >= weekStart && taskDate < weekEnd && !task.completed;
@@ -1,6 +1,7 @@
 import { useState, useEffect } from "react";
 import { Modal, Button } from "react-bootstrap";
 import { useAuth } from "../../contexts/AuthContext";
+import { subscribeToEvents } from "../../events";
 import GACHA_ART, { DEFAULT_ART } from "../../components/Gacha/GachaArt";
 import "./Leaderboard.css";
 
@@ -30,7 +31,7 @@ const CHARACTER_RARITY = {
 };
 
 export default function Leaderboard() {
-  const { fetchWithAuth, API_URL, user } = useAuth();
+  const { fetchWithAuth, API_URL, user, token } = useAuth();
   const [friends, setFriends] = useState([]);
   const [leaderboard, setLeaderboard] = useState([]);
   const [searchEmail, setSearchEmail] = useState("");
@@ -53,6 +54,23 @@ export default function Leaderboard() {
     loadFriendsAndLeaderboard();
   }, []);
 
+  // Reload the board when a friend's ranking changes
+  useEffect(() => {
+    return subscribeToEvents(API_URL, token, {
+      friend_ranking: refreshLeaderboard,
+    });
+  }, [token]);
+
+  const refreshLeaderboard = async () => {
+    try {
+      const response = await fetchWithAuth(`${API_URL}/api/friends/leaderboard`);
+      const data = await response.json();
+      setLeaderboard(data.leaderboard || []);
+    } catch (error) {
+      console.error("Error refreshing leaderboard:", error);
+    }
+  };
+
   const loadFriendsAndLeaderboard = async () => {
     setLoading(true);
     try {
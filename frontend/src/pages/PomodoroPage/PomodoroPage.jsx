@@ -75,10 +75,7 @@ const PomodoroPage = () => {
         `${API_URL}/api/pomodoro/complete`,
         {
           method: "POST",
-          body: JSON.stringify({
-            duration_minutes: duration,
-            session_type: currentSessionType,
-          }),
+          body: JSON.stringify({}),
         }
       );
 
@@ -111,6 +108,10 @@ const PomodoroPage = () => {
         } else {
           switchToBreak();
         }
+      } else {
+        const data = await response.json();
+        showNotification(data.error || "Failed to save session", "error");
+        switchToWork();
       }
     } catch (error) {
       console.error("Failed to save session:", error);
@@ -137,20 +138,48 @@ const PomodoroPage = () => {
     }
   };
 
-  const startTimer = () => {
+  // Work sessions are timed by the server too: it only awards points for
+  // a timer that has really run out
+  const timerRequest = async (path, method = "POST", body = undefined) => {
+    try {
+      const response = await fetchWithAuth(`${API_URL}/api/pomodoro/timer${path}`, {
+        method,
+        body: body && JSON.stringify(body),
+      });
+      return response.ok;
+    } catch (error) {
+      console.error("Timer request failed:", error);
+      return false;
+    }
+  };
+
+  const startTimer = async () => {
+    if (sessionType === "work") {
+      const fresh = timeLeft === workDuration * 60;
+      const ok = fresh
+        ? await timerRequest("/start", "POST", { duration_minutes: workDuration })
+        : await timerRequest("/resume");
+      if (!ok) {
+        showNotification("Could not start the timer", "error");
+        return;
+      }
+    }
     setIsActive(true);
   };
 
   const pauseTimer = () => {
     setIsActive(false);
+    if (sessionType === "work") timerRequest("/pause");
   };
 
   const resetTimer = () => {
     setIsActive(false);
     setTimeLeft(getCurrentDuration() * 60);
+    if (sessionType === "work") timerRequest("", "DELETE");
   };
 
   const switchToWork = () => {
+    timerRequest("", "DELETE");
     setSessionType("work");
     setTimeLeft(workDuration * 60);
     setIsActive(false);
@@ -51,33 +51,25 @@ export default function ProfileSettings() {
   const [loading, setLoading] = useState(true);
 
   useEffect(() => {
-    fetchCollection();
-    fetchDisplayedCharacters();
+    fetchProfile();
     fetchPomodoroSessions();
-    fetchUser();
   }, []);
 
-  const fetchUser = async () => {
+  // Stats, collection and displayed characters in one request
+  const fetchProfile = async () => {
     try {
-      const response = await fetchWithAuth(`${API_URL}/api/profile/stats`);
+      const response = await fetchWithAuth(
+        `${API_URL}/api/dashboard?sections=stats,collection,displayed_characters`
+      );
       const data = await response.json();
 
       setStats((prev) => ({
         ...prev,
-        level: data.level,
-        experience: data.experience,
+        level: data.stats?.level,
+        experience: data.stats?.experience,
       }));
-    } catch (e) {
-      console.error("Error fetching user:", e);
-    }
-  };
 
-  const fetchCollection = async () => {
-    try {
-      const response = await fetchWithAuth(`${API_URL}/api/collection`);
-      const data = await response.json();
-
-      const rawCollection = data.collection || {};
+      const rawCollection = data.collection?.collection || {};
 
       const enhancedCollection = Object.fromEntries(
         Object.entries(rawCollection).map(([name, count]) => [
@@ -101,8 +93,10 @@ export default function ProfileSettings() {
         total_characters,
         unique_character,
       }));
+
+      setDisplayedCharacters(data.displayed_characters?.displayed_characters || []);
     } catch (error) {
-      console.error("Error fetching collection:", error);
+      console.error("Error fetching profile:", error);
     } finally {
       setLoading(false);
     }
@@ -110,17 +104,18 @@ export default function ProfileSettings() {
 
   const fetchPomodoroSessions = async () => {
     try {
-      const response = await fetchWithAuth(`${API_URL}/api/pomodoro/sessions`);
+      // Totals are aggregated server-side, no need to download the history
+      const response = await fetchWithAuth(
+        `${API_URL}/api/pomodoro/sessions/summary`
+      );
       const data = await response.json();
 
-      setSessions(data.sessions || {});
-
-      console.log(data.sessions);
+      setSessions(data.by_day || []);
 
       setStats((prev) => ({
         ...prev,
 
-        total_sessions: data.sessions.length,
+        total_sessions: data.total_sessions || 0,
       }));
     } catch (error) {
       console.error("Error fetching points:", error);
@@ -129,20 +124,6 @@ export default function ProfileSettings() {
     }
   };
 
-  const fetchDisplayedCharacters = async () => {
-    try {
-      const response = await fetchWithAuth(
-        `${API_URL}/api/user/displayed-characters`
-      );
-      const data = await response.json();
-      setDisplayedCharacters(data.displayed_characters || []);
-    } catch (error) {
-      console.error("Error fetching displayed characters:", error);
-    } finally {
-      setLoading(false);
-    }
-  };
-
   const handleSaveDisplayed = async (newSelected) => {
     try {
       const response = await fetchWithAuth(
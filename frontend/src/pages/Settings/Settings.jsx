@@ -5,7 +5,7 @@ import './Settings.css';
 
 export default function Settings() {
   const navigate = useNavigate();
-  const { settings, updateSettings, uploadBackgroundImage, toggleDarkMode } = useSettings();
+  const { settings, updateSettings, uploadBackgroundImage, toggleDarkMode, getBackgroundImageUrl } = useSettings();
   const [selectedGradient, setSelectedGradient] = useState(settings.background_value);
   const [uploading, setUploading] = useState(false);
   const fileInputRef = useRef(null);
@@ -137,7 +137,7 @@ export default function Settings() {
                   <div
                     className="preview-thumbnail"
                     style={{
-                      backgroundImage: `url(${settings.background_value})`,
+                      backgroundImage: `url(${getBackgroundImageUrl()})`,
                       backgroundSize: 'cover',
                       backgroundPosition: 'center'
                     }}
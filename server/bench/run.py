@@ -0,0 +1,321 @@
+"""
+Benchmark the Flask API against synthetic data.
+
+Seeds users, tasks and pomodoro sessions at a scale, then drives a request
+mix (see workload.MIXES) through the Flask test client and/or over HTTP,
+and reports throughput, p50/p95/p99 latency and MongoDB round trips per
+route:
+
+    python bench/run.py                                  # 1k users on mongomock
+    python bench/run.py --scale 100k --mongodb-uri mongodb://localhost:27017
+    python bench/run.py --save main                      # write baselines/main.json
+    python bench/run.py --compare main                   # exit 1 on regressions
+
+Without --mongodb-uri the database is mongomock (in-process, no indexes,
+so only the 1k scale is practical). --mongodb-uri must point at a local
+mongod: the --db-name database is dropped and reseeded.
+
+--url sends the HTTP requests to an already running server instead (e.g.
+gunicorn on the same database with SESSION_BACKEND=mongo). Logins are left
+out of the mix there since only this process can stand in for Google.
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINES_DIR = os.path.join(BENCH_DIR, 'baselines')
+sys.path.insert(0, os.path.join(BENCH_DIR, '..', 'src'))
+
+from seed import SCALES, email_for, seed  # noqa: E402
+from workload import MIXES, Mix, Sample, compare, summarize  # noqa: E402
+
+# Operations mongomock counts as one round trip each (see instrument_mongomock)
+MONGOMOCK_OPERATIONS = (
+    'find', 'find_one', 'find_one_and_update', 'find_one_and_delete', 'find_one_and_replace',
+    'insert_one', 'insert_many', 'update_one', 'update_many', 'replace_one',
+    'delete_one', 'delete_many', 'aggregate', 'count_documents', 'distinct', 'bulk_write'
+)
+
+
+class BenchTokenVerifier:
+    """Stands in for Google: the credential is a synthetic user's google_id"""
+
+    def verify(self, token):
+        return {'sub': token, 'email': email_for(token), 'name': token, 'picture': ''}
+
+
+def instrument_mongomock():
+    """
+    mongomock never emits command events, so RoundTripCounter sees nothing:
+    count each collection operation instead (a cursor counts once, however
+    many batches a real server would send). mongomock isn't thread-safe
+    either, so operations and cursor evaluation also take one lock.
+    """
+    import mongomock
+    from mongomock.collection import Cursor
+    from user_store import RoundTripCounter
+
+    counter = RoundTripCounter()
+    lock = threading.RLock()
+    depth = threading.local()  # mongomock's find_one calls find, count only the outer one
+
+    def locked(operation, count=False):
+        def wrapper(*args, **kwargs):
+            with lock:
+                if count and getattr(depth, 'level', 0) == 0:
+                    counter.started(None)
+                depth.level = getattr(depth, 'level', 0) + 1
+                try:
+                    return operation(*args, **kwargs)
+                finally:
+                    depth.level -= 1
+        return wrapper
+
+    for name in MONGOMOCK_OPERATIONS:
+        setattr(mongomock.Collection, name, locked(getattr(mongomock.Collection, name), count=True))
+    Cursor._compute_results = locked(Cursor._compute_results)
+
+
+def load_app(args):
+    """Import app.py configured for the benchmark, pointed at the bench database"""
+    os.environ['MONGODB_URI'] = args.mongodb_uri or 'mongodb://localhost:27017'
+    os.environ['MONGODB_DB_NAME'] = args.db_name
+    os.environ['ENV'] = os.environ['FLASK_ENV'] = 'development'  # for X-DB-Round-Trips
+    os.environ.setdefault('GACHA_SEED', str(args.seed))
+    os.environ.setdefault('INDEX_BOOTSTRAP', 'blocking')
+    os.environ['MIN_TIMER_MINUTES'] = '0'  # see workload.pomodoro
+    import app as appmod
+
+    if not args.mongodb_uri:
+        import mongomock
+        instrument_mongomock()
+        appmod.mongo._client = mongomock.MongoClient()
+        appmod.mongo._pid = os.getpid()
+
+    appmod.token_verifier = BenchTokenVerifier()
+    return appmod
+
+
+def create_sessions(sessions, users):
+    """{user_id: bearer token}, one fresh session per active user"""
+    tokens = {}
+    for user in users:
+        token = secrets.token_urlsafe(32)
+        sessions.save(token, {
+            'user_id': user.user_id,
+            'email': user.email,
+            'name': user.name,
+            'picture': '',
+            'expires': datetime.utcnow() + timedelta(days=1)
+        })
+        tokens[user.user_id] = token
+    return tokens
+
+
+def client_sender(appmod):
+    """Sends requests through the Flask test client (no network, no server)"""
+    def make():
+        client = appmod.app.test_client()
+
+        def send(request, headers):
+            response = client.open(request.path, method=request.method, json=request.json, headers=headers)
+            return response.status_code, response.headers.get('X-DB-Round-Trips')
+        return send
+    return make
+
+
+def http_sender(base_url):
+    """Sends requests over HTTP, one keep-alive connection per worker"""
+    import requests
+
+    def make():
+        session = requests.Session()
+
+        def send(request, headers):
+            response = session.request(request.method, base_url + request.path, json=request.json,
+                                       headers=headers, timeout=30)
+            return response.status_code, response.headers.get('X-DB-Round-Trips')
+        return send
+    return make
+
+
+def drive(make_sender, users, tokens, mix, total, concurrency, seed):
+    """
+    Send `total` requests from `concurrency` workers, each acting as random
+    active users. Returns ([Sample], elapsed seconds).
+    """
+    results = [[] for _ in range(concurrency)]
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        send = make_sender()
+        samples = results[index]
+        for _ in range(total // concurrency + (index < total % concurrency)):
+            user = rng.choice(users)
+            request = mix.next_request(user, rng)
+            headers = {'Authorization': f'Bearer {tokens[user.user_id]}'}
+            started = time.perf_counter()
+            status, trips = send(request, headers)
+            samples.append(Sample(request.route, status, time.perf_counter() - started,
+                                  int(trips) if trips is not None else None))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return [sample for samples in results for sample in samples], elapsed
+
+
+def serve(appmod):
+    """Serve the app on a free local port in a background thread, returns (server, url)"""
+    from werkzeug.serving import make_server
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no line per request
+    server = make_server('127.0.0.1', 0, appmod.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BENCH_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(driver, summary):
+    print(f"\n{driver}: {summary['requests']} requests, {summary['throughput_rps']} req/s, "
+          f"p50 {summary['p50_ms']} / p95 {summary['p95_ms']} / p99 {summary['p99_ms']} ms, "
+          f"{summary['errors']} errors")
+    print(f"  {'route':<34}{'count':>7}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'trips':>7}{'errors':>8}")
+    for route, stats in summary['routes'].items():
+        trips = stats['round_trips'] if stats['round_trips'] is not None else '-'
+        print(f"  {route:<34}{stats['requests']:>7}{stats['throughput_rps']:>9}{stats['p50_ms']:>9}"
+              f"{stats['p95_ms']:>9}{stats['p99_ms']:>9}{trips:>7}{stats['errors']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='1k', help='number of seeded users')
+    parser.add_argument('--users', type=int, help='seed exactly this many users instead of --scale')
+    parser.add_argument('--mongodb-uri', help='local mongod to use instead of mongomock')
+    parser.add_argument('--db-name', default='PomTimeBench', help='database to (re)seed')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the data of a previous run')
+    parser.add_argument('--mix', choices=MIXES, default='default')
+    parser.add_argument('--driver', choices=('client', 'http', 'both'), default='both')
+    parser.add_argument('--url', help='running server for the http driver')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per driver')
+    parser.add_argument('--warmup', type=int, default=200, help='untimed requests per driver first')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--active-users', type=int, default=200, help='users the load is spread over')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', metavar='NAME', help='save results as baselines/NAME.json')
+    parser.add_argument('--compare', metavar='NAME', help='compare with baselines/NAME.json')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed latency/throughput drift before it is a regression')
+    args = parser.parse_args(argv)
+
+    appmod = load_app(args)
+    database = appmod.mongo.database
+    users_count = args.users or SCALES[args.scale]
+    rng = random.Random(args.seed)
+
+    if args.skip_seed:
+        from seed import ActiveUser
+        docs = database['users'].find({}, {'google_id': 1, 'email': 1, 'name': 1}).limit(args.active_users)
+        users = [ActiveUser(str(doc['_id']), doc['google_id'], doc['email'], doc['name'], [])
+                 for doc in docs]
+    else:
+        print(f"Seeding {users_count} users into {args.db_name} "
+              f"({'mongod' if args.mongodb_uri else 'mongomock'})...")
+        started = time.perf_counter()
+        users = seed(database, users_count, rng, active=args.active_users,
+                     progress=lambda n: print(f"  {n}/{users_count}", end='\r'))
+        print(f"Seeded in {time.perf_counter() - started:.1f}s")
+
+    appmod.index_bootstrap()
+    tokens = create_sessions(appmod.sessions, users)
+    mix = Mix(MIXES[args.mix])
+
+    drivers = ['client', 'http'] if args.driver == 'both' else [args.driver]
+    results = {}
+    for driver in drivers:
+        server = None
+        if driver == 'client':
+            make_sender = client_sender(appmod)
+            driver_mix = mix
+        else:
+            if args.url:
+                url = args.url.rstrip('/')
+                driver_mix = Mix({name: weight for name, weight in MIXES[args.mix].items()
+                                  if name != 'login'})
+            else:
+                server, url = serve(appmod)
+                driver_mix = mix
+            make_sender = http_sender(url)
+
+        drive(make_sender, users, tokens, driver_mix, args.warmup, args.concurrency, args.seed)
+        samples, elapsed = drive(make_sender, users, tokens, driver_mix, args.requests,
+                                 args.concurrency, args.seed)
+        if server:
+            server.shutdown()
+        results[driver] = summarize(samples, elapsed)
+        print_summary(driver, results[driver])
+
+    report = {
+        'meta': {
+            'scale': args.users or args.scale,
+            'users': users_count,
+            'backend': 'mongod' if args.mongodb_uri else 'mongomock',
+            'mix': args.mix,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+        },
+        'drivers': results
+    }
+
+    if args.save:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f'{args.save}.json')
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nSaved {path}")
+
+    if args.compare:
+        with open(os.path.join(BASELINES_DIR, f'{args.compare}.json')) as f:
+            baseline = json.load(f)
+        if baseline['meta']['users'] != users_count or baseline['meta']['backend'] != report['meta']['backend']:
+            print("\nWarning: baseline was recorded at another scale or on another backend")
+        regressions = []
+        for driver, summary in results.items():
+            if driver in baseline['drivers']:
+                regressions += [f"{driver} {message}" for message in
+                                compare(baseline['drivers'][driver], summary, args.tolerance)]
+        print(f"\n{len(regressions)} regression(s) against {args.compare}")
+        for message in regressions:
+            print(f"  {message}")
+        return 1 if regressions else 0
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
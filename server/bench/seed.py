@@ -0,0 +1,161 @@
+"""
+Synthetic users, tasks and pomodoro sessions for the benchmarks.
+
+Documents have the same shape as the ones the routes create (see
+google_auth, create_task and complete_timer in app.py). Everything is
+derived from one random.Random, so a seed always produces the same data
+(apart from the ObjectIds).
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from catalog import CATALOG
+from recurrence import DAILY
+
+# Users per scale; tasks and sessions grow with them
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}
+TASKS_PER_USER = 6
+SESSIONS_PER_USER = 10
+MAX_FRIENDS = 5
+
+# google_id of the n-th synthetic user; its email is derived from it
+GOOGLE_ID_PREFIX = 'bench-'
+EMAIL_DOMAIN = 'bench.invalid'
+
+# A user the load generator acts as. pending_task_ids are (non-recurring)
+# tasks it can still complete, consumed by the mix's task completions
+ActiveUser = namedtuple('ActiveUser', 'user_id google_id email name pending_task_ids')
+
+
+def email_for(google_id):
+    return f'{google_id}@{EMAIL_DOMAIN}'
+
+
+def user_document(n, rng, now):
+    google_id = f'{GOOGLE_ID_PREFIX}{n}'
+    # Most users are low level, a few are far ahead (like a real leaderboard)
+    level = min(100, int(rng.paretovariate(1.5)))
+    owned = rng.sample(CATALOG.ordered, rng.randint(0, min(20, len(CATALOG.ordered))))
+    return {
+        '_id': ObjectId(),
+        'google_id': google_id,
+        'email': email_for(google_id),
+        'name': f'Bench User {n}',
+        'picture': '',
+        'points': rng.randint(0, 500),
+        'pomodoro_sessions': rng.randint(0, 200),
+        'collection': {character.name: rng.randint(1, 3) for character in owned},
+        'level': level,
+        'experience': rng.randint(0, 100 * level),
+        'settings': {
+            'background_type': 'gradient',
+            'background_value': f'gradient-{rng.randint(1, 6)}',
+            'dark_mode': rng.random() < 0.5
+        },
+        'created_at': now - timedelta(days=rng.randint(0, 365)),
+        'last_login': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+        'daily_points': {'date': '2000-01-01', 'points_earned': 0}
+    }
+
+
+def task_document(user_id, rng, now, completed):
+    start = (now + timedelta(days=rng.randint(-30, 30), minutes=15 * rng.randint(0, 60))) \
+        .replace(second=0, microsecond=0)
+    duration = rng.choice((15, 25, 30, 45, 60))
+    recurring = not completed and rng.random() < 0.1
+    task = {
+        '_id': ObjectId(),
+        'user_id': user_id,
+        'title': f'Task {rng.randint(1, 10000)}',
+        'start': start,
+        'end': start + timedelta(minutes=duration),
+        'duration_minutes': duration,
+        'points': rng.randint(1, 5),
+        'recurring': recurring,
+        'completed': completed,
+        'created_at': start - timedelta(days=1)
+    }
+    if completed:
+        task['completed_at'] = task['end']
+    if recurring:
+        task['recurrence'] = dict(DAILY)
+        task['completed_occurrences'] = []
+    return task
+
+
+def session_document(user_id, rng, now):
+    duration = rng.choice((15, 25, 25, 25, 50))
+    return {
+        'user_id': user_id,
+        'label': 'Pomodoro Session',
+        'duration_minutes': duration,
+        'points_earned': max(2, round(duration / 25)),
+        'completed_at': now - timedelta(minutes=rng.randint(0, 60 * 24 * 90))
+    }
+
+
+def _flush(collection, batch):
+    if batch:
+        collection.insert_many(batch, ordered=False)
+        batch.clear()
+
+
+def seed(database, users, rng, active=200, batch_size=1000, progress=None):
+    """
+    Replace the users, tasks, pomodoro_sessions and sessions collections of
+    `database` with `users` synthetic users and their tasks and sessions.
+
+    Returns [ActiveUser] for `active` users spread over the population;
+    half of each user's tasks are left incomplete, a tenth of those recur daily.
+    """
+    for name in ('users', 'tasks', 'pomodoro_sessions', 'sessions'):
+        database[name].drop()
+
+    now = datetime.utcnow()
+    step = max(1, users // max(1, active))
+    active_users = []
+    user_batch, task_batch, session_batch = [], [], []
+    user_ids = []
+
+    for n in range(users):
+        user = user_document(n, rng, now)
+        user_id = str(user['_id'])
+        user_ids.append(user['_id'])
+        user_batch.append(user)
+
+        pending = []
+        for i in range(TASKS_PER_USER):
+            task = task_document(user_id, rng, now, completed=i % 2 == 1)
+            if not task['completed'] and not task['recurring']:
+                pending.append(str(task['_id']))
+            task_batch.append(task)
+        for _ in range(SESSIONS_PER_USER):
+            session_batch.append(session_document(user_id, rng, now))
+
+        if n % step == 0 and len(active_users) < active:
+            active_users.append(ActiveUser(user_id, user['google_id'], user['email'], user['name'], pending))
+
+        if len(user_batch) >= batch_size:
+            _flush(database['users'], user_batch)
+            _flush(database['tasks'], task_batch)
+            _flush(database['pomodoro_sessions'], session_batch)
+            if progress:
+                progress(n + 1)
+
+    _flush(database['users'], user_batch)
+    _flush(database['tasks'], task_batch)
+    _flush(database['pomodoro_sessions'], session_batch)
+
+    # Friends point at users seeded earlier or later, so add them at the end.
+    # Active users get enough points that gacha rolls never run out
+    for user in active_users:
+        friends = rng.sample(user_ids, min(len(user_ids), rng.randint(0, MAX_FRIENDS)))
+        friends = [friend for friend in friends if str(friend) != user.user_id]
+        database['users'].update_one(
+            {'_id': ObjectId(user.user_id)},
+            {'$set': {'friend_ids': friends, 'points': 1000000}}
+        )
+
+    return active_users
@@ -0,0 +1,170 @@
+"""
+Request mixes for the load generator, and the statistics it reports.
+"""
+import math
+from collections import defaultdict, namedtuple
+from itertools import accumulate
+
+# route is the label results are grouped by (the path without ids)
+Request = namedtuple('Request', 'route method path json')
+
+# One finished request; round_trips is None if the server didn't report them
+Sample = namedtuple('Sample', 'route status seconds round_trips')
+
+
+def login(user, rng):
+    # The benchmark's token verifier takes the google_id as the credential
+    return Request('POST /auth/google', 'POST', '/auth/google', {'credential': user.google_id})
+
+
+def dashboard(user, rng):
+    return Request('GET /api/dashboard', 'GET', '/api/dashboard', None)
+
+
+def points(user, rng):
+    return Request('GET /api/points', 'GET', '/api/points', None)
+
+
+def leaderboard(user, rng):
+    return Request('GET /api/leaderboard', 'GET', '/api/leaderboard', None)
+
+
+def leaderboard_me(user, rng):
+    return Request('GET /api/leaderboard/me', 'GET', '/api/leaderboard/me', None)
+
+
+def gacha(user, rng):
+    count = 10 if rng.random() < 0.2 else 1
+    return Request('POST /api/gacha/roll', 'POST', '/api/gacha/roll', {'count': count})
+
+
+# Completions are checked against a server-side timer, so each pomodoro is
+# a start and, on the user's next turn, a completion. The timers are short
+# enough to have run out by then (run.py sets MIN_TIMER_MINUTES=0)
+BENCH_TIMER_MINUTES = 0.0001
+
+# user_ids whose timer has been started but not completed
+_running_timers = set()
+
+
+def pomodoro(user, rng):
+    if user.user_id in _running_timers:
+        _running_timers.discard(user.user_id)
+        return Request('POST /api/pomodoro/complete', 'POST', '/api/pomodoro/complete', {})
+    _running_timers.add(user.user_id)
+    return Request('POST /api/pomodoro/timer/start', 'POST', '/api/pomodoro/timer/start',
+                   {'duration_minutes': BENCH_TIMER_MINUTES})
+
+
+def complete_task(user, rng):
+    try:
+        task_id = user.pending_task_ids.pop()
+    except IndexError:
+        # Out of seeded tasks: finish a pomodoro instead
+        return pomodoro(user, rng)
+    return Request('POST /api/tasks/<id>/complete', 'POST', f'/api/tasks/{task_id}/complete', {})
+
+
+OPERATIONS = {
+    'login': login,
+    'dashboard': dashboard,
+    'points': points,
+    'leaderboard': leaderboard,
+    'leaderboard_me': leaderboard_me,
+    'gacha': gacha,
+    'pomodoro': pomodoro,
+    'complete_task': complete_task
+}
+
+# Relative weight of each operation
+MIXES = {
+    # Roughly a frontend session: mostly polling, some writes, a few logins
+    'default': {
+        'dashboard': 35, 'points': 15, 'leaderboard': 10, 'leaderboard_me': 10,
+        'gacha': 10, 'complete_task': 8, 'pomodoro': 7, 'login': 5
+    },
+    'polling': {'dashboard': 60, 'points': 20, 'leaderboard': 10, 'leaderboard_me': 10},
+    'writes': {'gacha': 40, 'complete_task': 30, 'pomodoro': 30},
+    'login': {'login': 100}
+}
+
+
+class Mix:
+    """Picks the next request from weighted operations"""
+
+    def __init__(self, weights):
+        unknown = set(weights) - set(OPERATIONS)
+        if unknown:
+            raise ValueError(f"Unknown operations: {', '.join(sorted(unknown))}")
+        self.operations = [OPERATIONS[name] for name in weights]
+        self.cum_weights = list(accumulate(weights.values()))
+
+    def next_request(self, user, rng):
+        operation = rng.choices(self.operations, cum_weights=self.cum_weights)[0]
+        return operation(user, rng)
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _latency_stats(samples, elapsed):
+    latencies = sorted(sample.seconds * 1000 for sample in samples)
+    trips = [sample.round_trips for sample in samples if sample.round_trips is not None]
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample.status >= 400),
+        'throughput_rps': round(len(samples) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+        'round_trips': round(sum(trips) / len(trips), 2) if trips else None
+    }
+
+
+def summarize(samples, elapsed):
+    """Overall and per-route stats for one run of `elapsed` seconds"""
+    if not samples:
+        return {'requests': 0, 'routes': {}}
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample.route].append(sample)
+
+    summary = _latency_stats(samples, elapsed)
+    summary['routes'] = {
+        route: _latency_stats(route_samples, elapsed)
+        for route, route_samples in sorted(by_route.items())
+    }
+    return summary
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Regressions of `current` against `baseline` (both from summarize()), as
+    messages. Latency and throughput may drift by `tolerance` (a fraction)
+    before they count; any extra round trip counts.
+    """
+    regressions = []
+    for route, now in current['routes'].items():
+        before = baseline['routes'].get(route)
+        if not before:
+            continue
+        for stat in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if now[stat] > before[stat] * (1 + tolerance):
+                regressions.append(f"{route}: {stat} {before[stat]} -> {now[stat]}")
+        if None not in (now['round_trips'], before['round_trips']) \
+                and now['round_trips'] > before['round_trips'] + 0.01:
+            regressions.append(f"{route}: round trips {before['round_trips']} -> {now['round_trips']}")
+        if now['errors'] / now['requests'] > before['errors'] / before['requests']:
+            regressions.append(f"{route}: errors {before['errors']}/{before['requests']} "
+                               f"-> {now['errors']}/{now['requests']}")
+
+    if current['throughput_rps'] < baseline['throughput_rps'] * (1 - tolerance):
+        regressions.append(
+            f"throughput {baseline['throughput_rps']} -> {current['throughput_rps']} req/s"
+        )
+    return regressions
@@ -1,15 +1,47 @@
+import contextvars
+import ipaddress
 import os
-from flask import Flask, request, jsonify
+import re
+from flask import Flask, Response, request, jsonify, stream_with_context
 from dotenv import load_dotenv
 from flask_cors import CORS
-from pymongo import MongoClient
-from google.oauth2 import id_token
-from google.auth.transport import requests
+from pymongo import ReturnDocument
 import secrets
+import tempfile
 from datetime import datetime, timedelta, timezone
 from functools import wraps
-import certifi
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.exceptions import HTTPException, RequestEntityTooLarge
+from werkzeug.wsgi import wrap_file
 from bson.objectid import ObjectId
+from mongo import Mongo
+from json_provider import MongoJSONProvider
+from metrics import CommandMetrics, Metrics
+from indexes import IndexBootstrap, ensure_indexes
+from session_store import create_session_store, start_sweeper
+from events import (
+    DAILY_CAP_REACHED, FRIEND_RANKING_CHANGED, LEVEL_UP, POINTS_CHANGED, TIMER_FINISHED, EventHub,
+    create_event_broker
+)
+from timers import PAUSED, RUNNING, TimerScheduler, epoch, timer_body
+from write_behind import WriteBehindQueue
+from user_store import PROFILE_FIELDS, PROFILE_PROJECTION, RoundTripCounter, UserStore, reset_round_trips, round_trips
+from profile_cache import create_profile_cache
+from google_verifier import GoogleTokenVerifier
+from gacha import GachaEngine, count_by_name
+from catalog import CATALOG
+from leaderboard import Leaderboard, mask_email
+from friends import FriendBoards, migrate_friend_emails
+from images import (
+    STANDARD_WIDTHS, ImageStore, image_url, migrate_inline_backgrounds, prepare_image
+)
+from pagination import (
+    NDJSON_MIMETYPE, decode_cursor, keyset_filter, ndjson_lines, paginate, parse_limit, wants_ndjson
+)
+from recurrence import (
+    expansion_window, is_occurrence, merge_occurrences, migrate_recurring_copies, naive_utc,
+    occurrence_ids, parse_rule, parse_task_id
+)
 
 # Load variables from .env
 load_dotenv()
@@ -19,17 +51,49 @@ MONGODB_URI = os.getenv("MONGODB_URI")
 DB_NAME = os.getenv("MONGODB_DB_NAME", "PomTimeDB")
 PST = timezone(timedelta(hours=-8))
 
-# Connect to MongoDB with SSL certificate
-client = MongoClient(
-    MONGODB_URI,
-    tlsCAFile=certifi.where()
-)
-db = client[DB_NAME]
-users_collection = db['users']
-tasks_collection = db['tasks']
-pomodoro_collection = db['pomodoro_sessions']
+# Per-route latency and database command metrics, served on GET /metrics.
+# SLOW_REQUEST_MS logs slower requests with each of their commands
+SLOW_REQUEST_MS = os.getenv('SLOW_REQUEST_MS')
+metrics = Metrics(slow_request_ms=int(SLOW_REQUEST_MS) if SLOW_REQUEST_MS else None)
+
+# Connect to MongoDB with SSL certificate. The client is built on first use
+# in each process (pool size, timeouts etc. come from MONGO_* env vars)
+mongo = Mongo(MONGODB_URI, DB_NAME, event_listeners=[RoundTripCounter(), CommandMetrics(metrics)])
+users_collection = mongo.collection('users')
+tasks_collection = mongo.collection('tasks')
+pomodoro_collection = mongo.collection('pomodoro_sessions')
+sessions_collection = mongo.collection('sessions')
+timers_collection = mongo.collection('timers')
+
+# Read-only routes (leaderboard, public profiles, pomodoro history) can be
+# served by secondaries, see MONGO_READONLY_PREFERENCE
+readonly_users_collection = mongo.collection('users', readonly=True)
+readonly_pomodoro_collection = mongo.collection('pomodoro_sessions', readonly=True)
+
+# Pomodoro history rows are queued and written in insert_many batches
+# (HISTORY_BATCH_SIZE rows or every HISTORY_FLUSH_MS), spilled to
+# HISTORY_SPILL_DIR first so a crash loses nothing. Set HISTORY_WRITE_BEHIND=off
+# to insert each row in the request instead
+HISTORY_WRITE_BEHIND = os.getenv('HISTORY_WRITE_BEHIND', 'on') != 'off'
+history_queue = WriteBehindQueue(
+    pomodoro_collection,
+    spill_dir=os.getenv('HISTORY_SPILL_DIR', os.path.join(tempfile.gettempdir(), 'pomtime-history')),
+    batch_size=int(os.getenv('HISTORY_BATCH_SIZE', 500)),
+    flush_interval=int(os.getenv('HISTORY_FLUSH_MS', 1000)) / 1000,
+    max_pending=int(os.getenv('HISTORY_MAX_PENDING', 10000))
+) if HISTORY_WRITE_BEHIND else None
+
+# Projection-aware, per-request memoized user reads; the polled profile
+# fields are also cached per user for PROFILE_CACHE_TTL seconds
+user_store = UserStore(users_collection, cache=create_profile_cache(
+    os.getenv('PROFILE_CACHE_BACKEND', 'memory'),
+    ttl=int(os.getenv('PROFILE_CACHE_TTL', 10)),
+    redis_url=os.getenv('REDIS_URL')
+))
 
 app = Flask(__name__)
+# Responses can hold ObjectIds, datetimes and Decimal128s as read from Mongo
+app.json = MongoJSONProvider(app)
 
 # Check if running in production
 IS_PRODUCTION = os.getenv('FLASK_ENV') == 'production' or os.getenv('ENV') == 'production'
@@ -40,17 +104,82 @@ DEBUG_MODE = not IS_PRODUCTION
 app.secret_key = os.getenv('SECRET_KEY', secrets.token_hex(32))
 
 # Configure CORS - update with your actual frontend URL
-CORS(app, supports_credentials=True, origins=[
+CORS_ORIGINS = [
     'http://localhost:5173',
     os.getenv('FRONTEND_URL', 'http://localhost:5173')
-], methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
+]
+CORS(app, supports_credentials=True, origins=CORS_ORIGINS,
+     methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
      allow_headers=['Content-Type', 'Authorization'])
 
 # Google OAuth settings
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
 
-# In-memory session storage (use Redis/MongoDB for production)
-sessions = {}
+# Verifies ID tokens locally; Google's certs are cached for their max-age
+token_verifier = GoogleTokenVerifier(GOOGLE_CLIENT_ID)
+
+# Session storage: 'mongo' is shared by every worker, 'memory' is process-local
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'mongo')
+sessions = create_session_store(SESSION_BACKEND, sessions_collection)
+
+
+def sweep_sessions():
+    start_sweeper(sessions, interval=int(os.getenv('SESSION_SWEEP_INTERVAL', 60)))
+
+
+# Started on the first request (or ASGI startup), so importing the app
+# doesn't spawn a thread and every forked worker gets its own
+session_sweeper = IndexBootstrap(sweep_sessions, mode=os.getenv('SESSION_SWEEPER', 'blocking'))
+
+# Push events for GET /api/events (served by asgi.py). 'local' only reaches
+# streams held by the worker that published; use 'redis' with several workers
+EVENT_BROKER = os.getenv('EVENT_BROKER', 'local')
+event_broker = create_event_broker(EVENT_BROKER, redis_url=os.getenv('REDIS_URL'))
+event_hub = EventHub(event_broker)
+
+
+def publish_event(user_id, event, data):
+    """Push an event to a user's open streams; never fails the request"""
+    try:
+        event_broker.publish(user_id, event, data)
+    except Exception as e:
+        print(f"Could not publish {event} event: {str(e)}")
+
+
+def build_indexes():
+    ensure_indexes(mongo.database)
+    sessions.ensure_indexes()
+
+
+# Indexes are ensured once per worker process, on its first request
+# (INDEX_BOOTSTRAP: 'background' (default), 'blocking' or 'off')
+index_bootstrap = IndexBootstrap(build_indexes, mode=os.getenv('INDEX_BOOTSTRAP', 'background'))
+
+
+def run_migrations():
+    """Bring documents written by older versions up to date (every step is idempotent)"""
+    migrated = migrate_friend_emails(users_collection)
+    if migrated:
+        print(f"Migrated friends lists of {migrated} users to friend_ids")
+    migrated = migrate_inline_backgrounds(users_collection, image_store)
+    if migrated:
+        print(f"Moved background images of {migrated} users to GridFS")
+    migrated = migrate_recurring_copies(tasks_collection)
+    if migrated:
+        print(f"Turned {migrated} daily recurring tasks into series")
+
+
+# Legacy data is migrated once per worker process as well, whichever server
+# runs the app (MIGRATIONS: same modes as INDEX_BOOTSTRAP). Workers racing on
+# a migration only redo each other's idempotent updates
+migrations = IndexBootstrap(run_migrations, mode=os.getenv('MIGRATIONS', 'background'))
+
+@app.before_request
+def bootstrap_indexes():
+    index_bootstrap()
+    migrations()
+    board_listener()
+    session_sweeper()
 
 
 # Middleware to require authentication
@@ -58,13 +187,13 @@ def require_auth(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
         token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token or token not in sessions:
+        session_data = sessions.get(token) if token else None
+        if not session_data:
             return jsonify({'error': 'Unauthorized'}), 401
 
-        # Check if session has expired
-        session_data = sessions[token]
+        # Check if session has expired (Mongo's TTL monitor only runs once a minute)
         if session_data['expires'] < datetime.utcnow():
-            del sessions[token]
+            sessions.delete(token)
             return jsonify({'error': 'Session expired'}), 401
 
         request.user = session_data
@@ -85,12 +214,8 @@ def google_auth():
         if not token:
             return jsonify({'error': 'No credential provided'}), 400
 
-        # Verify the token with Google
-        idinfo = id_token.verify_oauth2_token(
-            token,
-            requests.Request(),
-            GOOGLE_CLIENT_ID
-        )
+        # Verify the token against Google's signing keys
+        idinfo = token_verifier.verify(token)
 
         # Extract user information from Google
         google_id = idinfo['sub']
@@ -99,7 +224,7 @@ def google_auth():
         picture = idinfo.get('picture', '')
 
         # Check if user already exists
-        user = users_collection.find_one({'google_id': google_id})
+        user = users_collection.find_one({'google_id': google_id}, {'_id': 1})
 
         if user:
             # Update existing user's last login
@@ -109,11 +234,8 @@ def google_auth():
             )
         else:
             # Clean up any old sessions for this email (in case user was deleted and recreated)
-            sessions_to_delete = [sess_token for sess_token, session in sessions.items()
-                                  if session.get('email') == email]
-            for old_token in sessions_to_delete:
-                del sessions[old_token]
-                print(f"Cleaned up old session for {email}")
+            if sessions.delete_by_email(email):
+                print(f"Cleaned up old sessions for {email}")
 
             # Create new user document
             user = {
@@ -143,13 +265,13 @@ def google_auth():
 
         # Create session token
         session_token = secrets.token_urlsafe(32)
-        sessions[session_token] = {
+        sessions.save(session_token, {
             'user_id': str(user['_id']),
             'email': email,
             'name': name,
             'picture': picture,
             'expires': datetime.utcnow() + timedelta(days=7)
-        }
+        })
 
         return jsonify({
             'success': True,
@@ -184,8 +306,8 @@ def verify_token():
     """Verify if session token is still valid"""
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
 
-    if token in sessions:
-        session_data = sessions[token]
+    session_data = sessions.get(token) if token else None
+    if session_data:
         if session_data['expires'] > datetime.utcnow():
             return jsonify({
                 'valid': True,
@@ -198,7 +320,7 @@ def verify_token():
             })
         else:
             # Clean up expired session
-            del sessions[token]
+            sessions.delete(token)
 
     return jsonify({'valid': False}), 401
 
@@ -208,20 +330,27 @@ def verify_token():
 def logout():
     """Logout user and invalidate session"""
     token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if token in sessions:
-        del sessions[token]
+    sessions.delete(token)
     return jsonify({'success': True, 'message': 'Logged out successfully'})
 
 
+@app.route('/auth/logout-all', methods=['POST'])
+@require_auth
+def logout_all():
+    """Logout user everywhere by invalidating all of their sessions"""
+    revoked = sessions.delete_by_user(request.user['user_id'])
+    return jsonify({'success': True, 'sessions_revoked': revoked})
+
+
 @app.route('/auth/me', methods=['GET'])
 @require_auth
 def get_current_user():
     """Get current user's full profile from database"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    # Everything but friend_ids (ObjectIds; the friends list has its own route)
+    user = user_store.get(user_id)
 
     if user:
-        user['_id'] = str(user['_id'])
         return jsonify({'user': user})
 
     return jsonify({'error': 'User not found'}), 404
@@ -233,55 +362,105 @@ def get_current_user():
 def get_points():
     """Get user's current points"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    points = user_store.points(user_id)
 
-    if user:
-        return jsonify({'points': user.get('points', 0)})
+    if points is not None:
+        return jsonify({'points': points})
 
     return jsonify({'error': 'User not found'}), 404
 
 
-def check_daily_point_limit(user_id, points):
-    DAILY_LIMIT = 50
-    # Using UTC-8 for PST (adjust to -7 during daylight saving if needed)
-    pst = timezone(timedelta(hours=-8))
-    today = str(datetime.now(pst).date())
-
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
-    daily_points = user.get('daily_points', {})
-
-    last_date = daily_points.get('date')
-    daily_points_earned = daily_points.get('points_earned', 0)
+DAILY_POINT_LIMIT = 50
 
-    if last_date != today:
-        # Reset for new day
-        daily_points_earned = 0
-        reset_date = True
-    else:
-        reset_date = False
 
-    if daily_points_earned >= DAILY_LIMIT:
-        return 0  # No more points can be added today
+def check_daily_point_limit(user_id, points, inc=None, set_fields=None, guard=None):
+    """
+    Award up to `points` to a user, capped at DAILY_POINT_LIMIT per PST day.
 
-    points_to_add = min(points, DAILY_LIMIT - daily_points_earned)
+    The day reset, the capped increment and the points total are applied
+    in a single find_one_and_update (an aggregation-pipeline update), so
+    concurrent rewards can't push anyone past the cap. `inc`/`set_fields`
+    are applied in the same update and `guard` is added to its filter.
 
-    if reset_date:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {
-                'daily_points': {
-                    'date': today,
-                    'points_earned': points_to_add  # FIXED: Set to points_to_add instead of 0
-                }
-            }}
-        )
-    else:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$inc': {'daily_points.points_earned': points_to_add}}
-        )
+    The update returns the document as it was before; the award and the
+    new values follow from it, since the update is computed from the same
+    fields. Returns (points_added, updated_user), or (0, None) if nothing
+    matched.
+    """
+    # Using UTC-8 for PST (adjust to -7 during daylight saving if needed)
+    today = str(datetime.now(PST).date())
+
+    earned_today = {'$cond': [
+        {'$eq': ['$daily_points.date', today]},
+        {'$ifNull': ['$daily_points.points_earned', 0]},
+        0  # Reset for new day
+    ]}
+
+    updates = {
+        'daily_points.date': today,
+        'daily_points.points_earned': {'$add': ['$_earned', '$_award']},
+        'points': {'$add': [{'$ifNull': ['$points', 0]}, '$_award']},
+    }
+    for field, amount in (inc or {}).items():
+        updates[field] = {'$add': [{'$ifNull': [f'${field}', 0]}, amount]}
+    for field, value in (set_fields or {}).items():
+        updates[field] = {'$literal': value}
+
+    query = {'_id': ObjectId(user_id)}
+    query.update(guard or {})
+
+    user = users_collection.find_one_and_update(
+        query,
+        [
+            # Work out what's left of today's allowance in scratch fields...
+            {'$set': {'_earned': earned_today}},
+            {'$set': {'_award': {'$max': [0, {'$min': [
+                points, {'$subtract': [DAILY_POINT_LIMIT, '$_earned']}
+            ]}]}}},
+            # ...then it is applied and the scratch fields (and the one older
+            # versions of this update left behind) are dropped
+            {'$set': updates},
+            {'$project': {'_earned': 0, '_award': 0, 'daily_points.last_award': 0}},
+        ],
+        projection=dict(PROFILE_PROJECTION, pomodoro_sessions=1),
+        return_document=ReturnDocument.BEFORE
+    )
 
-    return points_to_add
+    if not user:
+        return 0, None
+
+    # The same arithmetic as the update, on the values it started from
+    daily_points = user.get('daily_points') or {}
+    earned = daily_points.get('points_earned', 0) if daily_points.get('date') == today else 0
+    awarded = max(0, min(points, DAILY_POINT_LIMIT - earned))
+
+    daily_points = {k: v for k, v in daily_points.items() if k != 'last_award'}
+    daily_points.update(date=today, points_earned=earned + awarded)
+    user['daily_points'] = daily_points
+    user['points'] = user.get('points', 0) + awarded
+    for field, amount in (inc or {}).items():
+        user[field] = user.get(field, 0) + amount
+    for field, value in (set_fields or {}).items():
+        *parents, name = field.split('.')
+        target = user
+        for parent in parents:
+            target = target.setdefault(parent, {})
+        target[name] = value
+
+    user_store.write_through(user_id, user)
+    publish_points(user_id, user)
+    if awarded and daily_points['points_earned'] >= DAILY_POINT_LIMIT:
+        publish_event(user_id, DAILY_CAP_REACHED, daily_points_body(daily_points))
+
+    return awarded, user
+
+
+def publish_points(user_id, user):
+    """Points changed event from the user's updated profile fields"""
+    publish_event(user_id, POINTS_CHANGED, dict(
+        daily_points_body(user.get('daily_points', {})),
+        points=user.get('points', 0)
+    ))
 
 
 @app.route('/api/user/daily-points', methods=['GET'])
@@ -289,16 +468,19 @@ def check_daily_point_limit(user_id, points):
 def get_daily_points():
     """Get user's daily points progress"""
     user_id = request.user['user_id']
-    # CHANGED: PST is UTC-8, PDT is UTC-7
-    pst = timezone(timedelta(hours=-8))
-    today = str(datetime.now(pst).date())
+    daily_points = user_store.daily_points(user_id)
 
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
-
-    if not user:
+    if daily_points is None:
         return jsonify({'error': 'User not found'}), 404
 
-    daily_points = user.get('daily_points', {})
+    return jsonify(daily_points_body(daily_points))
+
+
+def daily_points_body(daily_points):
+    """Today's points progress from a user's daily_points field"""
+    # CHANGED: PST is UTC-8, PDT is UTC-7
+    today = str(datetime.now(PST).date())
+
     last_date = daily_points.get('date')
     points_earned = daily_points.get('points_earned', 0)
 
@@ -306,11 +488,11 @@ def get_daily_points():
     if last_date != today:
         points_earned = 0
 
-    return jsonify({
+    return {
         'daily_points': points_earned,
-        'daily_limit': 50,
+        'daily_limit': DAILY_POINT_LIMIT,
         'date': today
-    })
+    }
 
 
 # ==================== DAILY CHECK-IN ROUTES ====================
@@ -321,54 +503,41 @@ def daily_checkin():
     """Handle daily check-in status and submission"""
     try:
         user_id = request.user['user_id']
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
-
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
 
         # Use PST timezone (UTC-8)
-        pst = timezone(timedelta(hours=-8))
-        today = str(datetime.now(pst).date())
-
-        # Get last check-in date
-        last_checkin_date = user.get('daily_points', {}).get('last_checkin_date')
-        already_checked_in = (last_checkin_date == today)
+        today = str(datetime.now(PST).date())
 
         # GET request - return status
         if request.method == 'GET':
-            return jsonify({
-                'can_check_in': not already_checked_in,
-                'already_checked_in': already_checked_in,
-                'last_checkin_date': last_checkin_date
-            })
+            daily_points = user_store.daily_points(user_id)
+
+            if daily_points is None:
+                return jsonify({'error': 'User not found'}), 404
+
+            return jsonify(checkin_status_body(daily_points))
 
-        # POST request - perform check-in
-        if already_checked_in:
+        # POST request - award points (within the daily limit) and record
+        # today's check-in in one update; the guard stops a second check-in
+        points_earned = 5
+        actual_points_added, user = check_daily_point_limit(
+            user_id,
+            points_earned,
+            set_fields={'daily_points.last_checkin_date': today},
+            guard={'daily_points.last_checkin_date': {'$ne': today}}
+        )
+
+        if not user:
+            if not user_store.exists(user_id):
+                return jsonify({'error': 'User not found'}), 404
             return jsonify({
                 'success': False,
                 'error': 'Already checked in today'
             }), 400
 
-        # Award points - check daily limit
-        points_earned = 5
-        actual_points_added = check_daily_point_limit(user_id, points_earned)
-        new_total_points = user.get('points', 0) + actual_points_added
-
-        # Update user document with today's date
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {
-                '$set': {
-                    'points': new_total_points,
-                    'daily_points.last_checkin_date': today
-                }
-            }
-        )
-
         return jsonify({
             'success': True,
             'points_earned': actual_points_added,
-            'total_points': new_total_points
+            'total_points': user.get('points', 0)
         })
 
     except Exception as e:
@@ -377,30 +546,183 @@ def daily_checkin():
         traceback.print_exc()
         return jsonify({'error': 'Check-in operation failed'}), 500
 
+def checkin_status_body(daily_points):
+    """Whether the user can still check in today"""
+    today = str(datetime.now(PST).date())
+
+    # Get last check-in date
+    last_checkin_date = daily_points.get('last_checkin_date')
+    already_checked_in = (last_checkin_date == today)
+
+    return {
+        'can_check_in': not already_checked_in,
+        'already_checked_in': already_checked_in,
+        'last_checkin_date': last_checkin_date
+    }
+
+
 # ==================== TASK ROUTES ====================
 
+# Fields the task views use (user_id and timestamps stay server-side)
+TASK_PROJECTION = {
+    'title': 1,
+    'start': 1,
+    'end': 1,
+    'duration_minutes': 1,
+    'points': 1,
+    'recurring': 1,
+    'completed': 1
+}
+# Recurring series also need their rule (and completions, see series_pipeline)
+SERIES_PROJECTION = dict(TASK_PROJECTION, recurrence=1)
+MAX_TASKS_PER_PAGE = 500
+
+
+def parse_iso_window(args):
+    """Mongo range clause from optional start/end ISO datetime query args"""
+    window = {}
+    if args.get('start'):
+        window['$gte'] = datetime.fromisoformat(args['start'].replace('Z', '+00:00'))
+    if args.get('end'):
+        window['$lt'] = datetime.fromisoformat(args['end'].replace('Z', '+00:00'))
+    return window
+
+
+def paged_response(cursor, limit, field, key):
+    """Respond with a page of documents from a cursor sorted on (field, _id)"""
+    if limit:
+        cursor = cursor.limit(limit + 1)
+    return page_response(paginate(cursor, limit, field), key)
+
+
+def page_response(docs, key):
+    """
+    Respond with paginate()'s output.
+
+    Streams NDJSON when the client asked for it, otherwise returns
+    {key: [...], 'next_cursor': ...} as one JSON body.
+    """
+    if wants_ndjson(request):
+        return Response(
+            stream_with_context(ndjson_lines(docs, app.json.dumps)),
+            mimetype=NDJSON_MIMETYPE
+        )
+
+    return jsonify(page_body(docs, key))
+
+
+def page_body(docs, key):
+    """{key: [...], 'next_cursor': ...} from paginate()'s output"""
+    items = []
+    next_cursor = None
+    for doc in docs:
+        if 'next_cursor' in doc:
+            next_cursor = doc['next_cursor']
+            break
+        items.append(doc)
+
+    return {key: items, 'next_cursor': next_cursor}
+
+
+def stored_tasks_query(user_id, window):
+    """Tasks stored as documents (everything but recurring series) in a window"""
+    query = {'user_id': user_id, 'recurrence': {'$exists': False}}
+    if window:
+        query['start'] = window
+    return query
+
+
+def series_query(user_id, window):
+    """Recurring series that can have occurrences in a window"""
+    query = {'user_id': user_id, 'recurrence': {'$exists': True}}
+    if window.get('$lt'):
+        query['start'] = {'$lt': window['$lt']}
+    return query
+
+
+def series_pipeline(user_id, window):
+    """
+    Aggregation reading series_query()'s series with only the completions
+    inside the window they're expanded over, however long their history
+    """
+    window_start, window_end = expansion_window(window)
+    completed = {'$filter': {
+        'input': '$completed_occurrences',
+        'as': 'at',
+        'cond': {'$and': [{'$gte': ['$$at', window_start]}, {'$lt': ['$$at', window_end]}]}
+    }}
+    return [
+        {'$match': series_query(user_id, window)},
+        {'$project': dict(SERIES_PROJECTION, completed_occurrences=completed)}
+    ]
+
+
+def load_task_docs(user_id, window, cursor=None, limit=None):
+    """
+    The user's tasks in (start, _id) order, for paginate(): stored ones in
+    the window merged with the occurrences of their recurring series, after
+    `cursor` if given. Reads at most limit + 1 stored tasks.
+    """
+    query = stored_tasks_query(user_id, window)
+    after = None
+    if cursor:
+        query.update(keyset_filter('start', cursor))
+        after = decode_cursor(cursor)
+
+    series = list(tasks_collection.aggregate(series_pipeline(user_id, window)))
+
+    # Served by the (user_id, start, _id) index, no in-memory sort
+    tasks = tasks_collection.find(query, TASK_PROJECTION).sort([('start', 1), ('_id', 1)])
+    if limit:
+        tasks = tasks.limit(limit + 1)
+    return merge_occurrences(tasks, series, window, after)
+
+
 @app.route('/api/tasks', methods=['GET'])
 @require_auth
 def get_tasks():
-    """Get all tasks for the current user"""
+    """
+    Get tasks for the current user, ordered by start time.
+
+    Optional query args: start/end (ISO datetimes) restrict the window,
+    limit/cursor page through it (MAX_TASKS_PER_PAGE a page unless a
+    smaller limit is given; follow next_cursor for the rest), and format=ndjson (or Accept:
+    application/x-ndjson) streams one task per line as they're read.
+    Recurring tasks are listed once per occurrence in the window (or
+    around today without one), with ids from recurrence.occurrence_id.
+    """
     user_id = request.user['user_id']
 
-    tasks = list(tasks_collection.find({'user_id': user_id}))
+    try:
+        window = parse_iso_window(request.args)
+        limit = parse_limit(request.args.get('limit'), MAX_TASKS_PER_PAGE, MAX_TASKS_PER_PAGE)
+        docs = load_task_docs(user_id, window, request.args.get('cursor'), limit)
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end, limit or cursor'}), 400
+
+    return page_response(occurrence_ids(paginate(docs, limit, 'start')), 'tasks')
 
-    # Convert ObjectId to string
-    for task in tasks:
-        task['_id'] = str(task['_id'])
 
-    return jsonify({'tasks': tasks})
+def parse_task_times(data):
+    """start/end from a task's JSON as naive UTC datetimes (None if absent)"""
+    return tuple(
+        naive_utc(datetime.fromisoformat(data[field].replace('Z', '+00:00'))) if field in data else None
+        for field in ('start', 'end')
+    )
 
 
 @app.route('/api/tasks', methods=['POST'])
 @require_auth
 def create_task():
-    """Create a new task"""
+    """Create a new task (a series if it recurs, see recurrence.parse_rule)"""
     user_id = request.user['user_id']
     data = request.get_json()
 
+    try:
+        rule = parse_rule(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     # Calculate points based on duration (30 min = 1 point)
     duration_minutes = data.get('duration_minutes', 30)
     calculated_points = duration_minutes / 30
@@ -412,16 +734,19 @@ def create_task():
         'end': datetime.fromisoformat(data.get('end').replace('Z', '+00:00')),
         'duration_minutes': duration_minutes,
         'points': data.get('points', calculated_points),  # Allow custom points
-        'recurring': data.get('recurring', False),
+        'recurring': rule is not None,
         'completed': False,
         'created_at': datetime.utcnow()
     }
+    if rule:
+        # Occurrence ids have second precision
+        task['start'] = task['start'].replace(microsecond=0)
+        task['end'] = task['end'].replace(microsecond=0)
+        task['recurrence'] = rule
+        task['completed_occurrences'] = []
 
-    result = tasks_collection.insert_one(task)
-    task['_id'] = str(result.inserted_id)
-    task['start'] = task['start'].isoformat()
-    task['end'] = task['end'].isoformat()
-    task['created_at'] = task['created_at'].isoformat()
+    # insert_one sets the task's _id
+    tasks_collection.insert_one(task)
 
     return jsonify({'success': True, 'task': task}), 201
 
@@ -429,22 +754,45 @@ def create_task():
 @app.route('/api/tasks/<task_id>', methods=['PUT'])
 @require_auth
 def update_task(task_id):
-    """Update a task"""
+    """
+    Update a task.
+
+    Editing an occurrence edits its series: a new start/end moves every
+    occurrence by as much, and turning recurrence off ends the series
+    before this occurrence, which becomes a task of its own.
+    """
     user_id = request.user['user_id']
     data = request.get_json()
 
+    try:
+        object_id, occurrence = parse_task_id(task_id)
+        start, end = parse_task_times(data)
+    except ValueError:
+        return jsonify({'error': 'Task not found'}), 404
+
     # Verify task belongs to user
-    task = tasks_collection.find_one({'_id': ObjectId(task_id), 'user_id': user_id})
+    task = tasks_collection.find_one({'_id': object_id, 'user_id': user_id})
     if not task:
         return jsonify({'error': 'Task not found'}), 404
 
+    rule = task.get('recurrence')
+    if occurrence is not None and not (rule and is_occurrence(rule, task['start'], occurrence)):
+        return jsonify({'error': 'Task not found'}), 404
+
+    try:
+        if 'recurrence' in data:
+            new_rule = parse_rule(data)
+        elif 'recurring' in data:
+            # The frontend only sends the flag, keep the series' own rule
+            new_rule = (rule or parse_rule(data)) if data['recurring'] else None
+        else:
+            new_rule = rule
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     update_data = {}
     if 'title' in data:
         update_data['title'] = data['title']
-    if 'start' in data:
-        update_data['start'] = datetime.fromisoformat(data['start'].replace('Z', '+00:00'))
-    if 'end' in data:
-        update_data['end'] = datetime.fromisoformat(data['end'].replace('Z', '+00:00'))
     if 'duration_minutes' in data:
         update_data['duration_minutes'] = data['duration_minutes']
         # Recalculate points if not custom
@@ -452,11 +800,69 @@ def update_task(task_id):
             update_data['points'] = data['duration_minutes'] / 30
     if 'points' in data:
         update_data['points'] = data['points']
-    if 'recurring' in data:
-        update_data['recurring'] = data['recurring']
+
+    if rule and occurrence is not None:
+        # Times are relative to the occurrence; the series moves by as much
+        shift = start - occurrence if start else timedelta(0)
+        duration = (end - (start or occurrence)) if end else task['end'] - task['start']
+        completed = occurrence in task.get('completed_occurrences', [])
+        if shift:
+            update_data['completed_occurrences'] = [
+                completed_at + shift for completed_at in task.get('completed_occurrences', [])
+            ]
+        occurrence += shift
+        start = task['start'] + shift
+        end = start + duration
+    else:
+        completed = task['start'] in task.get('completed_occurrences', []) if rule \
+            else task.get('completed', False)
+        occurrence = start or task['start']
+    if start:
+        update_data['start'] = start
+    if end:
+        update_data['end'] = end
+
+    if rule and not new_rule:
+        if occurrence > update_data.get('start', task['start']):
+            # End the series before this occurrence, which is kept on its own
+            tasks_collection.update_one(
+                {'_id': object_id},
+                {'$set': dict(update_data, **{'recurrence.until': occurrence - timedelta(seconds=1)})}
+            )
+            tasks_collection.insert_one({
+                'user_id': user_id,
+                'title': update_data.get('title', task.get('title')),
+                'start': occurrence,
+                'end': occurrence + (update_data.get('end', task['end']) - update_data.get('start', task['start'])),
+                'duration_minutes': update_data.get('duration_minutes', task.get('duration_minutes')),
+                'points': update_data.get('points', task.get('points')),
+                'recurring': False,
+                'completed': completed,
+                'created_at': datetime.utcnow()
+            })
+            return jsonify({'success': True})
+
+        # The first occurrence: the series becomes a plain task
+        update_data.update(recurring=False, completed=completed)
+        tasks_collection.update_one(
+            {'_id': object_id},
+            {'$set': update_data, '$unset': {'recurrence': '', 'completed_occurrences': ''}}
+        )
+        return jsonify({'success': True})
+
+    if new_rule:
+        update_data['recurring'] = True
+        update_data['recurrence'] = new_rule
+        for field in ('start', 'end'):
+            update_data[field] = update_data.get(field, task[field]).replace(microsecond=0)
+        if not rule:
+            # A task becoming a series keeps its completion as the first occurrence's
+            update_data['completed_occurrences'] = [update_data['start']] if completed else []
+    elif 'recurring' in data:
+        update_data['recurring'] = False
 
     tasks_collection.update_one(
-        {'_id': ObjectId(task_id)},
+        {'_id': object_id},
         {'$set': update_data}
     )
 
@@ -466,67 +872,89 @@ def update_task(task_id):
 @app.route('/api/tasks/<task_id>/complete', methods=['POST'])
 @require_auth
 def complete_task(task_id):
-    """Mark a task as complete and award points"""
+    """Mark a task (or one occurrence of a recurring task) as complete and award points"""
     user_id = request.user['user_id']
 
-    # Verify task belongs to user and not already completed
-    task = tasks_collection.find_one({'_id': ObjectId(task_id), 'user_id': user_id})
-    if not task:
+    try:
+        object_id, occurrence = parse_task_id(task_id)
+    except ValueError:
         return jsonify({'error': 'Task not found'}), 404
 
-    if task.get('completed'):
-        return jsonify({'error': 'Task already completed'}), 400
-
-    # Mark task as completed
-    tasks_collection.update_one(
-        {'_id': ObjectId(task_id)},
-        {'$set': {'completed': True, 'completed_at': datetime.utcnow()}}
-    )
+    if occurrence is None:
+        # Mark task as completed, only if it belongs to user and isn't completed yet
+        task = tasks_collection.find_one_and_update(
+            {'_id': object_id, 'user_id': user_id, 'completed': {'$ne': True},
+             'recurrence': {'$exists': False}},
+            {'$set': {'completed': True, 'completed_at': datetime.utcnow()}}
+        )
+        if not task:
+            existing = tasks_collection.find_one({'_id': object_id, 'user_id': user_id}, {'recurrence': 1})
+            if existing and 'recurrence' in existing:
+                return jsonify({'error': 'Complete an occurrence of a recurring task'}), 400
+            if existing:
+                return jsonify({'error': 'Task already completed'}), 400
+            return jsonify({'error': 'Task not found'}), 404
+    else:
+        # Check the occurrence against its series before touching the document
+        series = tasks_collection.find_one(
+            {'_id': object_id, 'user_id': user_id, 'recurrence': {'$exists': True}},
+            {'start': 1, 'recurrence': 1}
+        )
+        if not series or not is_occurrence(series['recurrence'], series['start'], occurrence):
+            return jsonify({'error': 'Task not found'}), 404
+
+        # Add it to the series' completions (no new document), only if the
+        # series wasn't rescheduled since and the occurrence isn't done yet
+        task = tasks_collection.find_one_and_update(
+            {'_id': object_id, 'user_id': user_id, 'start': series['start'],
+             'recurrence': series['recurrence'], 'completed_occurrences': {'$ne': occurrence}},
+            {'$push': {'completed_occurrences': occurrence}},
+            projection={'points': 1}
+        )
+        if not task:
+            if tasks_collection.find_one(
+                {'_id': object_id, 'user_id': user_id, 'completed_occurrences': occurrence}, {'_id': 1}
+            ):
+                return jsonify({'error': 'Task already completed'}), 400
+            return jsonify({'error': 'Task not found'}), 404
 
     # Award points to user
     task_points = task.get('points', 1)
-    points = check_daily_point_limit(user_id, task_points)
-
-    users_collection.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': {'points': points}}
-    )
-
-    # If recurring, create a new instance for tomorrow
-    if task.get('recurring'):
-        start = task['start'] + timedelta(days=1)
-        end = task['end'] + timedelta(days=1)
-
-        new_task = {
-            'user_id': user_id,
-            'title': task['title'],
-            'start': start,
-            'end': end,
-            'duration_minutes': task.get('duration_minutes', 30),
-            'points': task.get('points', 1),
-            'recurring': True,
-            'completed': False,
-            'created_at': datetime.utcnow()
-        }
-        tasks_collection.insert_one(new_task)
-
-    # Get updated points
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    points, user = check_daily_point_limit(user_id, task_points)
 
     return jsonify({
         'success': True,
         'points_earned': points,
-        'total_points': user.get('points', 0)
+        'total_points': user.get('points', 0) if user else 0
     })
 
 
 @app.route('/api/tasks/<task_id>', methods=['DELETE'])
 @require_auth
 def delete_task(task_id):
-    """Delete a task"""
+    """Delete a task; deleting an occurrence ends its series there (earlier ones stay)"""
     user_id = request.user['user_id']
 
-    result = tasks_collection.delete_one({'_id': ObjectId(task_id), 'user_id': user_id})
+    try:
+        object_id, occurrence = parse_task_id(task_id)
+    except ValueError:
+        return jsonify({'error': 'Task not found'}), 404
+
+    if occurrence is not None:
+        series = tasks_collection.find_one(
+            {'_id': object_id, 'user_id': user_id, 'recurrence': {'$exists': True}},
+            {'start': 1, 'recurrence': 1}
+        )
+        if not series or not is_occurrence(series['recurrence'], series['start'], occurrence):
+            return jsonify({'error': 'Task not found'}), 404
+        if occurrence > series['start']:
+            tasks_collection.update_one(
+                {'_id': object_id},
+                {'$set': {'recurrence.until': occurrence - timedelta(seconds=1)}}
+            )
+            return jsonify({'success': True})
+
+    result = tasks_collection.delete_one({'_id': object_id, 'user_id': user_id})
 
     if result.deleted_count == 0:
         return jsonify({'error': 'Task not found'}), 404
@@ -536,32 +964,18 @@ def delete_task(task_id):
 
 # ==================== GACHA ROUTES ====================
 
-# Gacha pools
-FIVE_STAR_POOL = ["King", "Angel", "Dragon"]
-FOUR_STAR_POOL = ["Snow", "Prince", "Moon", "Autumn"]
-THREE_STAR_POOL = ["White", "Brown", "Orange", "Black", "Cream", "Gray", "Tan", "Beige"]
+# Gacha pools, drop rates and XP values live in characters.json (see catalog.py).
+# Set GACHA_SEED for a deterministic roll sequence (tests, benchmarks)
+gacha_engine = GachaEngine(CATALOG, seed=os.getenv('GACHA_SEED'))
 
+# Points spent per roll
+ROLL_COST = 1
+MAX_ROLLS_PER_REQUEST = 100
 
-def perform_gacha_roll():
-    """Perform a single gacha roll"""
-    import random
-    roll = random.random()
 
-    if roll < 0.006:  # 0.6% for 5-star
-        return {
-            'name': random.choice(FIVE_STAR_POOL),
-            'stars': 5
-        }
-    elif roll < 0.056:  # 5% for 4-star
-        return {
-            'name': random.choice(FOUR_STAR_POOL),
-            'stars': 4
-        }
-    else:  # 94.4% for 3-star
-        return {
-            'name': random.choice(THREE_STAR_POOL),
-            'stars': 3
-        }
+def perform_gacha_roll(count=1):
+    """Perform `count` gacha rolls in a single draw"""
+    return gacha_engine.roll(count)
 
 
 @app.route('/api/gacha/roll', methods=['POST'])
@@ -570,52 +984,37 @@ def gacha_roll():
     """Perform gacha roll(s) and add to collection"""
     user_id = request.user['user_id']
     data = request.get_json()
-    count = data.get('count', 1)  # 1 or 10
+    count = data.get('count', 1)  # usually 1 or 10
 
-    if count not in [1, 10]:
+    if type(count) is not int or not 1 <= count <= MAX_ROLLS_PER_REQUEST:
         return jsonify({'error': 'Invalid roll count'}), 400
 
-    # Check if user has enough points
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
-    current_points = user.get('points', 0)
-
-    if current_points < count:
-        return jsonify({
-            'error': 'Insufficient points',
-            'required': count,
-            'current': current_points
-        }), 400
-
-    # Deduct points
-    users_collection.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': {'points': -count}}
-    )
-
-    # Perform rolls
-    results = []
-    collection_updates = {}
+    cost = count * ROLL_COST
 
-    for i in range(count):
-        roll = perform_gacha_roll()
-        results.append(roll)
+    # Perform rolls and count each character for the collection update
+    results = perform_gacha_roll(count)
 
-        # Count each character for collection update
-        char_name = roll['name']
-        collection_updates[char_name] = collection_updates.get(char_name, 0) + 1
-
-    # Update user's collection
-    update_operations = {}
-    for char_name, count_increment in collection_updates.items():
+    update_operations = {'points': -cost}
+    for char_name, count_increment in count_by_name(results).items():
         update_operations[f'collection.{char_name}'] = count_increment
 
-    users_collection.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': update_operations}
+    # Deduct points and update the collection together, only if the user can afford it
+    updated_user = users_collection.find_one_and_update(
+        {'_id': ObjectId(user_id), 'points': {'$gte': cost}},
+        {'$inc': update_operations},
+        projection=PROFILE_PROJECTION,
+        return_document=ReturnDocument.AFTER
     )
 
-    # Get updated user data
-    updated_user = users_collection.find_one({'_id': ObjectId(user_id)})
+    if not updated_user:
+        return jsonify({
+            'error': 'Insufficient points',
+            'required': cost,
+            'current': user_store.points(user_id) or 0
+        }), 400
+
+    user_store.write_through(user_id, updated_user)
+    publish_points(user_id, updated_user)
 
     return jsonify({
         'success': True,
@@ -630,61 +1029,230 @@ def gacha_roll():
 def get_collection():
     """Get user's character collection"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    collection = user_store.collection_of(user_id)
 
-    if user:
-        return jsonify({'collection': user.get('collection', {})})
+    if collection is not None:
+        return jsonify({'collection': collection})
 
     return jsonify({'error': 'User not found'}), 404
 
 
 # ====================== POMODORO ROUTES ======================
 
+# Timers are kept server-side, one per user, in timers_collection (see
+# timers.py); completions are checked against them
+MIN_TIMER_MINUTES = float(os.getenv('MIN_TIMER_MINUTES', 1))
+MAX_TIMER_MINUTES = 180
+# A completion may arrive this much before the timer runs out (clock skew, latency)
+TIMER_GRACE_SECONDS = 2
+
+
+def notify_timer_finished(user_id, generation):
+    """Tell the user their timer ran out (once, whichever worker gets there first)"""
+    timer = timers_collection.find_one_and_update(
+        {'_id': ObjectId(user_id), 'generation': generation, 'state': RUNNING, 'notified': {'$ne': True}},
+        {'$set': {'notified': True}},
+        projection={'label': 1, 'duration_minutes': 1}
+    )
+    if timer:
+        publish_event(user_id, TIMER_FINISHED, {
+            'label': timer.get('label'),
+            'duration_minutes': timer.get('duration_minutes')
+        })
+
+
+# The worker that starts or resumes a timer schedules its notification. A
+# timer still not notified this long after running out was scheduled by a
+# worker that has gone away, and is taken over by whichever worker sweeps first
+ORPHANED_TIMER_SECONDS = 10
+ORPHANED_TIMERS_PER_SWEEP = 1000
+
+
+def orphaned_timers():
+    """Overdue timers nobody notified, for the scheduler to take over"""
+    overdue = datetime.utcnow() - timedelta(seconds=ORPHANED_TIMER_SECONDS)
+    for timer in timers_collection.find(
+        {'state': RUNNING, 'notified': {'$ne': True}, 'expires_at': {'$lte': overdue}},
+        {'expires_at': 1, 'generation': 1}
+    ).limit(ORPHANED_TIMERS_PER_SWEEP):
+        yield str(timer['_id']), epoch(timer['expires_at']), timer['generation']
+
+
+timer_scheduler = TimerScheduler(notify_timer_finished, loader=orphaned_timers,
+                                 load_interval=ORPHANED_TIMER_SECONDS)
+
+
+@app.route('/api/pomodoro/timer', methods=['GET'])
+@require_auth
+def get_timer():
+    """Get the user's timer, if one is running or paused"""
+    user_id = request.user['user_id']
+    timer = timers_collection.find_one({'_id': ObjectId(user_id)})
+    return jsonify({'timer': timer_body(timer, datetime.utcnow()) if timer else None})
+
+
+@app.route('/api/pomodoro/timer/start', methods=['POST'])
+@require_auth
+def start_timer():
+    """Start a timer, replacing any unfinished one"""
+    user_id = request.user['user_id']
+    data = request.get_json() or {}
+
+    duration_minutes = data.get('duration_minutes', 25)
+    if type(duration_minutes) not in (int, float) \
+            or not MIN_TIMER_MINUTES <= duration_minutes <= MAX_TIMER_MINUTES:
+        return jsonify({'error': f'duration_minutes must be between {MIN_TIMER_MINUTES:g} '
+                                 f'and {MAX_TIMER_MINUTES}'}), 400
+
+    now = datetime.utcnow()
+    duration_seconds = duration_minutes * 60
+    timer = timers_collection.find_one_and_update(
+        {'_id': ObjectId(user_id)},
+        {
+            '$set': {
+                'label': data.get('label', 'Pomodoro Session'),
+                'duration_minutes': duration_minutes,
+                'duration_seconds': duration_seconds,
+                'state': RUNNING,
+                'started_at': now,
+                'expires_at': now + timedelta(seconds=duration_seconds)
+            },
+            '$unset': {'remaining_seconds': '', 'notified': ''},
+            '$inc': {'generation': 1}
+        },
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    timer_scheduler.schedule(user_id, epoch(timer['expires_at']), timer['generation'])
+
+    return jsonify({'timer': timer_body(timer, now)}), 201
+
+
+@app.route('/api/pomodoro/timer/pause', methods=['POST'])
+@require_auth
+def pause_timer():
+    """Pause the running timer, keeping what's left of it"""
+    user_id = request.user['user_id']
+    now = datetime.utcnow()
+
+    timer = timers_collection.find_one({'_id': ObjectId(user_id)})
+    if not timer or timer['state'] != RUNNING:
+        return jsonify({'error': 'No running timer'}), 400
+    if timer['expires_at'] <= now:
+        return jsonify({'error': 'Timer already finished'}), 400
+
+    # Only applies if nothing changed the timer since it was read
+    remaining = (timer['expires_at'] - now).total_seconds()
+    result = timers_collection.update_one(
+        {'_id': timer['_id'], 'generation': timer['generation']},
+        {
+            '$set': {'state': PAUSED, 'remaining_seconds': remaining},
+            '$unset': {'expires_at': ''},
+            '$inc': {'generation': 1}
+        }
+    )
+    if result.matched_count == 0:
+        return jsonify({'error': 'Timer changed, please try again'}), 409
+
+    timer_scheduler.cancel(user_id)
+    timer.update(state=PAUSED, remaining_seconds=remaining, expires_at=None)
+    return jsonify({'timer': timer_body(timer, now)})
+
+
+@app.route('/api/pomodoro/timer/resume', methods=['POST'])
+@require_auth
+def resume_timer():
+    """Resume a paused timer"""
+    user_id = request.user['user_id']
+    now = datetime.utcnow()
+
+    timer = timers_collection.find_one({'_id': ObjectId(user_id)})
+    if not timer or timer['state'] != PAUSED:
+        return jsonify({'error': 'No paused timer'}), 400
+
+    expires_at = now + timedelta(seconds=timer['remaining_seconds'])
+    result = timers_collection.update_one(
+        {'_id': timer['_id'], 'generation': timer['generation']},
+        {
+            '$set': {'state': RUNNING, 'expires_at': expires_at},
+            '$unset': {'remaining_seconds': ''},
+            '$inc': {'generation': 1}
+        }
+    )
+    if result.matched_count == 0:
+        return jsonify({'error': 'Timer changed, please try again'}), 409
+
+    timer_scheduler.schedule(user_id, epoch(expires_at), timer['generation'] + 1)
+    timer.update(state=RUNNING, expires_at=expires_at)
+    return jsonify({'timer': timer_body(timer, now)})
+
+
+@app.route('/api/pomodoro/timer', methods=['DELETE'])
+@require_auth
+def cancel_timer():
+    """Discard the user's timer"""
+    user_id = request.user['user_id']
+    timers_collection.delete_one({'_id': ObjectId(user_id)})
+    timer_scheduler.cancel(user_id)
+    return jsonify({'success': True})
+
+
 @app.route('/api/pomodoro/complete', methods=['POST'])
 @require_auth
 def complete_timer():
     """
-    Mark a pomodoro timer as complete:
-    - increments user points
+    Complete the user's timer once it has run out:
+    - increments user points (from the timer's duration)
     - increments pomodoro_sessions count
-    - updates a collection entry
+    - records the session in the pomodoro history
     """
     user_id = request.user['user_id']
-    data = request.get_json()
+    now = datetime.utcnow()
 
-    # You can send these from the frontend
-    duration_minutes = data.get('duration_minutes', 25)
-    label = data.get('label', 'Pomodoro Session')
-    # simple points rule: 2 point per 25 minutes
-    timer_points = data.get('points', max(2, round(duration_minutes / 25)))
-
-    # Get the actual points to add after checking daily limit
-    actual_points_to_add = check_daily_point_limit(user_id, timer_points)
+    # Taking the timer out is what makes a completion count exactly once
+    timer = timers_collection.find_one_and_delete({
+        '_id': ObjectId(user_id),
+        'state': RUNNING,
+        'expires_at': {'$lte': now + timedelta(seconds=TIMER_GRACE_SECONDS)}
+    })
+    if not timer:
+        timer = timers_collection.find_one({'_id': ObjectId(user_id)})
+        if not timer:
+            return jsonify({'error': 'No timer to complete'}), 400
+        return jsonify({
+            'error': 'Timer has not finished',
+            'timer': timer_body(timer, now)
+        }), 400
+    timer_scheduler.cancel(user_id)
 
-    # Update user doc: points, pomodoro_sessions, and collection
-    update_fields = {
-        'points': actual_points_to_add,  # Use the actual points returned
-        'pomodoro_sessions': 1,
-    }
+    duration_minutes = timer['duration_minutes']
+    # simple points rule: 2 point per 25 minutes
+    timer_points = max(2, round(duration_minutes / 25))
 
-    users_collection.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$inc': update_fields}
+    # Award points (after checking daily limit) and count the session in one update
+    actual_points_to_add, user = check_daily_point_limit(
+        user_id,
+        timer_points,
+        inc={'pomodoro_sessions': 1}
     )
 
-    # Insert a row into pomodoro_collection for history
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Queue a row for pomodoro_collection's history; GET /api/pomodoro/sessions
+    # may not show it until the next flush
     pomodoro_session = {
         'user_id': user_id,
-        'label': label,
+        'label': timer.get('label'),
         'duration_minutes': duration_minutes,
         'points_earned': actual_points_to_add,  # Use actual points added
-        'completed_at': datetime.utcnow(),
+        'completed_at': now,
     }
 
-    pomodoro_collection.insert_one(pomodoro_session)
-
-    # Return updated user info
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    if history_queue:
+        history_queue.put(pomodoro_session)
+    else:
+        pomodoro_collection.insert_one(pomodoro_session)
 
     return jsonify({
         'success': True,
@@ -693,19 +1261,83 @@ def complete_timer():
         'pomodoro_sessions': user.get('pomodoro_sessions', 0),
     })
 
+MAX_SESSIONS_PER_PAGE = 500
+
+# PST as an offset string for aggregation date operators (matches PST above)
+PST_UTC_OFFSET = '-08:00'
+
+
 @app.route('/api/pomodoro/sessions', methods=['GET'])
 @require_auth
 def get_sessions():
-    """Get user's pomodoro sessions history"""
+    """
+    Get user's pomodoro sessions history, newest first.
+
+    Takes the same start/end, limit/cursor and format=ndjson query args
+    as GET /api/tasks, MAX_SESSIONS_PER_PAGE a page by default.
+    """
     user_id = request.user['user_id']
+    query = {'user_id': user_id}
 
-    sessions = list(pomodoro_collection.find({'user_id': user_id}))
+    try:
+        window = parse_iso_window(request.args)
+        if window:
+            query['completed_at'] = window
+
+        limit = parse_limit(request.args.get('limit'), MAX_SESSIONS_PER_PAGE, MAX_SESSIONS_PER_PAGE)
+        if request.args.get('cursor'):
+            query.update(keyset_filter('completed_at', request.args['cursor'], descending=True))
+    except ValueError:
+        return jsonify({'error': 'Invalid start, end, limit or cursor'}), 400
+
+    # Served by the (user_id, completed_at, _id) index
+    cursor = readonly_pomodoro_collection.find(query, {'user_id': 0}).sort([('completed_at', -1), ('_id', -1)])
+    return paged_response(cursor, limit, 'completed_at', 'sessions')
+
+
+@app.route('/api/pomodoro/sessions/summary', methods=['GET'])
+@require_auth
+def get_sessions_summary():
+    """Get user's pomodoro totals, per PST day and per label (optional start/end window)"""
+    user_id = request.user['user_id']
+    match = {'user_id': user_id}
 
-    # Convert ObjectId to string
-    for session in sessions:
-        session['_id'] = str(session['_id'])
+    try:
+        window = parse_iso_window(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid start or end'}), 400
+    if window:
+        match['completed_at'] = window
+
+    totals = {
+        'sessions': {'$sum': 1},
+        'minutes': {'$sum': '$duration_minutes'},
+        'points': {'$sum': '$points_earned'}
+    }
+    pst_day = {'$dateToString': {
+        'format': '%Y-%m-%d',
+        'date': '$completed_at',
+        'timezone': PST_UTC_OFFSET
+    }}
+
+    result = next(readonly_pomodoro_collection.aggregate([
+        {'$match': match},
+        {'$facet': {
+            'total': [{'$group': {'_id': None, **totals}}],
+            'by_day': [{'$group': {'_id': pst_day, **totals}}, {'$sort': {'_id': 1}}],
+            'by_label': [{'$group': {'_id': '$label', **totals}}, {'$sort': {'sessions': -1}}]
+        }}
+    ]))
 
-    return jsonify({'sessions': sessions})
+    total = result['total'][0] if result['total'] else {}
+
+    return jsonify({
+        'total_sessions': total.get('sessions', 0),
+        'total_minutes': total.get('minutes', 0),
+        'total_points': total.get('points', 0),
+        'by_day': [{'date': day.pop('_id'), **day} for day in result['by_day']],
+        'by_label': [{'label': label.pop('_id'), **label} for label in result['by_label']]
+    })
 
 
 # ==================== LEVEL/EXPERIENCE ROUTES ====================
@@ -722,12 +1354,7 @@ def xp_for_next_level(current_level):
 
 def get_xp_for_rarity(stars):
     """Get XP reward based on rarity"""
-    xp_rewards = {
-        3: 15,  # 3-star = 10 XP
-        4: 100,  # 4-star = 100 XP
-        5: 1500  # 5-star = 1500 XP
-    }
-    return xp_rewards[stars]
+    return CATALOG.xp[stars]
 
 
 @app.route('/api/profile/stats', methods=['GET'])
@@ -735,7 +1362,7 @@ def get_xp_for_rarity(stars):
 def get_profile_stats():
     """Get user's level and experience"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    user = user_store.progress(user_id)
 
     if user:
         # Initialize level and experience if they don't exist (for existing users)
@@ -744,28 +1371,33 @@ def get_profile_stats():
                 {'_id': ObjectId(user_id)},
                 {'$set': {'level': 1, 'experience': 0}}
             )
-            user['level'] = 1
-            user['experience'] = 0
+            user_store.invalidate(user_id)
 
-        level = user.get('level', 1)
-        experience = user.get('experience', 0)
+        return jsonify(profile_stats_body(user))
 
-        # Calculate progress to next level
-        current_level_xp = (level - 1) * 100
-        xp_in_current_level = experience - current_level_xp
-        xp_needed_for_next = 100
+    return jsonify({'error': 'User not found'}), 404
 
-        return jsonify({
-            'level': level,
-            'experience': experience,
-            'xp_in_current_level': xp_in_current_level,
-            'xp_needed_for_next': xp_needed_for_next
-        })
 
-    return jsonify({'error': 'User not found'}), 404
+def profile_stats_body(user):
+    """Level and progress to the next level (missing fields count as level 1, 0 XP)"""
+    level = user.get('level', 1)
+    experience = user.get('experience', 0)
+
+    # Calculate progress to next level
+    current_level_xp = (level - 1) * 100
+    xp_in_current_level = experience - current_level_xp
+    xp_needed_for_next = 100
+
+    return {
+        'level': level,
+        'experience': experience,
+        'xp_in_current_level': xp_in_current_level,
+        'xp_needed_for_next': xp_needed_for_next
+    }
 
 
 @app.route('/api/collection/release', methods=['OPTIONS'])
+@app.route('/api/collection/release/bulk', methods=['OPTIONS'])
 def handle_release_options():
     """Handle OPTIONS preflight for release endpoint"""
     response = jsonify({'status': 'ok'})
@@ -775,100 +1407,97 @@ def handle_release_options():
     return response, 200
 
 
-@app.route('/api/collection/release', methods=['POST'])
-@require_auth
-def release_character():
-    """Release a character for XP"""
-    user_id = request.user['user_id']
-    data = request.get_json()
-
-    char_name = data.get('character')
-    release_count = data.get('count', 1)  # Allow releasing multiple
+def release_characters(user_id, release_counts):
+    """
+    Release characters for XP, release_counts maps character name -> copies.
 
-    if not char_name:
-        return jsonify({'error': 'Character name required'}), 400
+    Ownership is checked against one read; the collection changes, the XP
+    gain and the level recalculation are then applied in one atomic update
+    that only matches if those counts haven't changed in between.
+    Returns (response body, status code).
+    """
+    if not release_counts:
+        return {'error': 'Character name required'}, 400
 
-    if release_count < 1:
-        return jsonify({'error': 'Invalid count'}), 400
+    total_xp_gained = 0
+    for char_name, release_count in release_counts.items():
+        # Get character rarity
+        character = CATALOG.get(char_name)
+        if not character:
+            return {'error': f'Invalid character: {char_name}'}, 400
 
-    # Get character rarity
-    char_rarity = None
-    all_chars = (
-            [(name, 5) for name in FIVE_STAR_POOL] +
-            [(name, 4) for name in FOUR_STAR_POOL] +
-            [(name, 3) for name in THREE_STAR_POOL]
-    )
+        if type(release_count) is not int or release_count < 1:
+            return {'error': 'Invalid count'}, 400
 
-    for name, stars in all_chars:
-        if name == char_name:
-            char_rarity = stars
-            break
+        # Calculate XP reward
+        total_xp_gained += character.xp * release_count
 
-    if not char_rarity:
-        return jsonify({'error': 'Invalid character'}), 400
+    # Check if user owns these characters (not from the profile cache: the
+    # counts become the update's guard)
+    user = user_store.get(user_id, ('collection', 'level'), fresh=True)
+    if not user:
+        return {'error': 'User not found'}, 404
 
-    # Check if user owns this character
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
     collection = user.get('collection', {})
+    query = {'_id': ObjectId(user_id)}
+    remaining = {}
+    released_all = []
+
+    for char_name, release_count in release_counts.items():
+        current_count = collection.get(char_name, 0)
+        if current_count < release_count:
+            return {'error': f'Only own {current_count} {char_name}, cannot release {release_count}'}, 400
+
+        # Remove copies of the character
+        query[f'collection.{char_name}'] = current_count
+        if current_count == release_count:
+            released_all.append(f'collection.{char_name}')
+        else:
+            remaining[f'collection.{char_name}'] = current_count - release_count
 
-    current_count = collection.get(char_name, 0)
-    if current_count < release_count:
-        return jsonify({'error': f'Only own {current_count}, cannot release {release_count}'}), 400
-
-    # Calculate XP reward
-    xp_per_char = get_xp_for_rarity(char_rarity)
-    total_xp_gained = xp_per_char * release_count
-
-    # Remove copies of the character
-    new_count = current_count - release_count
+    # Level/xp default to 1/0 for users that don't have them yet
+    pipeline = [
+        {'$set': {
+            **remaining,
+            'experience': {'$add': [{'$ifNull': ['$experience', 0]}, total_xp_gained]}
+        }},
+        {'$set': {'level': {'$max': [
+            {'$ifNull': ['$level', 1]},
+            {'$add': [{'$floor': {'$divide': ['$experience', 100]}}, 1]}
+        ]}}},
+    ]
+    if released_all:
+        pipeline.append({'$project': {field: 0 for field in released_all}})
+
+    updated_user = users_collection.find_one_and_update(
+        query,
+        pipeline,
+        projection=dict(PROFILE_PROJECTION, name=1, picture=1, email=1),
+        return_document=ReturnDocument.AFTER
+    )
 
-    # Initialize level/xp if not exists
-    if 'level' not in user:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'level': 1, 'experience': 0}}
-        )
-        user['level'] = 1
-        user['experience'] = 0
+    if not updated_user:
+        # A retry reads the database again anyway; drop what other routes would serve
+        user_store.invalidate(user_id)
+        return {'error': 'Collection changed, please try again'}, 409
 
-    # Update user's collection and experience
-    if new_count == 0:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {
-                '$unset': {f'collection.{char_name}': ''},
-                '$inc': {'experience': total_xp_gained}
-            }
-        )
-    else:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {
-                '$set': {f'collection.{char_name}': new_count},
-                '$inc': {'experience': total_xp_gained}
-            }
-        )
+    user_store.write_through(user_id, updated_user)
+    leaderboard.record_xp_change(updated_user)
+    friend_boards.invalidate(user_id)
 
-    # Get updated user data
-    updated_user = users_collection.find_one({'_id': ObjectId(user_id)})
     new_experience = updated_user.get('experience', 0)
-    old_level = updated_user.get('level', 1)
-    new_level = calculate_level_from_xp(new_experience)
+    new_level = updated_user.get('level', 1)
+    leveled_up = new_level > user.get('level', 1)
 
-    leveled_up = new_level > old_level
-
-    # Update level if leveled up
     if leveled_up:
-        users_collection.update_one(
-            {'_id': ObjectId(user_id)},
-            {'$set': {'level': new_level}}
-        )
+        publish_event(user_id, LEVEL_UP, {'level': new_level, 'experience': new_experience})
+    publish_friend_ranking(user_id)
 
     # Calculate progress
     current_level_xp = (new_level - 1) * 100
     xp_in_current_level = new_experience - current_level_xp
 
-    return jsonify({
+    return {
         'success': True,
         'xp_gained': total_xp_gained,
         'total_xp': new_experience,
@@ -877,25 +1506,59 @@ def release_character():
         'xp_in_current_level': xp_in_current_level,
         'xp_needed_for_next': 100,
         'collection': updated_user.get('collection', {})
-    })
+    }, 200
+
+
+@app.route('/api/collection/release', methods=['POST'])
+@require_auth
+def release_character():
+    """Release a character for XP"""
+    user_id = request.user['user_id']
+    data = request.get_json()
+
+    char_name = data.get('character')
+    release_count = data.get('count', 1)  # Allow releasing multiple
+
+    if not char_name:
+        return jsonify({'error': 'Character name required'}), 400
+
+    body, status = release_characters(user_id, {char_name: release_count})
+    return jsonify(body), status
+
+
+@app.route('/api/collection/release/bulk', methods=['POST'])
+@require_auth
+def release_characters_bulk():
+    """Release many characters for XP in one request"""
+    user_id = request.user['user_id']
+    data = request.get_json()
+
+    # e.g. {"characters": {"Tan": 12, "Gray": 3}}
+    release_counts = data.get('characters')
+    if not isinstance(release_counts, dict):
+        return jsonify({'error': 'characters must map names to counts'}), 400
+
+    body, status = release_characters(user_id, release_counts)
+    return jsonify(body), status
 
 
 # ==================== SETTINGS ROUTES ====================
 
+DEFAULT_SETTINGS = {
+    'background_type': 'gradient',
+    'background_value': 'gradient-1',
+    'dark_mode': False
+}
+
 @app.route('/api/settings', methods=['GET'])
 @require_auth
 def get_settings():
     """Get user's settings"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
+    settings = user_store.settings(user_id, DEFAULT_SETTINGS)
 
-    if user:
-        default_settings = {
-            'background_type': 'gradient',
-            'background_value': 'gradient-1',
-            'dark_mode': False
-        }
-        return jsonify({'settings': user.get('settings', default_settings)})
+    if settings is not None:
+        return jsonify({'settings': settings})
 
     return jsonify({'error': 'User not found'}), 404
 
@@ -913,10 +1576,25 @@ def update_settings():
         {'_id': ObjectId(user_id)},
         {'$set': {'settings': settings}}
     )
+    user_store.invalidate(user_id)
 
     return jsonify({'success': True, 'settings': settings})
 
 
+# Background images live in GridFS, keyed by content hash; settings keep a URL
+image_store = ImageStore(lambda: mongo.database, max_bytes=int(os.getenv('MAX_BACKGROUND_IMAGE_BYTES', 5 * 1024 * 1024)))
+
+# Uploads are the largest bodies the API takes: refuse anything bigger than
+# an image plus its multipart framing from Content-Length, before reading it
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+app.config['MAX_CONTENT_LENGTH'] = image_store.max_bytes + MULTIPART_OVERHEAD_BYTES
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    return jsonify({'error': f'Request too large (max {image_store.max_bytes // (1024 * 1024)}MB)'}), 413
+
+
 @app.route('/api/settings/background-image', methods=['POST'])
 @require_auth
 def upload_background_image():
@@ -938,27 +1616,66 @@ def upload_background_image():
     if file_ext not in allowed_extensions:
         return jsonify({'error': 'Invalid file type. Use PNG, JPG, JPEG, GIF, or WEBP'}), 400
 
-    # Read file as base64
-    import base64
-    file_data = file.read()
-    base64_image = base64.b64encode(file_data).decode('utf-8')
-    data_uri = f"data:image/{file_ext};base64,{base64_image}"
+    # Optional downscale target, e.g. ?width=1920
+    max_width = request.args.get('width', type=int)
+    if max_width is not None and max_width not in STANDARD_WIDTHS:
+        return jsonify({'error': f'width must be one of {list(STANDARD_WIDTHS)}'}), 400
 
-    # Update user's settings with the image
+    # Read one byte past the limit so oversized uploads are caught without buffering them
+    file_data = file.read(image_store.max_bytes + 1)
+    if len(file_data) > image_store.max_bytes:
+        return jsonify({'error': f'Image too large (max {image_store.max_bytes // (1024 * 1024)}MB)'}), 413
+
+    try:
+        image_data, mimetype = prepare_image(file_data, max_width)
+        image_id = image_store.put(image_data, mimetype)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Update user's settings with a reference to the image
+    url = image_url(image_id)
     users_collection.update_one(
         {'_id': ObjectId(user_id)},
         {'$set': {
             'settings.background_type': 'image',
-            'settings.background_value': data_uri
+            'settings.background_value': url
         }}
     )
+    user_store.invalidate(user_id)
 
     return jsonify({
         'success': True,
-        'image_url': data_uri
+        'image_url': url
     })
 
 
+@app.route('/api/images/<image_id>', methods=['GET'])
+def get_image(image_id):
+    """Stream a stored image (public: CSS url() can't send auth headers)"""
+    if not re.fullmatch(r'[0-9a-f]{64}', image_id):
+        return jsonify({'error': 'Image not found'}), 404
+
+    grid_out = image_store.open(image_id)
+    if grid_out is None:
+        return jsonify({'error': 'Image not found'}), 404
+
+    response = app.response_class(
+        wrap_file(request.environ, grid_out),
+        mimetype=grid_out.content_type,
+        direct_passthrough=True
+    )
+    response.content_length = grid_out.length
+
+    # Content-addressed, so the hash is the ETag and the bytes never change
+    response.set_etag(image_id)
+    response.cache_control.public = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+
+    # Handles If-None-Match (304) and Range (206)
+    return response.make_conditional(request, accept_ranges=True, complete_length=grid_out.length)
+
+
 # =================== PROFILE SETTINGS ====================
 @app.route('/api/user/displayed-characters', methods=['GET'])
 @require_auth
@@ -967,13 +1684,11 @@ def get_displayed_characters():
     user_id = request.user['user_id']
 
     try:
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
+        displayed_characters = user_store.displayed_characters(user_id)
 
-        if not user:
+        if displayed_characters is None:
             return jsonify({'error': 'User not found'}), 404
 
-        displayed_characters = user.get('displayed_characters', [])
-
         return jsonify({
             'displayed_characters': displayed_characters
         }), 200
@@ -1001,11 +1716,10 @@ def update_displayed_characters():
 
     try:
         # Verify all characters are in user's collection
-        user = users_collection.find_one({'_id': ObjectId(user_id)})
-        collection = user.get('collection', {})
+        collection = user_store.collection_of(user_id, fresh=True) or {}
 
         for character_name in displayed_characters:
-            if character_name not in collection:
+            if character_name not in CATALOG or character_name not in collection:
                 return jsonify({
                     'error': f'{character_name} is not in your collection'
                 }), 400
@@ -1015,6 +1729,7 @@ def update_displayed_characters():
             {'_id': ObjectId(user_id)},
             {'$set': {'displayed_characters': displayed_characters}}
         )
+        user_store.invalidate(user_id)
 
         return jsonify({
             'success': True,
@@ -1028,39 +1743,41 @@ def update_displayed_characters():
 
 # ==================== LEADERBOARD & PUBLIC PROFILE ROUTES ====================
 
+# Top 100 by (level, experience), reloaded every LEADERBOARD_TTL seconds and
+# updated in between whenever a release on this worker changes someone's XP
+leaderboard = Leaderboard(
+    readonly_users_collection,
+    size=100,
+    ttl=int(os.getenv('LEADERBOARD_TTL', 30)),
+    dumps=app.json.dumps
+)
+
 @app.route('/api/leaderboard', methods=['GET'])
 @require_auth
 def get_leaderboard():
     """Get top users by level/experience (public data only)"""
-    # Get top 100 users by level, then by experience
-    top_users = list(users_collection.find(
-        {},
-        {
-            'name': 1,
-            'picture': 1,
-            'level': 1,
-            'experience': 1,
-            'email': 1,
-            '_id': 0
-        }
-    ).sort([('level', -1), ('experience', -1)]).limit(100))
+    # Served from the materialized top 100, already serialized
+    return app.response_class(leaderboard.response_body(), mimetype='application/json')
+
+
+@app.route('/api/leaderboard/me', methods=['GET'])
+@require_auth
+def get_my_rank():
+    """Get the current user's leaderboard rank, even outside the top 100"""
+    user_id = request.user['user_id']
+    user = user_store.progress(user_id)
 
-    # Sanitize data - only show email domain, not full email
-    for user in top_users:
-        if 'email' in user:
-            email_parts = user['email'].split('@')
-            if len(email_parts) == 2:
-                # Show first letter + *** @ domain
-                user['email_display'] = f"{email_parts[0][0]}***@{email_parts[1]}"
-            else:
-                user['email_display'] = "***"
-            del user['email']  # Remove full email
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
 
-        # Ensure level/xp exist
-        user['level'] = user.get('level', 1)
-        user['experience'] = user.get('experience', 0)
+    rank = leaderboard.rank_of(user)
 
-    return jsonify({'leaderboard': top_users})
+    return jsonify({
+        'rank': rank,
+        'level': user.get('level', 1),
+        'experience': user.get('experience', 0),
+        'in_top': rank <= leaderboard.size
+    })
 
 
 @app.route('/api/user/public-profile', methods=['POST'])
@@ -1074,7 +1791,7 @@ def get_public_profile():
         return jsonify({'error': 'Email required'}), 400
 
     # Find user by email
-    user = users_collection.find_one(
+    user = readonly_users_collection.find_one(
         {'email': search_email},
         {
             'name': 1,
@@ -1100,8 +1817,7 @@ def get_public_profile():
     unique_poms = len(collection)
 
     # Sanitize email - only show domain
-    email_parts = search_email.split('@')
-    email_display = f"{email_parts[0][0]}***@{email_parts[1]}" if len(email_parts) == 2 else "***"
+    email_display = mask_email(search_email)
 
     return jsonify({
         'profile': {
@@ -1122,18 +1838,49 @@ def get_public_profile():
 
 # ==================== FRIENDS/LEADERBOARD ROUTES ====================
 
+# Friends are stored as `friend_ids` (user _id references). Boards are cached
+# per user and dropped whenever a member's XP or the friends list changes:
+# directly in the worker that made the change, and through the friend_ranking
+# event in every worker listening to the broker. With the 'local' broker that
+# is only this worker, so the TTL bounds how stale other workers' boards get
+friend_boards = FriendBoards(
+    users_collection,
+    ttl=int(os.getenv('FRIENDS_BOARD_TTL', 300 if EVENT_BROKER == 'redis' else 10))
+)
+
+
+def drop_friend_board(user_id, event, data):
+    """Broker listener: a friend_ranking event means user_id's board changed"""
+    if event == FRIEND_RANKING_CHANGED:
+        friend_boards.invalidate(user_id)
+
+
+def listen_for_board_changes():
+    event_broker.listen(drop_friend_board)
+
+
+# Before a board can be cached in this worker (started like the indexes)
+board_listener = IndexBootstrap(listen_for_board_changes, mode='blocking')
+
+def publish_friend_ranking(user_id):
+    """Tell the user and everyone whose friends board shows them that it changed"""
+    try:
+        owners = [str(user['_id']) for user in users_collection.find(
+            {'friend_ids': ObjectId(user_id)}, {'_id': 1}
+        )]
+    except Exception as e:
+        print(f"Could not look up who friended {user_id}: {str(e)}")
+        owners = []
+    for owner in [user_id] + owners:
+        publish_event(owner, FRIEND_RANKING_CHANGED, {'user_id': user_id})
+
+
 @app.route('/api/friends', methods=['GET'])
 @require_auth
 def get_friends():
     """Get user's friends list"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
-
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
-    friends = user.get('friends', [])
-    return jsonify({'friends': friends})
+    return jsonify({'friends': friend_boards.friend_emails(ObjectId(user_id))})
 
 
 @app.route('/api/friends', methods=['POST'])
@@ -1148,30 +1895,26 @@ def add_friend():
     if not friend_email:
         return jsonify({'error': 'Email required'}), 400
 
-    # Get current user
-    current_user = users_collection.find_one({'_id': ObjectId(user_id)})
-
-    # Prevent adding yourself
-    if current_user.get('email', '').lower() == friend_email:
-        return jsonify({'error': 'Cannot add yourself as a friend'}), 400
-
     # Check if friend exists
-    friend = users_collection.find_one({'email': friend_email})
+    friend = users_collection.find_one({'email': friend_email}, {'name': 1})
     if not friend:
         return jsonify({'error': 'User not found'}), 404
 
-    # Get current friends list
-    friends = current_user.get('friends', [])
+    # Prevent adding yourself
+    if str(friend['_id']) == user_id:
+        return jsonify({'error': 'Cannot add yourself as a friend'}), 400
+
+    # Add friend to list, unless they're already on it
+    result = users_collection.update_one(
+        {'_id': ObjectId(user_id), 'friend_ids': {'$ne': friend['_id']}},
+        {'$push': {'friend_ids': friend['_id']}}
+    )
 
-    # Check if already friends
-    if friend_email in friends:
+    if result.matched_count == 0:
         return jsonify({'error': 'Already in your friends list'}), 400
 
-    # Add friend to list
-    users_collection.update_one(
-        {'_id': ObjectId(user_id)},
-        {'$push': {'friends': friend_email}}
-    )
+    friend_boards.invalidate(user_id)
+    publish_event(user_id, FRIEND_RANKING_CHANGED, {'user_id': user_id})
 
     return jsonify({
         'success': True,
@@ -1186,15 +1929,22 @@ def remove_friend(email):
     user_id = request.user['user_id']
     friend_email = email.strip().lower()
 
+    friend = users_collection.find_one({'email': friend_email}, {'_id': 1})
+    if not friend:
+        return jsonify({'error': 'Friend not found in list'}), 404
+
     # Remove friend from list
     result = users_collection.update_one(
         {'_id': ObjectId(user_id)},
-        {'$pull': {'friends': friend_email}}
+        {'$pull': {'friend_ids': friend['_id']}}
     )
 
     if result.modified_count == 0:
         return jsonify({'error': 'Friend not found in list'}), 404
 
+    friend_boards.invalidate(user_id)
+    publish_event(user_id, FRIEND_RANKING_CHANGED, {'user_id': user_id})
+
     return jsonify({
         'success': True,
         'message': 'Friend removed'
@@ -1206,50 +1956,114 @@ def remove_friend(email):
 def get_friends_leaderboard():
     """Get leaderboard of user's friends + current user"""
     user_id = request.user['user_id']
-    user = users_collection.find_one({'_id': ObjectId(user_id)})
 
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
+    # One $lookup aggregation (or a cache hit); empty if the user has no friends
+    return jsonify({'leaderboard': friend_boards.leaderboard(ObjectId(user_id))})
 
-    friends = user.get('friends', [])
+# ==================== DASHBOARD ROUTES ====================
 
-    if not friends:
-        return jsonify({'leaderboard': []})
+# Each section is the body its standalone route would return
+DASHBOARD_SECTIONS = {
+    'points': lambda user: {'points': user.get('points', 0)},
+    'daily_points': lambda user: daily_points_body(user.get('daily_points', {})),
+    'checkin': lambda user: checkin_status_body(user.get('daily_points', {})),
+    'stats': profile_stats_body,
+    'collection': lambda user: {'collection': user.get('collection', {})},
+    'settings': lambda user: {'settings': user.get('settings', DEFAULT_SETTINGS)},
+    'displayed_characters': lambda user: {'displayed_characters': user.get('displayed_characters', [])},
+    'tasks': None  # Not from the user document, see load_dashboard_tasks
+}
 
-    # Get all friends' profiles + current user
-    # Create a list that includes both friends and current user's email
-    emails_to_fetch = friends + [user.get('email')]
+# Runs the dashboard's tasks query while the user is being read
+dashboard_executor = ThreadPoolExecutor(max_workers=int(os.getenv('DASHBOARD_WORKERS', 8)))
 
-    friends_data = list(users_collection.find(
-        {'email': {'$in': emails_to_fetch}},
-        {
-            'name': 1,
-            'picture': 1,
-            'level': 1,
-            'experience': 1,
-            'email': 1,
-            '_id': 0
-        }
-    ).sort([('level', -1), ('experience', -1)]))
 
-    # Format the data - keep full email for frontend to use
-    for friend in friends_data:
-        friend['level'] = friend.get('level', 1)
-        friend['experience'] = friend.get('experience', 0)
-        # Store full email as email_display for consistency with frontend
-        friend['email_display'] = friend['email']
+def parse_dashboard_sections(value):
+    """Section names from ?sections=a,b (all if empty), raises ValueError on unknown ones"""
+    sections = value.split(',') if value else list(DASHBOARD_SECTIONS)
+    unknown = [section for section in sections if section not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise ValueError(f'Unknown sections: {", ".join(unknown)}')
+    return sections
+
+
+def load_dashboard_tasks(user_id, window):
+    """Same body as GET /api/tasks for a window (first page only)"""
+    docs = load_task_docs(user_id, window, limit=MAX_TASKS_PER_PAGE)
+    return page_body(occurrence_ids(paginate(docs, MAX_TASKS_PER_PAGE, 'start')), 'tasks')
+
+
+@app.route('/api/dashboard', methods=['GET'])
+@require_auth
+def get_dashboard():
+    """
+    Get several profile widgets in one request.
+
+    ?sections=points,stats,... picks which ones (default: all of
+    DASHBOARD_SECTIONS); start/end restrict the tasks window like
+    GET /api/tasks. The user is read once for every section.
+    """
+    user_id = request.user['user_id']
+
+    try:
+        sections = parse_dashboard_sections(request.args.get('sections'))
+        window = parse_iso_window(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    tasks = None
+    if 'tasks' in sections:
+        # Copied context so the query still counts towards this request's round trips
+        tasks = dashboard_executor.submit(
+            contextvars.copy_context().run, load_dashboard_tasks, user_id, window
+        )
+
+    body = {}
+    user_sections = [section for section in sections if section != 'tasks']
+    if user_sections:
+        user = user_store.get(user_id, PROFILE_FIELDS)
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
+        for section in user_sections:
+            body[section] = DASHBOARD_SECTIONS[section](user)
+
+    if tasks is not None:
+        body['tasks'] = tasks.result()
+
+    return jsonify(body)
 
-    return jsonify({'leaderboard': friends_data})
 
 # ==================== HEALTH CHECK AND ERROR HANDLING ====================
 
+@app.before_request
+def start_round_trip_count():
+    reset_round_trips()
+    metrics.start(request.method, request.url_rule.rule if request.url_rule else None)
+
+
+@app.after_request
+def report_round_trips(response):
+    """Expose the request's MongoDB round trips outside production"""
+    if not IS_PRODUCTION:
+        response.headers['X-DB-Round-Trips'] = str(round_trips())
+    if response.is_streamed:
+        # The body (and its reads) is produced after this hook, time it until it's closed
+        status, path = response.status_code, request.path
+        response.call_on_close(lambda: metrics.finish(status, path))
+    else:
+        metrics.finish(response.status_code, request.path)
+    return response
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     """Catch-all error handler"""
     # Log the full error server-side
-    print(f"ERROR: {str(e)}")
+    print(f"ERROR in {request.method} {request.path}: {str(e)}")
     import traceback
     traceback.print_exc()
+    if not isinstance(e, HTTPException):
+        metrics.record_exception()
 
     # Return sanitized error to client
     if IS_PRODUCTION:
@@ -1266,12 +2080,81 @@ def handle_exception(e):
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'database': 'connected'})
+    return jsonify({
+        'status': 'healthy',
+        'database': 'connected',
+        'profile_cache': user_store.cache.stats(),
+        'mongo_pool': mongo.stats(),
+        'requests': metrics.totals(),
+        'history_queue': history_queue.stats() if history_queue else None,
+        'events': event_hub.stats(),
+        'timers_scheduled': len(timer_scheduler)
+    })
+
+
+# Scrapers send METRICS_TOKEN as a bearer token, or connect from an address
+# in METRICS_ALLOW (comma-separated IPs or networks, loopback by default)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')
+METRICS_ALLOW = [
+    ipaddress.ip_network(network.strip())
+    for network in os.getenv('METRICS_ALLOW', '127.0.0.1,::1').split(',') if network.strip()
+]
 
-if __name__ == '__main__':
-    # Create indexes for better query performance
-    users_collection.create_index('google_id', unique=True)
-    users_collection.create_index('email')
-    tasks_collection.create_index([('user_id', 1), ('start', 1)])
 
+def metrics_allowed():
+    """True if the request may read /metrics"""
+    if METRICS_TOKEN and secrets.compare_digest(
+            request.headers.get('Authorization', ''), f'Bearer {METRICS_TOKEN}'):
+        return True
+    try:
+        address = ipaddress.ip_address(request.remote_addr or '')
+    except ValueError:
+        return False
+    return any(address in network for network in METRICS_ALLOW)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics for this worker process"""
+    if not metrics_allowed():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    pool = mongo.stats()
+    cache = user_store.cache.stats()
+    extra = [
+        ('pomtime_mongo_pool_open_connections', 'gauge', 'Open connections to MongoDB', pool['open']),
+        ('pomtime_mongo_pool_checked_out_connections', 'gauge', 'Connections in use', pool['checked_out']),
+        ('pomtime_mongo_pool_timeouts_total', 'counter', 'Connection checkouts that timed out',
+         pool['pool_timeouts']),
+        ('pomtime_profile_cache_hits_total', 'counter', 'Profile cache hits', cache['hits']),
+        ('pomtime_profile_cache_misses_total', 'counter', 'Profile cache misses', cache['misses'])
+    ]
+    streams = event_hub.stats()
+    extra += [
+        ('pomtime_timers_scheduled', 'gauge', 'Running timers waiting to expire', len(timer_scheduler)),
+        ('pomtime_timer_expiries_total', 'counter', 'Timers that ran out', timer_scheduler.fired),
+        ('pomtime_event_streams', 'gauge', 'Open event streams', streams['connections']),
+        ('pomtime_events_delivered_total', 'counter', 'Events sent to streams', streams['delivered']),
+        ('pomtime_events_dropped_total', 'counter', 'Events dropped from full streams', streams['dropped'])
+    ]
+    if history_queue:
+        history = history_queue.stats()
+        extra += [
+            ('pomtime_history_queue_pending', 'gauge', 'Pomodoro history rows waiting to be written',
+             history['pending']),
+            ('pomtime_history_rows_written_total', 'counter', 'Pomodoro history rows written in batches',
+             history['flushed']),
+            ('pomtime_history_batches_total', 'counter', 'insert_many batches of pomodoro history',
+             history['batches']),
+            ('pomtime_history_flush_failures_total', 'counter', 'Failed pomodoro history flushes',
+             history['failures'])
+        ]
+    return Response(metrics.render(extra), mimetype='text/plain; version=0.0.4')
+
+
+# Every route is registered by now
+metrics.register_routes(app.url_map)
+
+if __name__ == '__main__':
+    timer_scheduler.start()
     app.run(debug=DEBUG_MODE, host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,332 @@
+"""
+ASGI entry point for running the server asynchronously:
+
+    uvicorn asgi:application --workers 4
+
+The endpoints the frontend polls (and the dashboard) are served natively on
+PyMongo's AsyncMongoClient, so a slow client or a slow query no longer ties
+up a worker thread and independent queries run concurrently. Every other
+route is handed to the Flask app unchanged (in a thread, via asgiref).
+Response bodies come from the same helpers the Flask routes use.
+
+GET /api/events is the push channel: a server-sent event stream of the
+user's events (see events.py), held open on the event loop.
+"""
+import asyncio
+import traceback
+from datetime import datetime
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from bson.objectid import ObjectId
+from pymongo import AsyncMongoClient
+
+from app import (
+    CORS_ORIGINS, DASHBOARD_SECTIONS, DB_NAME, DEFAULT_SETTINGS, IS_PRODUCTION,
+    MAX_TASKS_PER_PAGE, MONGODB_URI, TASK_PROJECTION, app, board_listener,
+    checkin_status_body, daily_points_body, event_hub, history_queue, index_bootstrap, metrics,
+    migrations, page_body, parse_dashboard_sections, parse_iso_window, profile_stats_body,
+    series_pipeline, session_sweeper, sessions, stored_tasks_query, timer_scheduler, user_store
+)
+from events import HEARTBEAT, HEARTBEAT_SECONDS, RETRY_MS
+from json_provider import dumps_bytes
+from metrics import CommandMetrics
+from mongo import client_options
+from pagination import paginate
+from recurrence import merge_occurrences, occurrence_ids
+from user_store import AsyncUserStore, RoundTripCounter, reset_round_trips, round_trips
+
+# Binds to the event loop of its first operation (one loop per worker)
+async_client = AsyncMongoClient(
+    MONGODB_URI, **client_options([RoundTripCounter(), CommandMetrics(metrics)])
+)
+async_db = async_client[DB_NAME]
+tasks_collection = async_db['tasks']
+users = AsyncUserStore(async_db['users'], cache=user_store.cache)
+
+
+class Request:
+    """The parts of an ASGI HTTP scope the handlers need"""
+
+    def __init__(self, scope):
+        self.method = scope['method']
+        self.path = scope['path']
+        self.headers = {
+            name.decode('latin-1').lower(): value.decode('latin-1')
+            for name, value in scope['headers']
+        }
+        # First value wins, like Flask's request.args
+        self.args = {
+            name: values[0]
+            for name, values in parse_qs(scope['query_string'].decode('latin-1')).items()
+        }
+
+
+# ==================== AUTH ====================
+
+async def authenticate(request):
+    """The session for the request's bearer token, or None"""
+    token = request.headers.get('authorization', '').replace('Bearer ', '')
+    if not token:
+        return None
+
+    # Cache hits don't leave the event loop; misses read Mongo in a thread
+    session_data = sessions.peek(token)
+    if session_data is None:
+        session_data = await asyncio.to_thread(sessions.get, token)
+    if not session_data:
+        return None
+
+    if session_data['expires'] < datetime.utcnow():
+        await asyncio.to_thread(sessions.delete, token)
+        return None
+
+    return session_data
+
+
+# ==================== ROUTES ====================
+
+# path -> handler(request, user_id) returning (body, status); GET only
+ROUTES = {}
+
+
+def route(path):
+    def register(handler):
+        ROUTES[path] = handler
+        return handler
+    return register
+
+
+async def load_series(user_id, window):
+    cursor = await tasks_collection.aggregate(series_pipeline(user_id, window))
+    return await cursor.to_list(None)
+
+
+async def load_tasks(user_id, window):
+    """Same body as GET /api/tasks for a window (first page only)"""
+    cursor = tasks_collection.find(stored_tasks_query(user_id, window), TASK_PROJECTION) \
+        .sort([('start', 1), ('_id', 1)]).limit(MAX_TASKS_PER_PAGE + 1)
+    docs, series = await asyncio.gather(cursor.to_list(None), load_series(user_id, window))
+    docs = merge_occurrences(docs, series, window)
+    return page_body(occurrence_ids(paginate(docs, MAX_TASKS_PER_PAGE, 'start')), 'tasks')
+
+
+def profile_route(path, build):
+    """Register a route whose body is built from the user's profile fields"""
+
+    async def handler(request, user_id):
+        user = await users.profile(user_id)
+        if not user:
+            return {'error': 'User not found'}, 404
+        return build(user), 200
+
+    route(path)(handler)
+
+
+profile_route('/api/points', lambda user: {'points': user.get('points', 0)})
+profile_route('/api/collection', lambda user: {'collection': user.get('collection', {})})
+profile_route('/api/settings', lambda user: {'settings': user.get('settings', DEFAULT_SETTINGS)})
+profile_route('/api/user/daily-points', lambda user: daily_points_body(user.get('daily_points', {})))
+profile_route('/api/checkin', lambda user: checkin_status_body(user.get('daily_points', {})))
+profile_route('/api/user/displayed-characters',
+              lambda user: {'displayed_characters': user.get('displayed_characters', [])})
+
+
+@route('/api/profile/stats')
+async def get_profile_stats(request, user_id):
+    user = await users.profile(user_id)
+    if not user:
+        return {'error': 'User not found'}, 404
+
+    # Initialize level and experience if they don't exist (for existing users)
+    if 'level' not in user:
+        await users.collection.update_one(
+            {'_id': ObjectId(user_id)},
+            {'$set': {'level': 1, 'experience': 0}}
+        )
+        users.invalidate(user_id)
+
+    return profile_stats_body(user), 200
+
+
+@route('/api/dashboard')
+async def get_dashboard(request, user_id):
+    try:
+        sections = parse_dashboard_sections(request.args.get('sections'))
+        window = parse_iso_window(request.args)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+
+    # The user read and the tasks query go out together
+    jobs = {}
+    user_sections = [section for section in sections if section != 'tasks']
+    if user_sections:
+        jobs['user'] = users.profile(user_id)
+    if 'tasks' in sections:
+        jobs['tasks'] = load_tasks(user_id, window)
+    results = dict(zip(jobs, await asyncio.gather(*jobs.values())))
+
+    body = {}
+    if user_sections:
+        user = results['user']
+        if not user:
+            return {'error': 'User not found'}, 404
+        for section in user_sections:
+            body[section] = DASHBOARD_SECTIONS[section](user)
+    if 'tasks' in results:
+        body['tasks'] = results['tasks']
+
+    return body, 200
+
+
+# ==================== EVENT STREAM ====================
+
+EVENTS_PATH = '/api/events'
+
+
+async def wait_for_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream_events(queue, receive, send):
+    """Send the queue's frames (or a heartbeat when idle) until the client goes away"""
+    disconnected = asyncio.ensure_future(wait_for_disconnect(receive))
+    frame = None
+    try:
+        await send({'type': 'http.response.body', 'body': f'retry: {RETRY_MS}\n\n'.encode('latin-1'),
+                    'more_body': True})
+        while True:
+            if frame is None:
+                frame = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait(
+                {frame, disconnected}, timeout=HEARTBEAT_SECONDS, return_when=asyncio.FIRST_COMPLETED
+            )
+            if disconnected in done:
+                return
+            if frame in done:
+                body, frame = frame.result(), None
+            else:
+                body = HEARTBEAT
+            await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+    except OSError:
+        pass  # the connection dropped mid-write
+    finally:
+        disconnected.cancel()
+        if frame is not None:
+            frame.cancel()
+
+
+# ==================== APPLICATION ====================
+
+def cors_headers(request):
+    """Same policy as the Flask-CORS setup in app.py"""
+    origin = request.headers.get('origin')
+    if origin in CORS_ORIGINS:
+        return [
+            (b'access-control-allow-origin', origin.encode('latin-1')),
+            (b'access-control-allow-credentials', b'true'),
+            (b'vary', b'Origin')
+        ]
+    return []
+
+
+class Application:
+    """Dispatches GET requests for ROUTES natively, everything else to Flask"""
+
+    def __init__(self, routes, fallback):
+        self.routes = routes
+        self.fallback = fallback
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        handler = None
+        if scope['type'] == 'http' and scope['method'] == 'GET':
+            if scope['path'] == EVENTS_PATH:
+                return await self.events(scope, receive, send)
+            handler = self.routes.get(scope['path'])
+        if handler is None:
+            return await self.fallback(scope, receive, send)
+
+        reset_round_trips()
+        metrics.start('GET', scope['path'])
+        request = Request(scope)
+        try:
+            session_data = await authenticate(request)
+            if session_data is None:
+                body, status = {'error': 'Unauthorized'}, 401
+            else:
+                body, status = await handler(request, session_data['user_id'])
+        except Exception as e:
+            print(f"ERROR in GET {request.path}: {str(e)}")
+            traceback.print_exc()
+            metrics.record_exception()
+            if IS_PRODUCTION:
+                body = {
+                    'error': 'An error occurred',
+                    'message': 'Please try again or contact support if the problem persists'
+                }
+            else:
+                body = {'error': str(e), 'details': traceback.format_exc()}
+            status = 500
+
+        await self.send_json(send, request, body, status)
+
+    async def events(self, scope, receive, send):
+        """The user's event stream; not timed by metrics (it stays open), see event_hub.stats()"""
+        request = Request(scope)
+        session_data = await authenticate(request)
+        if session_data is None:
+            metrics.start('GET', EVENTS_PATH)
+            return await self.send_json(send, request, {'error': 'Unauthorized'}, 401)
+
+        user_id = session_data['user_id']
+        queue = event_hub.subscribe(user_id)
+        try:
+            headers = [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Stop nginx from buffering the stream
+                (b'x-accel-buffering', b'no')
+            ] + cors_headers(request)
+            await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+            await stream_events(queue, receive, send)
+        finally:
+            event_hub.unsubscribe(user_id, queue)
+
+    async def send_json(self, send, request, body, status):
+        payload = dumps_bytes(body)
+        headers = [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode('latin-1'))
+        ] + cors_headers(request)
+
+        if not IS_PRODUCTION:
+            headers.append((b'x-db-round-trips', str(round_trips()).encode('latin-1')))
+
+        metrics.finish(status, request.path)
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                index_bootstrap()
+                migrations()
+                board_listener()
+                session_sweeper()
+                event_hub.start(asyncio.get_running_loop())
+                timer_scheduler.start()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if history_queue:
+                    history_queue.close()
+                await async_client.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = Application(ROUTES, WsgiToAsgi(app))
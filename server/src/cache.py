@@ -0,0 +1,103 @@
+import heapq
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a time-to-live.
+
+    on_evict(key, value) is called (outside the lock) whenever an entry
+    leaves the cache for any reason other than pop()/clear().
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, on_evict=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (deadline, value), oldest first
+        self._deadlines = []  # heap of (deadline, key), may hold stale pairs
+        self._lock = threading.Lock()
+
+    def _notify(self, evicted):
+        if self.on_evict:
+            for key, value in evicted:
+                self.on_evict(key, value)
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            deadline, value = entry
+            if deadline > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return value
+
+            del self._data[key]
+            self.misses += 1
+
+        self._notify([(key, value)])
+        return default
+
+    def set(self, key, value, ttl=None):
+        """Store a value, evicting the least recently used entry when full"""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            self.pop(key)
+            return
+
+        evicted = []
+        with self._lock:
+            deadline = time.monotonic() + ttl
+            self._data[key] = (deadline, value)
+            self._data.move_to_end(key)
+            heapq.heappush(self._deadlines, (deadline, key))
+            while len(self._data) > self.maxsize:
+                old_key, (_, old_value) = self._data.popitem(last=False)
+                evicted.append((old_key, old_value))
+
+            # Drop stale heap pairs left behind by overwrites and evictions
+            if len(self._deadlines) > 2 * len(self._data) + 64:
+                self._deadlines = [(d, k) for k, (d, _) in self._data.items()]
+                heapq.heapify(self._deadlines)
+
+        self._notify(evicted)
+
+    def pop(self, key, default=None):
+        """Remove a key and return its value (expired or not)"""
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def purge_expired(self, limit=1000):
+        """Evict up to `limit` expired entries, returns how many were removed"""
+        evicted = []
+        now = time.monotonic()
+        with self._lock:
+            while self._deadlines and len(evicted) < limit:
+                deadline, key = self._deadlines[0]
+                if deadline > now:
+                    break
+                heapq.heappop(self._deadlines)
+                entry = self._data.get(key)
+                if entry is not None and entry[0] == deadline:
+                    del self._data[key]
+                    evicted.append((key, entry[1]))
+
+        self._notify(evicted)
+        return len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._deadlines = []
+
+    def __len__(self):
+        return len(self._data)
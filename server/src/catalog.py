@@ -0,0 +1,66 @@
+import json
+import os
+from collections import namedtuple
+from itertools import accumulate
+from types import MappingProxyType
+
+CATALOG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'characters.json')
+
+# index is the character's position within its rarity pool
+Character = namedtuple('Character', ['name', 'stars', 'xp', 'index'])
+
+
+class Catalog:
+    """
+    Immutable index of every gacha character.
+
+    rarities maps stars -> {'rate': chance of rolling that rarity,
+    'xp': XP for releasing one copy}; pools maps stars -> names. Each
+    character gets an equal share of its rarity's rate.
+    """
+
+    def __init__(self, rarities, pools):
+        characters = {}
+        ordered = []
+        weights = []
+        for stars in sorted(pools, reverse=True):
+            names = pools[stars]
+            for index, name in enumerate(names):
+                if name in characters:
+                    raise ValueError(f"Duplicate character in catalog: {name}")
+                character = Character(name, stars, rarities[stars]['xp'], index)
+                characters[name] = character
+                ordered.append(character)
+                weights.append(rarities[stars]['rate'] / len(names))
+
+        self.characters = MappingProxyType(characters)
+        self.ordered = tuple(ordered)
+        self.cum_weights = tuple(accumulate(weights))
+        self.pools = MappingProxyType({stars: tuple(names) for stars, names in pools.items()})
+        self.rates = MappingProxyType({stars: r['rate'] for stars, r in rarities.items()})
+        self.xp = MappingProxyType({stars: r['xp'] for stars, r in rarities.items()})
+
+    def get(self, name):
+        """Look up a character by name, None if it doesn't exist"""
+        return self.characters.get(name)
+
+    def __contains__(self, name):
+        return name in self.characters
+
+    def __len__(self):
+        return len(self.characters)
+
+
+def load_catalog(path=CATALOG_PATH):
+    """Build a Catalog from a characters.json file"""
+    with open(path) as f:
+        data = json.load(f)
+
+    return Catalog(
+        {int(stars): rarity for stars, rarity in data['rarities'].items()},
+        {int(stars): names for stars, names in data['pools'].items()}
+    )
+
+
+# Loaded once at startup; point CHARACTER_CATALOG at another file to change the pools
+CATALOG = load_catalog(os.getenv('CHARACTER_CATALOG', CATALOG_PATH))
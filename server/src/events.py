@@ -0,0 +1,167 @@
+"""
+Per-user push events, streamed to the frontend as server-sent events on
+GET /api/events (see asgi.py) so it doesn't have to poll.
+
+Routes publish through an EventBroker once their write has committed; the
+EventHub of every ASGI worker listens to the broker and fans each event out
+to the connections of its user. Events are snapshots ("points are now N"),
+so a connection that falls behind only keeps the latest few.
+"""
+import asyncio
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from json_provider import dumps_bytes
+
+# Event names, sent as the SSE `event:` field
+POINTS_CHANGED = 'points'
+LEVEL_UP = 'level_up'
+DAILY_CAP_REACHED = 'daily_cap'
+FRIEND_RANKING_CHANGED = 'friend_ranking'
+TIMER_FINISHED = 'timer_done'
+
+# Sent when a stream has been idle this long, so proxies keep it open and
+# dead connections are noticed
+HEARTBEAT_SECONDS = 25
+HEARTBEAT = b': ping\n\n'
+
+# Clients reconnect after this many ms if the stream drops
+RETRY_MS = 5000
+
+
+def format_event(event, data):
+    """One server-sent event frame"""
+    return b'event: ' + event.encode('utf-8') + b'\ndata: ' + dumps_bytes(data) + b'\n\n'
+
+
+class EventBroker(ABC):
+    """Interface shared by the event broker backends"""
+
+    @abstractmethod
+    def publish(self, user_id, event, data):
+        """Send an event to a user's connections (safe to call from any thread)"""
+
+    @abstractmethod
+    def listen(self, callback):
+        """Call callback(user_id, event, data) for every event published from now on"""
+
+
+class LocalBroker(EventBroker):
+    """In-process pub/sub: events only reach this worker's connections (tests, single worker)"""
+
+    def __init__(self):
+        self._listeners = []
+
+    def publish(self, user_id, event, data):
+        for callback in self._listeners:
+            callback(user_id, event, data)
+
+    def listen(self, callback):
+        self._listeners.append(callback)
+
+
+class RedisBroker(EventBroker):
+    """
+    Redis pub/sub on one channel, so events published by any worker reach
+    every worker's connections. Each listening worker keeps one subscriber
+    connection and drops the events of users it has no connection for.
+
+    Needs the `redis` package, which is only imported when this backend
+    is selected.
+    """
+
+    def __init__(self, url, channel='pomtime:events'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("EVENT_BROKER=redis needs the 'redis' package") from e
+
+        self.redis = redis.Redis.from_url(url)
+        self.channel = channel
+
+    def publish(self, user_id, event, data):
+        self.redis.publish(self.channel, dumps_bytes({'user_id': user_id, 'event': event, 'data': data}))
+
+    def listen(self, callback):
+        def run():
+            while True:
+                try:
+                    pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(self.channel)
+                    for message in pubsub.listen():
+                        payload = json.loads(message['data'])
+                        callback(payload['user_id'], payload['event'], payload['data'])
+                except Exception as e:
+                    print(f"Event subscription failed, reconnecting: {str(e)}")
+                    time.sleep(1)
+
+        threading.Thread(target=run, name='event-listener', daemon=True).start()
+
+
+def create_event_broker(backend, redis_url=None):
+    """Build the broker named by EVENT_BROKER ('local' or 'redis')"""
+    if backend == 'local':
+        return LocalBroker()
+    if backend == 'redis':
+        return RedisBroker(redis_url)
+    raise ValueError(f"Unknown event broker: {backend}")
+
+
+class EventHub:
+    """
+    The open event streams of one worker, by user. Each stream is an
+    asyncio.Queue of encoded frames; idle streams cost nothing but that.
+
+    Events arrive on the broker's thread and are handed to the event loop
+    given to start(); a stream whose queue is full loses its oldest frame.
+    """
+
+    def __init__(self, broker, queue_size=16):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.delivered = 0
+        self.dropped = 0
+        self._streams = defaultdict(set)  # user_id -> {asyncio.Queue}
+        self._loop = None
+
+    def start(self, loop):
+        """Start receiving events; once per worker, from its event loop"""
+        if self._loop is None:
+            self._loop = loop
+            self.broker.listen(self._receive)
+
+    def _receive(self, user_id, event, data):
+        # Most events are for users with no stream open on this worker
+        if user_id in self._streams:
+            self._loop.call_soon_threadsafe(self._deliver, user_id, format_event(event, data))
+
+    def _deliver(self, user_id, frame):
+        for queue in self._streams.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(frame)
+            self.delivered += 1
+
+    def subscribe(self, user_id):
+        queue = asyncio.Queue(self.queue_size)
+        self._streams[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        streams = self._streams.get(user_id)
+        if streams is not None:
+            streams.discard(queue)
+            if not streams:
+                del self._streams[user_id]
+
+    def stats(self):
+        return {
+            'connections': sum(len(streams) for streams in list(self._streams.values())),
+            'users': len(self._streams),
+            'delivered': self.delivered,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,129 @@
+import threading
+from collections import defaultdict
+
+from cache import TTLCache
+
+# Fields a friends board shows; full email is kept so the frontend can
+# remove / view friends by it
+FRIEND_FIELDS = {
+    'name': 1,
+    'picture': 1,
+    'level': 1,
+    'experience': 1,
+    'email': 1
+}
+
+
+def friends_board_pipeline(user_id, users_collection_name='users'):
+    """
+    One aggregation for a user's friends board: the user's friend_ids plus
+    the user, joined on _id, sorted by (level, experience).
+
+    Users with no friends match nothing, so the board comes back empty.
+    """
+    return [
+        {'$match': {'_id': user_id, 'friend_ids.0': {'$exists': True}}},
+        {'$project': {'member_ids': {'$concatArrays': ['$friend_ids', ['$_id']]}}},
+        {'$lookup': {
+            'from': users_collection_name,
+            'localField': 'member_ids',
+            'foreignField': '_id',
+            # Project inside the join so large user docs (collections,
+            # background images) never get pulled into the array
+            'pipeline': [{'$project': FRIEND_FIELDS}],
+            'as': 'member'
+        }},
+        {'$unwind': '$member'},
+        {'$replaceRoot': {'newRoot': '$member'}},
+        {'$sort': {'level': -1, 'experience': -1}}
+    ]
+
+
+def board_entry(member):
+    return {
+        'name': member.get('name'),
+        'picture': member.get('picture'),
+        'level': member.get('level', 1),
+        'experience': member.get('experience', 0),
+        'email': member.get('email'),
+        'email_display': member.get('email')
+    }
+
+
+class FriendBoards:
+    """
+    Per-user cache of friends leaderboards.
+
+    Each cached board remembers whose XP it shows, so invalidate(user_id)
+    drops the user's own board and every board the user appears on
+    without touching the database.
+    """
+
+    def __init__(self, collection, maxsize=10000, ttl=300):
+        self.collection = collection
+        self._boards = TTLCache(maxsize, ttl, on_evict=self._forget)
+        self._watchers = defaultdict(set)  # member id -> owners whose board shows them
+        self._lock = threading.Lock()
+
+    def _forget(self, owner, board):
+        with self._lock:
+            for member_id, _ in board:
+                owners = self._watchers.get(member_id)
+                if owners is not None:
+                    owners.discard(owner)
+                    if not owners:
+                        del self._watchers[member_id]
+
+    def _load(self, user_id):
+        members = self.collection.aggregate(
+            friends_board_pipeline(user_id, self.collection.name)
+        )
+        return [(str(member['_id']), board_entry(member)) for member in members]
+
+    def members(self, user_id):
+        """[(member id, board entry), ...] for user_id (an ObjectId), best first"""
+        owner = str(user_id)
+        board = self._boards.get(owner)
+        if board is None:
+            board = self._load(user_id)
+            self._boards.set(owner, board)
+            with self._lock:
+                for member_id, _ in board:
+                    self._watchers[member_id].add(owner)
+        return board
+
+    def leaderboard(self, user_id):
+        """The friends board entries for user_id, best first"""
+        return [entry for _, entry in self.members(user_id)]
+
+    def friend_emails(self, user_id):
+        """Emails of user_id's friends, read from the (cached) board"""
+        owner = str(user_id)
+        return [entry['email'] for member_id, entry in self.members(user_id) if member_id != owner]
+
+    def invalidate(self, user_id):
+        """Drop every cached board that shows user_id, including their own"""
+        member_id = str(user_id)
+        with self._lock:
+            owners = self._watchers.pop(member_id, set())
+        owners.add(member_id)
+
+        for owner in owners:
+            board = self._boards.pop(owner)
+            if board is not None:
+                self._forget(owner, board)
+
+
+def migrate_friend_emails(collection):
+    """Convert legacy `friends` email lists into `friend_ids` references"""
+    migrated = 0
+    for user in collection.find({'friends': {'$exists': True}}, {'friends': 1}):
+        friend_ids = [friend['_id'] for friend in collection.find(
+            {'email': {'$in': user['friends']}}, {'_id': 1}
+        )]
+        collection.update_one(
+            {'_id': user['_id']},
+            {'$addToSet': {'friend_ids': {'$each': friend_ids}}, '$unset': {'friends': ''}}
+        )
+        migrated += 1
+    return migrated
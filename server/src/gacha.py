@@ -0,0 +1,28 @@
+import random
+import threading
+from collections import Counter
+
+
+class GachaEngine:
+    """
+    Samples gacha rolls from a catalog's precomputed cumulative weights.
+
+    Pass a seed for a deterministic sequence (tests).
+    """
+
+    def __init__(self, catalog, seed=None):
+        self.characters = tuple({'name': c.name, 'stars': c.stars} for c in catalog.ordered)
+        self.cum_weights = catalog.cum_weights
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def roll(self, count=1):
+        """Perform `count` rolls in one draw, returns [{'name', 'stars'}, ...]"""
+        with self._lock:
+            picks = self._rng.choices(self.characters, cum_weights=self.cum_weights, k=count)
+        return [dict(pick) for pick in picks]
+
+
+def count_by_name(results):
+    """Tally rolls into {character name: copies}"""
+    return Counter(result['name'] for result in results)
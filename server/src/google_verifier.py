@@ -0,0 +1,104 @@
+import re
+import threading
+import time
+
+import requests
+from google.auth import jwt
+
+# Google's signing certificates (PEM, keyed by "kid")
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+# Used when Google doesn't send a Cache-Control max-age
+DEFAULT_CERTS_MAX_AGE = 300
+
+# Forced refetches (unknown kid) happen at most this often, so tokens with
+# made-up kids can't turn into a request to Google each
+MIN_REFETCH_INTERVAL = 60
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+
+def cache_lifetime(headers):
+    """How long (seconds) a certs response may be reused"""
+    match = _MAX_AGE_RE.search(headers.get('Cache-Control', ''))
+    if not match:
+        return DEFAULT_CERTS_MAX_AGE
+    age = int(headers.get('Age', 0) or 0)
+    return max(0, int(match.group(1)) - age)
+
+
+class HTTPKeySource:
+    """Fetches Google's certs over one pooled session and caches them for their max-age"""
+
+    def __init__(self, url=GOOGLE_CERTS_URL, session=None, timeout=5,
+                 min_refetch_interval=MIN_REFETCH_INTERVAL):
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.min_refetch_interval = min_refetch_interval
+        self._certs = None
+        self._expires_at = 0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def __call__(self, force=False):
+        """
+        Return {kid: pem}; force=True refetches (e.g. after a key rotation)
+        unless the certs were fetched less than min_refetch_interval ago
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._certs is not None:
+                fresh = now < self._expires_at
+                recent = now - self._fetched_at < self.min_refetch_interval
+                if (fresh and not force) or (force and recent):
+                    return self._certs
+
+            response = self.session.get(self.url, timeout=self.timeout)
+            response.raise_for_status()
+            self._certs = response.json()
+            self._fetched_at = time.monotonic()
+            self._expires_at = self._fetched_at + cache_lifetime(response.headers)
+            return self._certs
+
+
+class StaticKeySource:
+    """Fixed set of certs, for tests and local stand-in issuers"""
+
+    def __init__(self, certs):
+        self.certs = dict(certs)
+
+    def __call__(self, force=False):
+        return self.certs
+
+
+class GoogleTokenVerifier:
+    """Verifies Google ID tokens locally against cached signing keys"""
+
+    def __init__(self, audience, key_source=None, issuers=GOOGLE_ISSUERS, clock_skew=10):
+        self.audience = audience
+        self.key_source = key_source or HTTPKeySource()
+        self.issuers = issuers
+        self.clock_skew = clock_skew
+
+    def verify(self, token):
+        """Return the token's claims, raising ValueError if it isn't valid"""
+        certs = self.key_source()
+
+        # Google rotates keys; an unknown kid means our copy is stale
+        kid = jwt.decode_header(token).get('kid')
+        if kid not in certs:
+            certs = self.key_source(force=True)
+
+        idinfo = jwt.decode(
+            token,
+            certs=certs,
+            audience=self.audience,
+            clock_skew_in_seconds=self.clock_skew
+        )
+
+        if idinfo.get('iss') not in self.issuers:
+            raise ValueError(f"Wrong issuer: {idinfo.get('iss')}")
+
+        return idinfo
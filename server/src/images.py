@@ -0,0 +1,120 @@
+import base64
+import hashlib
+import io
+
+import gridfs
+from PIL import Image, UnidentifiedImageError
+
+# Formats we accept, mapped to the mimetype they're served with
+IMAGE_MIMETYPES = {
+    'PNG': 'image/png',
+    'JPEG': 'image/jpeg',
+    'GIF': 'image/gif',
+    'WEBP': 'image/webp'
+}
+
+# Standard widths a background can be downscaled to; larger uploads are
+# always brought down to the biggest one
+STANDARD_WIDTHS = (1280, 1920, 2560)
+
+IMAGE_URL_PREFIX = '/api/images/'
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def image_url(image_id):
+    return IMAGE_URL_PREFIX + image_id
+
+
+def prepare_image(data, max_width=None):
+    """
+    Validate an upload and downscale it to fit max_width (a STANDARD_WIDTHS
+    entry), returns (bytes, mimetype). Raises ValueError if it isn't an image.
+    """
+    try:
+        image = Image.open(io.BytesIO(data))
+        image_format = image.format
+    except (UnidentifiedImageError, OSError) as e:
+        raise ValueError('Not a valid image') from e
+    except Image.DecompressionBombError as e:
+        raise ValueError('Image has too many pixels') from e
+
+    if image_format not in IMAGE_MIMETYPES:
+        raise ValueError(f'Unsupported image format: {image_format}')
+
+    target_width = min(max_width or STANDARD_WIDTHS[-1], STANDARD_WIDTHS[-1])
+
+    # Animated images are kept as-is; re-encoding would drop the frames
+    if image.width <= target_width or getattr(image, 'is_animated', False):
+        return data, IMAGE_MIMETYPES[image_format]
+
+    image.thumbnail((target_width, image.height * target_width // image.width), Image.LANCZOS)
+    out = io.BytesIO()
+    image.save(out, format=image_format, optimize=True)
+    return out.getvalue(), IMAGE_MIMETYPES[image_format]
+
+
+class ImageStore:
+    """
+    Content-addressed image storage in GridFS.
+
+    Files are keyed by the sha256 of their bytes, so identical uploads are
+    stored once no matter how many users pick them.
+    """
+
+    def __init__(self, database, bucket='images', max_bytes=5 * 1024 * 1024):
+        self.database = database  # callable returning this process's Database
+        self.bucket = bucket
+        self.max_bytes = max_bytes
+        self._fs = None  # (database, GridFS)
+
+    @property
+    def fs(self):
+        database = self.database()
+        if self._fs is None or self._fs[0] is not database:
+            self._fs = (database, gridfs.GridFS(database, collection=self.bucket))
+        return self._fs[1]
+
+    def put(self, data, mimetype):
+        """Store image bytes (if new) and return their content hash"""
+        if len(data) > self.max_bytes:
+            raise ImageTooLarge(f'Image is larger than {self.max_bytes} bytes')
+
+        image_id = hashlib.sha256(data).hexdigest()
+        if not self.fs.exists(image_id):
+            try:
+                self.fs.put(data, _id=image_id, content_type=mimetype)
+            except gridfs.errors.FileExists:
+                pass  # Same bytes uploaded concurrently
+        return image_id
+
+    def open(self, image_id):
+        """A seekable GridOut for the image, or None"""
+        try:
+            return self.fs.get(image_id)
+        except gridfs.errors.NoFile:
+            return None
+
+
+def migrate_inline_backgrounds(users, store):
+    """Move base64 data-URI backgrounds out of user documents into the store"""
+    migrated = 0
+    for user in users.find(
+        {'settings.background_value': {'$regex': '^data:image/'}},
+        {'settings.background_value': 1}
+    ):
+        header, _, encoded = user['settings']['background_value'].partition(',')
+        mimetype = header[len('data:'):].split(';')[0]
+        try:
+            image_id = store.put(base64.b64decode(encoded), mimetype)
+        except ImageTooLarge:
+            print(f"Skipping oversized background image for user {user['_id']}")
+            continue
+        users.update_one(
+            {'_id': user['_id']},
+            {'$set': {'settings.background_value': image_url(image_id)}}
+        )
+        migrated += 1
+    return migrated
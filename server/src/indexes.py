@@ -0,0 +1,189 @@
+"""
+Every index the server relies on, ensured at startup (see app.py).
+
+Run directly to check them against a database:
+
+    python indexes.py            # index usage stats + explain() of each query shape
+    python indexes.py --ensure   # create missing indexes first
+
+Exits with status 1 if any query shape still needs a collection scan.
+"""
+import argparse
+import os
+import sys
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from bson.objectid import ObjectId
+from pymongo.errors import OperationFailure
+
+Index = namedtuple('Index', 'collection keys options')
+
+INDEXES = [
+    Index('users', [('google_id', 1)], {'unique': True}),
+    Index('users', [('email', 1)], {}),
+    # Leaderboard snapshot and rank counts
+    Index('users', [('level', -1), ('experience', -1)], {}),
+    # Who has a user as a friend (friend ranking events)
+    Index('users', [('friend_ids', 1)], {}),
+    # Task windows and pages; also serves {user_id} alone as a prefix
+    Index('tasks', [('user_id', 1), ('start', 1), ('_id', 1)], {}),
+    # A user's recurring series, read alongside every task window
+    Index('tasks', [('user_id', 1)], {'partialFilterExpression': {'recurrence': {'$exists': True}}}),
+    # History pages and the summary's $match; also serves {user_id} alone
+    Index('pomodoro_sessions', [('user_id', 1), ('completed_at', -1), ('_id', -1)], {}),
+    # Overdue running timers, swept by each worker's timer scheduler
+    Index('timers', [('state', 1), ('expires_at', 1)], {}),
+]
+
+# Representative query of each route: (label, collection, filter, sort)
+_now = datetime.utcnow()
+QUERY_SHAPES = [
+    ('login', 'users', {'google_id': 'sub'}, None),
+    ('friend/public profile by email', 'users', {'email': 'user@example.com'}, None),
+    ('users who friended a user', 'users', {'friend_ids': ObjectId()}, None),
+    ('leaderboard top N', 'users', {}, [('level', -1), ('experience', -1)]),
+    ('leaderboard rank', 'users', {'$or': [
+        {'level': {'$gt': 1}},
+        {'level': 1, 'experience': {'$gt': 0}}
+    ]}, None),
+    ('tasks window', 'tasks', {'user_id': 'id', 'recurrence': {'$exists': False},
+                               'start': {'$gte': _now, '$lt': _now}},
+     [('start', 1), ('_id', 1)]),
+    ('recurring series', 'tasks', {'user_id': 'id', 'recurrence': {'$exists': True}}, None),
+    ('task by id', 'tasks', {'_id': ObjectId(), 'user_id': 'id'}, None),
+    ('pomodoro history', 'pomodoro_sessions', {'user_id': 'id'},
+     [('completed_at', -1), ('_id', -1)]),
+    ('orphaned timers', 'timers', {'state': 'running', 'notified': {'$ne': True},
+                                   'expires_at': {'$lte': _now}}, None),
+    ('sessions by email', 'sessions', {'email': 'user@example.com'}, None),
+    ('sessions by user', 'sessions', {'user_id': 'id'}, None),
+]
+
+
+def index_name(keys):
+    return '_'.join(f'{field}_{direction}' for field, direction in keys)
+
+
+def ensure_indexes(database, indexes=INDEXES):
+    """
+    Create any missing index (a no-op for ones that already exist).
+    Returns the names of indexes that couldn't be created.
+    """
+    failed = []
+    for index in indexes:
+        try:
+            database[index.collection].create_index(
+                index.keys, name=index_name(index.keys), **index.options
+            )
+        except OperationFailure as e:
+            # e.g. an existing index with the same keys but other options
+            print(f"Could not create index {index_name(index.keys)} on {index.collection}: {e}")
+            failed.append(index_name(index.keys))
+    return failed
+
+
+class IndexBootstrap:
+    """
+    Runs `build` once per process, on the first call.
+
+    mode 'background' runs it in a daemon thread so requests aren't held
+    up, 'blocking' runs it in the caller, 'off' never runs it.
+    """
+
+    def __init__(self, build, mode='background'):
+        self.build = build
+        self.mode = mode
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _run(self):
+        try:
+            self.build()
+        except Exception as e:
+            print(f"Bootstrap step {self.build.__name__} failed: {e}")
+
+    def __call__(self):
+        if self.mode == 'off' or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+
+        if self.mode == 'blocking':
+            self._run()
+        else:
+            threading.Thread(target=self._run, daemon=True).start()
+
+
+def winning_stages(plan):
+    """All stage names in an explain() plan tree"""
+    stages = [plan.get('stage')]
+    for child in plan.get('inputStages', []) + [plan.get('inputStage')]:
+        if child:
+            stages += winning_stages(child)
+    if 'queryPlan' in plan:  # slot-based engine wraps the plan
+        stages += winning_stages(plan['queryPlan'])
+    return stages
+
+
+def explain_shapes(database, shapes=QUERY_SHAPES):
+    """[(label, collection, stages, collection scan?)] for each query shape"""
+    results = []
+    for label, collection, query, sort in shapes:
+        cursor = database[collection].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain()['queryPlanner']['winningPlan']
+        stages = [stage for stage in winning_stages(plan) if stage]
+        results.append((label, collection, stages, 'COLLSCAN' in stages))
+    return results
+
+
+def index_usage(database, collections):
+    """{collection: [(index name, ops since, since)]} from $indexStats"""
+    usage = {}
+    for collection in collections:
+        usage[collection] = [
+            (stat['name'], stat['accesses']['ops'], stat['accesses']['since'])
+            for stat in database[collection].aggregate([{'$indexStats': {}}])
+        ]
+    return usage
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from mongo import Mongo
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--ensure', action='store_true', help='create missing indexes first')
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    mongo = Mongo(os.getenv('MONGODB_URI'), os.getenv('MONGODB_DB_NAME', 'PomTimeDB'))
+    database = mongo.database
+
+    if args.ensure:
+        failed = ensure_indexes(database)
+        print(f"Ensured {len(INDEXES) - len(failed)}/{len(INDEXES)} indexes")
+
+    print("Index usage:")
+    collections = sorted({index.collection for index in INDEXES} | {'sessions'})
+    for collection, stats in index_usage(database, collections).items():
+        for name, ops, since in stats:
+            print(f"  {collection}.{name}: {ops} ops since {since:%Y-%m-%d %H:%M}")
+
+    print("Query shapes:")
+    scans = 0
+    for label, collection, stages, collection_scan in explain_shapes(database):
+        scans += collection_scan
+        flag = 'COLLECTION SCAN' if collection_scan else 'ok'
+        print(f"  [{flag}] {label} ({collection}): {' <- '.join(stages)}")
+
+    return 1 if scans else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import decimal
+
+import orjson
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from flask.json.provider import JSONProvider
+
+# Datetimes from Mongo are naive UTC: send them with an explicit +00:00 so
+# browsers don't read them as local time
+OPTIONS = orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value):
+    """The types orjson doesn't know; Decimals go out as strings like Flask's provider"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, Decimal128):
+        return str(value.to_decimal())
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(obj):
+    """UTF-8 JSON of a value that may hold ObjectIds, datetimes and Decimal128s"""
+    return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+
+class MongoJSONProvider(JSONProvider):
+    """
+    Flask JSON provider on orjson that serializes Mongo documents as read:
+    ObjectIds become their hex string, datetimes ISO 8601, Decimal128s strings.
+    """
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from bisect import bisect_left, insort
+
+# Only public fields are read; email is masked before it leaves the server
+LEADERBOARD_PROJECTION = {
+    'name': 1,
+    'picture': 1,
+    'level': 1,
+    'experience': 1,
+    'email': 1
+}
+
+
+def mask_email(email):
+    """Show first letter + *** @ domain, not the full email"""
+    email_parts = (email or '').split('@')
+    if len(email_parts) == 2 and email_parts[0]:
+        return f"{email_parts[0][0]}***@{email_parts[1]}"
+    return "***"
+
+
+def sort_key(user):
+    """Ascending key for (level desc, experience desc), ties broken by id"""
+    return (-user.get('level', 1), -user.get('experience', 0), str(user['_id']))
+
+
+def public_entry(user):
+    return {
+        'name': user.get('name'),
+        'picture': user.get('picture'),
+        'level': user.get('level', 1),
+        'experience': user.get('experience', 0),
+        'email_display': mask_email(user.get('email'))
+    }
+
+
+class Leaderboard:
+    """
+    Materialized top-N snapshot of users by (level, experience).
+
+    The snapshot is loaded with one indexed query, kept current by
+    record_xp_change() for XP changes made by this worker, and reloaded
+    every `ttl` seconds to pick up changes made by other workers. The
+    response body is serialized once per change instead of per request.
+    """
+
+    def __init__(self, collection, size=100, ttl=30, dumps=json.dumps):
+        self.collection = collection
+        self.size = size
+        self.ttl = ttl
+        self.dumps = dumps
+        self._keys = []  # sort_key()s, ascending = best first
+        self._entries = {}  # sort_key -> (user id, public entry)
+        self._key_by_user = {}  # user id -> sort_key
+        self._body = None
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        top_users = self.collection.find({}, LEADERBOARD_PROJECTION) \
+            .sort([('level', -1), ('experience', -1)]).limit(self.size)
+
+        self._keys = []
+        self._entries = {}
+        self._key_by_user = {}
+        for user in top_users:
+            self._insert(user)
+        self._keys.sort()
+        self._body = None
+        self._loaded_at = time.monotonic()
+
+    def _insert(self, user):
+        key = sort_key(user)
+        self._keys.append(key)
+        self._entries[key] = (str(user['_id']), public_entry(user))
+        self._key_by_user[str(user['_id'])] = key
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self._load()
+
+    def response_body(self):
+        """The serialized {'leaderboard': [...]} response"""
+        with self._lock:
+            self._ensure_fresh()
+            if self._body is None:
+                self._body = self.dumps({'leaderboard': [self._entries[key][1] for key in self._keys]})
+            return self._body
+
+    def record_xp_change(self, user):
+        """Update the snapshot after a user's level/experience changed"""
+        with self._lock:
+            if self._loaded_at is None:
+                return
+
+            user_id = str(user['_id'])
+            old_key = self._key_by_user.pop(user_id, None)
+            if old_key is not None:
+                del self._keys[bisect_left(self._keys, old_key)]
+                del self._entries[old_key]
+
+            key = sort_key(user)
+            if len(self._keys) < self.size or key < self._keys[-1]:
+                insort(self._keys, key)
+                self._entries[key] = (user_id, public_entry(user))
+                self._key_by_user[user_id] = key
+                if len(self._keys) > self.size:
+                    dropped_user, _ = self._entries.pop(self._keys.pop())
+                    del self._key_by_user[dropped_user]
+            elif old_key is not None:
+                # Fell out of the top N; the next user in line isn't known here
+                self._loaded_at = None
+
+            self._body = None
+
+    def rank_of(self, user):
+        """
+        1-based rank of a user (ties share a rank).
+
+        Inside the snapshot this is a binary search, O(log size). Below it,
+        it is a count over the (level, experience) index of users strictly
+        ahead: one round trip, but the server scans one index key per user
+        counted, so it is O(rank), not O(log n). MongoDB has no index that
+        answers "how many before this key" any faster; an exact O(log n)
+        rank would need an order-statistics tree of every user's score kept
+        in sync across workers (e.g. a Redis sorted set).
+        """
+        level = user.get('level', 1)
+        experience = user.get('experience', 0)
+
+        with self._lock:
+            self._ensure_fresh()
+            if self._keys and (len(self._keys) < self.size or sort_key(user) <= self._keys[-1]):
+                return bisect_left(self._keys, (-level, -experience)) + 1
+
+        return self.collection.count_documents({'$or': [
+            {'level': {'$gt': level}},
+            {'level': level, 'experience': {'$gt': experience}}
+        ]}) + 1
@@ -0,0 +1,250 @@
+"""
+Per-route request and MongoDB command metrics, rendered in the Prometheus
+text format for GET /metrics.
+
+Metrics are per process: with several workers, scrape each one (or run a
+single worker per container).
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from pymongo import monitoring
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Database commands per request
+ROUND_TRIP_BUCKETS = (0, 1, 2, 3, 4, 6, 8, 12, 16, 32)
+
+# Label of requests that matched no route, and of commands sent outside a request
+UNMATCHED_ROUTE = '<unmatched>'
+BACKGROUND_ROUTE = '<background>'
+
+# The RequestTrace of the current request (copied into worker threads the
+# same way as user_store's round trip count)
+_trace = ContextVar('request_trace', default=None)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return ','.join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+
+class Histogram:
+    """Cumulative-bucket histogram with a fixed set of upper bounds"""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last one is +Inf
+        self.sum = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        """Prometheus sample lines for this histogram"""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ('+Inf',), counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_sum{{{labels}}} {total}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class RouteMetrics:
+    """Everything recorded for one (method, route)"""
+
+    def __init__(self, method, route):
+        self.method = method
+        self.route = route
+        self.labels = _labels(method=method, route=route)
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.round_trips = Histogram(ROUND_TRIP_BUCKETS)
+        self.statuses = [0] * 6  # by status // 100
+        self.exceptions = 0
+        self.commands = {}  # command name -> Histogram, added on first use
+        self._lock = threading.Lock()
+
+    def command(self, name):
+        histogram = self.commands.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = self.commands.setdefault(name, Histogram(LATENCY_BUCKETS))
+        return histogram
+
+
+class RequestTrace:
+    """One request in flight; `breakdown` is only kept for the slow request log"""
+
+    __slots__ = ('route', 'started', 'commands', 'db_micros', 'breakdown', 'pending')
+
+    def __init__(self, route, keep_breakdown):
+        self.route = route
+        self.started = time.perf_counter()
+        self.commands = 0
+        self.db_micros = 0
+        # [(command, collection, micros)] and request_id -> (command, collection)
+        self.breakdown = [] if keep_breakdown else None
+        self.pending = {} if keep_breakdown else None
+
+
+class Metrics:
+    """
+    Registry of RouteMetrics, preallocated for every route by
+    register_routes() so recording a request allocates nothing but its
+    RequestTrace.
+
+    Requests slower than slow_request_ms (if set) are logged with each of
+    their database commands.
+    """
+
+    def __init__(self, slow_request_ms=None):
+        self.slow_request_ms = slow_request_ms
+        self.started_at = time.time()
+        self.routes = {}  # (method, route) -> RouteMetrics
+        self.unmatched = RouteMetrics('*', UNMATCHED_ROUTE)
+        self.background = RouteMetrics('*', BACKGROUND_ROUTE)
+        self._lock = threading.Lock()
+
+    def register_routes(self, url_map):
+        """Preallocate metrics for every rule of a Flask/werkzeug url map"""
+        for rule in url_map.iter_rules():
+            for method in rule.methods - {'HEAD'}:
+                self.route(method, rule.rule)
+
+    def route(self, method, route):
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            with self._lock:
+                metrics = self.routes.setdefault(key, RouteMetrics(method, route))
+        return metrics
+
+    def start(self, method, route):
+        """Begin timing a request (route None if it matched none)"""
+        metrics = self.route(method, route) if route is not None else self.unmatched
+        _trace.set(RequestTrace(metrics, self.slow_request_ms is not None))
+
+    def record_exception(self):
+        trace = _trace.get()
+        route = trace.route if trace else self.unmatched
+        route.exceptions += 1
+
+    def finish(self, status, path=None):
+        """End the current request's trace; path is shown in the slow request log"""
+        trace = _trace.get()
+        if trace is None:
+            return
+        _trace.set(None)
+
+        elapsed = time.perf_counter() - trace.started
+        route = trace.route
+        route.latency.observe(elapsed)
+        route.round_trips.observe(trace.commands)
+        route.statuses[min(status // 100, 5)] += 1
+
+        if self.slow_request_ms is not None and elapsed * 1000 >= self.slow_request_ms:
+            self.log_slow_request(path, status, elapsed, trace)
+
+    def log_slow_request(self, path, status, elapsed, trace):
+        commands = ', '.join(
+            f"{command} {collection or ''} {micros / 1000:.1f}ms".replace('  ', ' ')
+            for command, collection, micros in trace.breakdown
+        )
+        print(f"Slow request: {trace.route.method} {path or trace.route.route} {status} "
+              f"in {elapsed * 1000:.1f}ms, {trace.commands} DB commands "
+              f"in {trace.db_micros / 1000:.1f}ms" + (f": {commands}" if commands else ''))
+
+    def totals(self):
+        """Request counts over every route, for /health"""
+        routes = list(self.routes.values()) + [self.unmatched]
+        return {
+            'uptime_seconds': round(time.time() - self.started_at),
+            'requests': sum(sum(route.statuses) for route in routes),
+            'server_errors': sum(route.statuses[5] for route in routes),
+            'exceptions': sum(route.exceptions for route in routes)
+        }
+
+    def render(self, extra=()):
+        """
+        The Prometheus text exposition of every metric, plus `extra`
+        unlabelled ones as (name, type, help, value), e.g. pool counters.
+        """
+        routes = sorted(self.routes.values(), key=lambda route: route.labels) + [self.unmatched]
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        family('pomtime_request_duration_seconds', 'histogram', 'Time spent handling requests')
+        for route in routes:
+            lines += route.latency.samples('pomtime_request_duration_seconds', route.labels)
+
+        family('pomtime_requests_total', 'counter', 'Responses by status class')
+        for route in routes:
+            for status_class, count in enumerate(route.statuses):
+                if count:
+                    lines.append(f'pomtime_requests_total{{{route.labels},status="{status_class}xx"}} {count}')
+
+        family('pomtime_request_exceptions_total', 'counter', 'Unhandled exceptions')
+        for route in routes:
+            if route.exceptions:
+                lines.append(f'pomtime_request_exceptions_total{{{route.labels}}} {route.exceptions}')
+
+        family('pomtime_request_db_commands', 'histogram', 'MongoDB commands sent per request')
+        for route in routes:
+            lines += route.round_trips.samples('pomtime_request_db_commands', route.labels)
+
+        family('pomtime_db_command_duration_seconds', 'histogram', 'MongoDB command latency')
+        for route in routes + [self.background]:
+            for command, histogram in sorted(route.commands.items()):
+                labels = f'{route.labels},command="{_escape(command)}"'
+                lines += histogram.samples('pomtime_db_command_duration_seconds', labels)
+
+        for name, kind, help_text, value in extra:
+            family(name, kind, help_text)
+            lines.append(f'{name} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """Times every MongoDB command and adds it to the current request's trace"""
+
+    def __init__(self, metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        trace = _trace.get()
+        if trace is not None and trace.pending is not None:
+            collection = event.command.get(event.command_name)
+            trace.pending[event.request_id] = (
+                event.command_name, collection if isinstance(collection, str) else None
+            )
+
+    def succeeded(self, event):
+        trace = _trace.get()
+        route = trace.route if trace is not None else self.metrics.background
+        route.command(event.command_name).observe(event.duration_micros / 1e6)
+        if trace is not None:
+            trace.commands += 1
+            trace.db_micros += event.duration_micros
+            if trace.breakdown is not None:
+                command, collection = trace.pending.pop(event.request_id, (event.command_name, None))
+                trace.breakdown.append((command, collection, event.duration_micros))
+
+    def failed(self, event):
+        self.succeeded(event)
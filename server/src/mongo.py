@@ -0,0 +1,187 @@
+import importlib.util
+import os
+import threading
+
+import certifi
+from pymongo import MongoClient, ReadPreference, monitoring
+from pymongo.read_preferences import SecondaryPreferred
+
+
+def _env_int(name, default):
+    value = os.getenv(name)
+    return int(value) if value not in (None, '') else default
+
+
+def default_compressors():
+    """zstd and snappy when their packages are installed, zlib always"""
+    compressors = [name for name, module in (('zstd', 'zstandard'), ('snappy', 'snappy'))
+                   if importlib.util.find_spec(module)]
+    return ','.join(compressors + ['zlib'])
+
+
+def client_options(event_listeners=()):
+    """
+    MongoClient keyword arguments from the MONGO_* environment variables.
+
+    Shared by the sync client below and the async one in asgi.py.
+    """
+    options = {
+        'tlsCAFile': certifi.where(),
+        'maxPoolSize': _env_int('MONGO_MAX_POOL_SIZE', 100),
+        'minPoolSize': _env_int('MONGO_MIN_POOL_SIZE', 0),
+        'maxConnecting': _env_int('MONGO_MAX_CONNECTING', 2),
+        'maxIdleTimeMS': _env_int('MONGO_MAX_IDLE_TIME_MS', None),
+        'connectTimeoutMS': _env_int('MONGO_CONNECT_TIMEOUT_MS', 10000),
+        'serverSelectionTimeoutMS': _env_int('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000),
+        'socketTimeoutMS': _env_int('MONGO_SOCKET_TIMEOUT_MS', None),
+        # Fail fast instead of queueing forever when the pool is exhausted
+        'waitQueueTimeoutMS': _env_int('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000),
+        'compressors': os.getenv('MONGO_COMPRESSORS') or default_compressors(),
+        'event_listeners': list(event_listeners)
+    }
+    return {name: value for name, value in options.items() if value is not None}
+
+
+def readonly_preference():
+    """Read preference for routes that tolerate slightly stale data"""
+    max_staleness = _env_int('MONGO_MAX_STALENESS_SECONDS', -1)
+    if os.getenv('MONGO_READONLY_PREFERENCE', 'secondaryPreferred') == 'primary':
+        return ReadPreference.PRIMARY
+    return SecondaryPreferred(max_staleness=max_staleness)
+
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Connection pool counters for every server the client talks to"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.open = 0
+        self.checked_out = 0
+        self.max_checked_out = 0
+        self.checkout_failures = 0
+        self.pool_timeouts = 0
+
+    def snapshot(self, max_pool_size=None):
+        with self._lock:
+            stats = {
+                'open': self.open,
+                'checked_out': self.checked_out,
+                'max_checked_out': self.max_checked_out,
+                'checkout_failures': self.checkout_failures,
+                'pool_timeouts': self.pool_timeouts
+            }
+        if max_pool_size:
+            stats['utilization'] = round(stats['checked_out'] / max_pool_size, 3)
+        return stats
+
+    def connection_created(self, event):
+        with self._lock:
+            self.open += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.open -= 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out -= 1
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                self.pool_timeouts += 1
+
+    # Events we don't count
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+class Mongo:
+    """
+    Lazily built MongoClient, one per process.
+
+    MongoClient isn't fork-safe, so nothing connects at import time: the
+    client is created on first use and rebuilt if the process id changed
+    (e.g. in each gunicorn worker after a --preload fork).
+    """
+
+    def __init__(self, uri, db_name, event_listeners=()):
+        self.uri = uri
+        self.db_name = db_name
+        self.pool_stats = PoolStats()
+        self.event_listeners = [self.pool_stats, *event_listeners]
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._client is None or self._pid != os.getpid():
+                    self.pool_stats = PoolStats()
+                    self.event_listeners[0] = self.pool_stats
+                    self._client = MongoClient(self.uri, **client_options(self.event_listeners))
+                    self._pid = os.getpid()
+        return self._client
+
+    @property
+    def database(self):
+        return self.client[self.db_name]
+
+    def collection(self, name, readonly=False):
+        """A proxy that resolves to the collection on this process's client"""
+        return LazyCollection(self, name, readonly)
+
+    def stats(self):
+        """Pool counters for this process"""
+        max_pool_size = self._client.options.pool_options.max_pool_size if self._client else None
+        return self.pool_stats.snapshot(max_pool_size)
+
+
+class LazyCollection:
+    """
+    Stands in for a pymongo Collection that is only looked up when used.
+
+    readonly=True collections read from secondaries (see
+    readonly_preference) and must only be used for reads.
+    """
+
+    def __init__(self, mongo, name, readonly=False):
+        self._mongo = mongo
+        self._name = name
+        self._readonly = readonly
+        self._resolved = None  # (client, collection)
+
+    def _collection(self):
+        client = self._mongo.client
+        if self._resolved is None or self._resolved[0] is not client:
+            collection = client[self._mongo.db_name][self._name]
+            if self._readonly:
+                collection = collection.with_options(read_preference=readonly_preference())
+            self._resolved = (client, collection)
+        return self._resolved[1]
+
+    def __getattr__(self, attr):
+        return getattr(self._collection(), attr)
@@ -0,0 +1,66 @@
+import base64
+import json
+from datetime import datetime
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def encode_cursor(doc, field):
+    """Opaque cursor pointing just past `doc` in (field, _id) order"""
+    payload = json.dumps([doc[field].isoformat(), str(doc['_id'])])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Turn a cursor back into (datetime, ObjectId), raises ValueError if malformed"""
+    try:
+        value, last_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return datetime.fromisoformat(value), ObjectId(last_id)
+    except (TypeError, ValueError, InvalidId) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def keyset_filter(field, cursor, descending=False):
+    """Query clause matching documents after `cursor` in (field, _id) order"""
+    value, last_id = decode_cursor(cursor)
+    op = '$lt' if descending else '$gt'
+    return {'$or': [
+        {field: {op: value}},
+        {field: value, '_id': {op: last_id}}
+    ]}
+
+
+def parse_limit(value, default, maximum):
+    """Page size from a query arg, clamped to 1..maximum"""
+    if value is None:
+        return default
+    return max(1, min(int(value), maximum))
+
+
+def wants_ndjson(request):
+    """True if the client asked for a newline-delimited JSON stream"""
+    return (request.args.get('format') == 'ndjson'
+            or request.accept_mimetypes.best == NDJSON_MIMETYPE)
+
+
+def paginate(cursor, limit, field):
+    """
+    Yield up to `limit` documents from a pymongo cursor (fetched with
+    limit + 1), then a final {'next_cursor': ...} dict if more remain.
+    """
+    last = None
+    for count, doc in enumerate(cursor):
+        if limit is not None and count == limit:
+            yield {'next_cursor': encode_cursor(last, field)}
+            return
+        last = {field: doc[field], '_id': doc['_id']}
+        yield doc
+
+
+def ndjson_lines(docs, dumps):
+    """Serialize documents one per line as the cursor yields them (dumps must handle ObjectIds)"""
+    for doc in docs:
+        yield dumps(doc) + '\n'
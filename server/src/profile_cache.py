@@ -0,0 +1,105 @@
+import threading
+from abc import ABC, abstractmethod
+
+import bson
+
+from cache import TTLCache
+
+
+class ProfileCache(ABC):
+    """Interface shared by the profile cache backends.
+
+    Values are partial user documents holding the polled profile fields
+    (see user_store.PROFILE_FIELDS), keyed by user id string.
+    """
+
+    @abstractmethod
+    def get(self, user_id):
+        """Return the cached profile, or None on a miss"""
+
+    @abstractmethod
+    def set(self, user_id, profile):
+        """Cache a user's profile for the backend's ttl"""
+
+    @abstractmethod
+    def delete(self, user_id):
+        """Drop a user's cached profile (no-op on a miss)"""
+
+    @abstractmethod
+    def stats(self):
+        """{'hits', 'misses', ...} since this process started"""
+
+
+class MemoryProfileCache(ProfileCache):
+    """Process-local LRU+TTL cache; other workers' writes show up after `ttl`"""
+
+    def __init__(self, maxsize=10000, ttl=10):
+        self._profiles = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id):
+        return self._profiles.get(user_id)
+
+    def set(self, user_id, profile):
+        self._profiles.set(user_id, profile)
+
+    def delete(self, user_id):
+        self._profiles.pop(user_id)
+
+    def stats(self):
+        return {
+            'backend': 'memory',
+            'hits': self._profiles.hits,
+            'misses': self._profiles.misses,
+            'size': len(self._profiles)
+        }
+
+
+class RedisProfileCache(ProfileCache):
+    """Cache shared by every worker, so invalidations are seen everywhere at once.
+
+    Needs the `redis` package, which is only imported when this backend
+    is selected.
+    """
+
+    def __init__(self, url, ttl=10, prefix='profile:'):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("PROFILE_CACHE_BACKEND=redis needs the 'redis' package") from e
+
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, user_id):
+        raw = self.redis.get(self.prefix + user_id)
+        self._count(raw is not None)
+        return bson.decode(raw) if raw is not None else None
+
+    def set(self, user_id, profile):
+        self.redis.set(self.prefix + user_id, bson.encode(profile), ex=self.ttl)
+
+    def delete(self, user_id):
+        self.redis.delete(self.prefix + user_id)
+
+    def stats(self):
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+def create_profile_cache(backend, ttl=10, redis_url=None):
+    """Build the cache named by PROFILE_CACHE_BACKEND ('memory' or 'redis')"""
+    if backend == 'memory':
+        return MemoryProfileCache(ttl=ttl)
+    if backend == 'redis':
+        return RedisProfileCache(redis_url, ttl=ttl)
+    raise ValueError(f"Unknown profile cache backend: {backend}")
@@ -0,0 +1,214 @@
+"""
+Recurring tasks, stored as one series document instead of a copy per day.
+
+A series is a task with a `recurrence` rule:
+
+    {'freq': 'daily' | 'weekly', 'interval': n, 'weekdays': [0-6] or None,
+     'until': datetime or None}
+
+(weekdays are Monday=0 in UTC, `until` is inclusive) and a
+`completed_occurrences` list holding the start of every occurrence that
+was completed. Occurrences are generated when tasks are read, only for the
+requested window, and are addressed as "<series id>_<start>" (see
+occurrence_id).
+"""
+import heapq
+from datetime import datetime, timedelta, timezone
+
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+
+FREQUENCIES = {'daily': timedelta(days=1), 'weekly': timedelta(weeks=1)}
+DAILY = {'freq': 'daily', 'interval': 1, 'weekdays': None, 'until': None}
+
+# Window expanded when a read doesn't give one: what the calendar can show
+# around the current month
+DEFAULT_LOOKBACK = timedelta(days=31)
+DEFAULT_LOOKAHEAD = timedelta(days=62)
+
+# Per series and read, whatever the window
+MAX_OCCURRENCES = 1000
+
+OCCURRENCE_FORMAT = '%Y%m%dT%H%M%S'
+
+
+def naive_utc(value):
+    """Aware datetimes (from ISO query args) as the naive UTC ones Mongo returns"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def parse_rule(data):
+    """
+    The recurrence rule from a task's JSON: `recurrence` (a rule object) or
+    the frontend's `recurring: true` (daily). None if the task doesn't
+    recur, raises ValueError if the rule is invalid.
+    """
+    rule = data.get('recurrence')
+    if rule is None:
+        return dict(DAILY) if data.get('recurring') else None
+    if not isinstance(rule, dict):
+        raise ValueError('recurrence must be an object')
+
+    freq = rule.get('freq', 'daily')
+    if freq not in FREQUENCIES:
+        raise ValueError(f"freq must be one of {', '.join(FREQUENCIES)}")
+
+    interval = rule.get('interval', 1)
+    if type(interval) is not int or interval < 1:
+        raise ValueError('interval must be a positive integer')
+
+    weekdays = rule.get('weekdays')
+    if weekdays is not None:
+        if not isinstance(weekdays, list) or not weekdays \
+                or any(type(day) is not int or not 0 <= day <= 6 for day in weekdays):
+            raise ValueError('weekdays must be a non-empty list of 0 (Monday) to 6 (Sunday)')
+        weekdays = sorted(set(weekdays))
+
+    until = rule.get('until')
+    if until is not None:
+        until = naive_utc(datetime.fromisoformat(until.replace('Z', '+00:00')))
+
+    return {'freq': freq, 'interval': interval, 'weekdays': weekdays, 'until': until}
+
+
+def occurrences(rule, start, window_start, window_end):
+    """
+    Start of every occurrence of a series beginning at `start` within
+    [window_start, window_end), in order. Costs O(occurrences in window).
+    """
+    window_start = max(naive_utc(window_start), start)
+    window_end = naive_utc(window_end)
+    if rule.get('until') is not None:
+        window_end = min(window_end, rule['until'] + timedelta(microseconds=1))
+
+    step = FREQUENCIES[rule['freq']] * rule.get('interval', 1)
+    weekdays = rule.get('weekdays')
+
+    if rule['freq'] == 'daily':
+        # First step at or after the window
+        index = -(-(window_start - start) // step)
+        current = start + index * step
+        count = 0
+        while current < window_end and count < MAX_OCCURRENCES:
+            if not weekdays or current.weekday() in weekdays:
+                yield current
+                count += 1
+            current += step
+        return
+
+    # Weekly: the listed weekdays (default: the start's) of every
+    # interval-th week, counted from the week the series starts in
+    week = start - timedelta(days=start.weekday())
+    days = weekdays or [start.weekday()]
+    index = max(0, (window_start - week) // step)
+    current = week + index * step
+    count = 0
+    while current < window_end and count < MAX_OCCURRENCES:
+        for day in days:
+            occurrence = current + timedelta(days=day)
+            if occurrence >= window_end:
+                break
+            if occurrence >= window_start:
+                yield occurrence
+                count += 1
+        current += step
+
+
+def is_occurrence(rule, start, occurrence):
+    return next(occurrences(rule, start, occurrence, occurrence + timedelta(microseconds=1)), None) \
+        == occurrence
+
+
+def occurrence_id(series_id, occurrence):
+    return f'{series_id}_{occurrence.strftime(OCCURRENCE_FORMAT)}'
+
+
+def parse_task_id(task_id):
+    """
+    (ObjectId, occurrence start or None) from a task id or an occurrence id,
+    raises ValueError if it is neither
+    """
+    series_id, _, occurrence = task_id.partition('_')
+    try:
+        object_id = ObjectId(series_id)
+        return object_id, datetime.strptime(occurrence, OCCURRENCE_FORMAT) if occurrence else None
+    except (InvalidId, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid task id: {task_id}") from e
+
+
+def expansion_window(window):
+    """[start, end) to expand series over, from a query's start/end clause"""
+    now = datetime.utcnow()
+    start = naive_utc(window.get('$gte')) if window else None
+    end = naive_utc(window.get('$lt')) if window else None
+    if start is None:
+        start = (end or now) - DEFAULT_LOOKBACK
+    if end is None:
+        end = max(start, now) + DEFAULT_LOOKAHEAD
+    return start, end
+
+
+def series_occurrences(series, window_start, window_end, after=None):
+    """
+    Task documents for the occurrences of one series, shaped like stored
+    tasks. Their _id stays the series' ObjectId (for ordering and cursors)
+    until occurrence_ids() replaces it.
+    """
+    duration = series['end'] - series['start']
+    completed = set(series.get('completed_occurrences', ()))
+    for occurrence in occurrences(series['recurrence'], series['start'], window_start, window_end):
+        if after is not None and (occurrence, series['_id']) <= after:
+            continue
+        yield {
+            '_id': series['_id'],
+            'series_id': str(series['_id']),
+            'title': series.get('title'),
+            'start': occurrence,
+            'end': occurrence + duration,
+            'duration_minutes': series.get('duration_minutes'),
+            'points': series.get('points'),
+            'recurring': True,
+            'recurrence': series['recurrence'],
+            'completed': occurrence in completed
+        }
+
+
+def merge_occurrences(tasks, series, window, after=None):
+    """
+    Stored tasks (sorted on (start, _id)) merged with the occurrences of
+    every series in `window`, after the keyset position `after` (a
+    (start, ObjectId) pair) if given
+    """
+    window_start, window_end = expansion_window(window)
+    expanded = [series_occurrences(doc, window_start, window_end, after) for doc in series]
+    return heapq.merge(tasks, *expanded, key=lambda doc: (doc['start'], doc['_id']))
+
+
+def occurrence_ids(docs):
+    """Give occurrences their public id once they've been paginated"""
+    for doc in docs:
+        if 'series_id' in doc:
+            doc['_id'] = occurrence_id(doc['series_id'], doc['start'])
+        yield doc
+
+
+def migrate_recurring_copies(collection):
+    """
+    Turn the pending copy of each old-style recurring task (one document per
+    day) into a series starting there. Completed copies stay as history.
+    """
+    migrated = 0
+    for task in collection.find(
+        {'recurring': True, 'recurrence': {'$exists': False}, 'completed': {'$ne': True}},
+        {'start': 1, 'end': 1}
+    ):
+        collection.update_one({'_id': task['_id']}, {'$set': {
+            'start': task['start'].replace(microsecond=0),
+            'end': task['end'].replace(microsecond=0),
+            'recurrence': dict(DAILY),
+            'completed_occurrences': []
+        }})
+        migrated += 1
+    return migrated
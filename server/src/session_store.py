@@ -0,0 +1,208 @@
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+from cache import TTLCache
+
+# Sessions last a week (see google_auth)
+SESSION_LIFETIME_SECONDS = 7 * 24 * 60 * 60
+
+
+def _remaining_seconds(session_data):
+    """Seconds until a session expires"""
+    return (session_data['expires'] - datetime.utcnow()).total_seconds()
+
+
+class SessionStore(ABC):
+    """Interface shared by the session backends.
+
+    Sessions are dicts with user_id, email, name, picture and an
+    'expires' datetime (naive UTC).
+    """
+
+    @abstractmethod
+    def get(self, token):
+        """Return the session for a token, or None if unknown/expired"""
+
+    def peek(self, token):
+        """Like get(), but never blocks on I/O; None may just mean 'not cached'"""
+        return self.get(token)
+
+    @abstractmethod
+    def save(self, token, session_data):
+        """Store a session under its token until session_data['expires']"""
+
+    @abstractmethod
+    def delete(self, token):
+        """Forget a token's session (no-op if unknown)"""
+
+    @abstractmethod
+    def delete_by_email(self, email):
+        """Remove every session belonging to an email, returns the count"""
+
+    @abstractmethod
+    def delete_by_user(self, user_id):
+        """Remove every session belonging to a user, returns the count"""
+
+    def sweep(self, limit=1000):
+        """Expire at most `limit` stale sessions, returns how many went"""
+        return 0
+
+    def ensure_indexes(self):
+        """Create any indexes the backend relies on"""
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU+TTL store (single worker / development only).
+
+    Keeps reverse maps from email and user_id to their tokens so
+    invalidating a user costs O(that user's sessions).
+    """
+
+    def __init__(self, max_sessions=100000, max_ttl=SESSION_LIFETIME_SECONDS):
+        self.max_ttl = max_ttl
+        self._sessions = TTLCache(maxsize=max_sessions, ttl=max_ttl,
+                                  on_evict=self._unindex)
+        self._by_email = {}
+        self._by_user = {}
+        self._index_lock = threading.Lock()
+
+    def _unindex(self, token, session_data):
+        with self._index_lock:
+            for index, key in ((self._by_email, session_data.get('email')),
+                               (self._by_user, session_data.get('user_id'))):
+                tokens = index.get(key)
+                if tokens is not None:
+                    tokens.discard(token)
+                    if not tokens:
+                        del index[key]
+
+    def get(self, token):
+        return self._sessions.get(token)
+
+    def save(self, token, session_data):
+        ttl = min(self.max_ttl, _remaining_seconds(session_data))
+        if ttl <= 0:
+            return
+        self.delete(token)
+        with self._index_lock:
+            self._by_email.setdefault(session_data.get('email'), set()).add(token)
+            self._by_user.setdefault(session_data.get('user_id'), set()).add(token)
+        self._sessions.set(token, session_data, ttl=ttl)
+
+    def delete(self, token):
+        session_data = self._sessions.pop(token)
+        if session_data is not None:
+            self._unindex(token, session_data)
+
+    def _delete_all(self, index, key):
+        with self._index_lock:
+            tokens = list(index.get(key, ()))
+        for token in tokens:
+            self.delete(token)
+        return len(tokens)
+
+    def delete_by_email(self, email):
+        return self._delete_all(self._by_email, email)
+
+    def delete_by_user(self, user_id):
+        return self._delete_all(self._by_user, user_id)
+
+    def sweep(self, limit=1000):
+        return self._sessions.purge_expired(limit)
+
+
+class MongoSessionStore(SessionStore):
+    """Sessions shared by every worker through a MongoDB collection.
+
+    Expired documents are removed by a TTL index on 'expires'; email and
+    user_id are indexed so per-user invalidation doesn't scan. Reads go
+    through a small per-worker cache so most requests never touch the
+    database; a logout on another worker is therefore only seen here once
+    the cached entry ages out (cache_ttl seconds at most).
+    """
+
+    def __init__(self, collection, cache_size=10000, cache_ttl=30):
+        self.collection = collection
+        self._cache = MemorySessionStore(max_sessions=cache_size, max_ttl=cache_ttl)
+
+    @staticmethod
+    def _key(token):
+        # Only store a digest so a database dump doesn't leak usable tokens
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def ensure_indexes(self):
+        self.collection.create_index('expires', expireAfterSeconds=0)
+        self.collection.create_index('email')
+        self.collection.create_index('user_id')
+
+    def peek(self, token):
+        return self._cache.get(token)
+
+    def get(self, token):
+        session_data = self._cache.get(token)
+        if session_data is None:
+            session_data = self.collection.find_one({'_id': self._key(token)}, {'_id': 0})
+            if session_data is None:
+                return None
+            self._cache.save(token, session_data)
+        return session_data
+
+    def save(self, token, session_data):
+        self.collection.replace_one(
+            {'_id': self._key(token)},
+            dict(session_data),
+            upsert=True
+        )
+        self._cache.save(token, session_data)
+
+    def delete(self, token):
+        self._cache.delete(token)
+        self.collection.delete_one({'_id': self._key(token)})
+
+    def delete_by_email(self, email):
+        self._cache.delete_by_email(email)
+        return self.collection.delete_many({'email': email}).deleted_count
+
+    def delete_by_user(self, user_id):
+        self._cache.delete_by_user(user_id)
+        return self.collection.delete_many({'user_id': user_id}).deleted_count
+
+    def sweep(self, limit=1000):
+        # The TTL monitor normally gets there first; this only catches up
+        # when it lags, and never deletes more than `limit` at once
+        self._cache.sweep(limit)
+        expired = [doc['_id'] for doc in self.collection.find(
+            {'expires': {'$lt': datetime.utcnow()}}, {'_id': 1}).limit(limit)]
+        if not expired:
+            return 0
+        return self.collection.delete_many({'_id': {'$in': expired}}).deleted_count
+
+
+def create_session_store(backend, collection=None):
+    """Build the session store named by SESSION_BACKEND ('mongo' or 'memory')"""
+    if backend == 'memory':
+        return MemorySessionStore()
+    if backend == 'mongo':
+        return MongoSessionStore(collection)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+def start_sweeper(store, interval=60, batch_size=1000):
+    """Expire stale sessions from a daemon thread, batch_size at a time"""
+
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                # Keep going while full batches come back, but yield in between
+                while store.sweep(batch_size) >= batch_size:
+                    time.sleep(0.1)
+            except Exception as e:
+                print(f"Session sweep failed: {str(e)}")
+
+    thread = threading.Thread(target=run, name='session-sweeper', daemon=True)
+    thread.start()
+    return thread
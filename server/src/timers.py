@@ -0,0 +1,144 @@
+"""
+Server-side pomodoro timers.
+
+The timer itself lives in the `timers` collection (one document per user,
+written on every start/pause/resume/complete), so it survives restarts and
+any worker can validate a completion. TimerScheduler only keeps what's
+needed to notify users when their timer runs out: a min-heap of
+(expiry, seq, user_id, generation) and the live generation per user.
+Pausing or restarting a timer bumps its generation, which makes the old
+heap entry stale instead of searching the heap for it.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from datetime import timezone
+
+RUNNING = 'running'
+PAUSED = 'paused'
+
+
+def epoch(value):
+    """Seconds since the epoch of a naive UTC datetime (as Mongo returns them)"""
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+def timer_body(timer, now):
+    """A timer document as the frontend sees it"""
+    if timer['state'] == RUNNING:
+        remaining = max(0.0, (timer['expires_at'] - now).total_seconds())
+    else:
+        remaining = timer['remaining_seconds']
+    return {
+        'state': timer['state'],
+        'label': timer.get('label'),
+        'duration_seconds': timer['duration_seconds'],
+        'remaining_seconds': round(remaining, 3),
+        'expires_at': timer.get('expires_at'),
+        'started_at': timer['started_at']
+    }
+
+
+class TimerScheduler:
+    """
+    Calls on_expire(user_id, generation) from one thread when a scheduled
+    timer runs out. schedule() and cancel() are O(log n) and O(1); stale
+    heap entries are skipped when popped and compacted away once they are
+    half the heap.
+
+    `loader` (optional) returns (user_id, expires_at epoch, generation) for
+    timers this process should take over (ones it didn't schedule itself,
+    e.g. because the worker that did died). It is called when the thread
+    starts and then every load_interval seconds.
+    """
+
+    def __init__(self, on_expire, loader=None, load_interval=10):
+        self.on_expire = on_expire
+        self.loader = loader
+        self.load_interval = load_interval
+        self.fired = 0
+        self._heap = []
+        self._live = {}  # user_id -> generation of its scheduled timer
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None
+
+    def start(self):
+        """Start the scheduler thread (once per process; threads don't survive a fork)"""
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._run, name='timer-scheduler', daemon=True).start()
+
+    def schedule(self, user_id, expires_at, generation):
+        """(Re)schedule a user's timer; expires_at is seconds since the epoch"""
+        self.start()
+        with self._cond:
+            self._live[user_id] = generation
+            heapq.heappush(self._heap, (expires_at, next(self._seq), user_id, generation))
+            # Only the thread's wait needs cutting short, and only if this is the new earliest
+            if self._heap[0][2] == user_id and self._heap[0][3] == generation:
+                self._cond.notify()
+
+    def cancel(self, user_id):
+        with self._cond:
+            self._live.pop(user_id, None)
+            if len(self._heap) > 64 and len(self._heap) > 2 * len(self._live):
+                self._compact()
+
+    def _compact(self):
+        self._heap = [entry for entry in self._heap if self._live.get(entry[2]) == entry[3]]
+        heapq.heapify(self._heap)
+
+    def pop_due(self, now):
+        """[(user_id, generation)] of every live timer that expired by `now`"""
+        due = []
+        with self._cond:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, user_id, generation = heapq.heappop(self._heap)
+                if self._live.get(user_id) == generation:
+                    del self._live[user_id]
+                    due.append((user_id, generation))
+        return due
+
+    def __len__(self):
+        return len(self._live)
+
+    def _load(self):
+        try:
+            loaded = 0
+            for user_id, expires_at, generation in self.loader():
+                with self._cond:
+                    # schedule() may already have seen a newer generation
+                    if generation > self._live.get(user_id, -1):
+                        self._live[user_id] = generation
+                        heapq.heappush(self._heap, (expires_at, next(self._seq), user_id, generation))
+                        loaded += 1
+            if loaded:
+                print(f"Took over {loaded} running timers")
+        except Exception as e:
+            print(f"Could not load running timers: {str(e)}")
+
+    def _run(self):
+        next_load = time.time()
+        while True:
+            if self.loader and time.time() >= next_load:
+                self._load()
+                next_load = time.time() + self.load_interval
+
+            with self._cond:
+                timeout = self._heap[0][0] - time.time() if self._heap else None
+                if self.loader:
+                    timeout = min(timeout, next_load - time.time()) if timeout is not None \
+                        else next_load - time.time()
+                if timeout is None or timeout > 0:
+                    self._cond.wait(timeout)
+            for user_id, generation in self.pop_due(time.time()):
+                self.fired += 1
+                try:
+                    self.on_expire(user_id, generation)
+                except Exception as e:
+                    print(f"Timer expiry handler failed for {user_id}: {str(e)}")
@@ -0,0 +1,189 @@
+from contextvars import ContextVar
+
+from bson.objectid import ObjectId
+from flask import g, has_request_context
+from pymongo import monitoring
+
+# Never sent back to clients as-is (ObjectIds, served by their own routes)
+HIDDEN_FIELDS = ('friend_ids',)
+
+# The fields the frontend keeps polling (points, progress, collection,
+# settings); they are cached together, see UserStore
+PROFILE_FIELDS = frozenset({
+    'points', 'daily_points', 'level', 'experience',
+    'collection', 'settings', 'displayed_characters'
+})
+PROFILE_PROJECTION = {field: 1 for field in PROFILE_FIELDS}
+
+# Database commands issued in the current request, see RoundTripCounter.
+# A one-item list so work handed to other threads with a copied context
+# still adds to the request's count
+_round_trips = ContextVar('db_round_trips', default=None)
+
+
+class RoundTripCounter(monitoring.CommandListener):
+    """Counts every command sent to MongoDB, per request context"""
+
+    def started(self, event):
+        count = _round_trips.get()
+        if count is not None:
+            count[0] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def round_trips():
+    """Database round trips made so far in this request"""
+    count = _round_trips.get()
+    return count[0] if count is not None else 0
+
+
+def reset_round_trips():
+    _round_trips.set([0])
+
+
+class UserStore:
+    """
+    Reads user documents with only the fields a route needs.
+
+    Within a request the loaded document is memoized, so asking for a user
+    twice (or for fields already loaded) costs no extra round trip. When new
+    fields are needed, they are loaded together with the ones already held.
+
+    Requests for PROFILE_FIELDS go through `cache` (a ProfileCache), which
+    holds all of them per user. Routes that change those fields must call
+    write_through() with the updated document or invalidate().
+    """
+
+    def __init__(self, collection, cache=None):
+        self.collection = collection
+        self.cache = cache
+
+    def _memo(self):
+        if not has_request_context():
+            return {}
+        if '_user_memo' not in g:
+            g._user_memo = {}  # user id -> (loaded fields or None for all, doc)
+        return g._user_memo
+
+    def get(self, user_id, fields=None, fresh=False):
+        """
+        The user document with at least `fields` (top-level names), or the
+        whole document minus HIDDEN_FIELDS if fields is None. None if the
+        user doesn't exist.
+
+        fresh=True always reads MongoDB, never the profile cache, for checks
+        a write depends on (the cache may be another worker's write behind).
+        """
+        user_id = str(user_id)
+        memo = self._memo()
+        wanted = None if fields is None else frozenset(fields)
+
+        if user_id in memo and not fresh:
+            loaded, doc = memo[user_id]
+            if doc is None or loaded is None or (wanted is not None and wanted <= loaded):
+                return doc
+            if wanted is not None:
+                wanted |= loaded
+
+        if self.cache is not None and not fresh and wanted is not None and wanted <= PROFILE_FIELDS:
+            doc = self._profile(user_id)
+            wanted = PROFILE_FIELDS
+        else:
+            if wanted is None:
+                projection = {field: 0 for field in HIDDEN_FIELDS}
+            else:
+                projection = {field: 1 for field in wanted} or {'_id': 1}
+            doc = self.collection.find_one({'_id': ObjectId(user_id)}, projection)
+
+        memo[user_id] = (wanted, doc)
+        return doc
+
+    def _profile(self, user_id):
+        profile = self.cache.get(user_id)
+        if profile is None:
+            profile = self.collection.find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+            if profile is not None:
+                self.cache.set(user_id, profile)
+        return profile
+
+    def write_through(self, user_id, user):
+        """
+        Cache a user document returned by a write. It must have been read
+        with (at least) PROFILE_PROJECTION, otherwise use invalidate().
+        """
+        user_id = str(user_id)
+        self._memo().pop(user_id, None)
+        if self.cache is not None and user is not None:
+            self.cache.set(user_id, {k: v for k, v in user.items() if k in PROFILE_FIELDS or k == '_id'})
+
+    def invalidate(self, user_id):
+        """Drop a user's cached profile after writing to it"""
+        user_id = str(user_id)
+        self._memo().pop(user_id, None)
+        if self.cache is not None:
+            self.cache.delete(user_id)
+
+    def exists(self, user_id):
+        return self.get(user_id, ()) is not None
+
+    def _field(self, user_id, field, default, fresh=False):
+        user = self.get(user_id, (field,), fresh=fresh)
+        if user is None:
+            return None
+        return user.get(field, default)
+
+    def points(self, user_id):
+        return self._field(user_id, 'points', 0)
+
+    def collection_of(self, user_id, fresh=False):
+        return self._field(user_id, 'collection', {}, fresh=fresh)
+
+    def settings(self, user_id, default=None):
+        return self._field(user_id, 'settings', default)
+
+    def daily_points(self, user_id):
+        return self._field(user_id, 'daily_points', {})
+
+    def displayed_characters(self, user_id):
+        return self._field(user_id, 'displayed_characters', [])
+
+    def progress(self, user_id):
+        """The user's level/experience fields (as stored, may be missing)"""
+        return self.get(user_id, ('level', 'experience'))
+
+
+class AsyncUserStore:
+    """
+    Profile reads for the ASGI app (see asgi.py), on an async collection.
+
+    Shares its ProfileCache with the process's UserStore, so write-throughs
+    and invalidations from the Flask routes are seen here too. The cache
+    calls themselves are synchronous, which is only cheap for the memory
+    backend.
+    """
+
+    def __init__(self, collection, cache=None):
+        self.collection = collection
+        self.cache = cache
+
+    async def profile(self, user_id):
+        """The user's PROFILE_FIELDS, or None if the user doesn't exist"""
+        user_id = str(user_id)
+        if self.cache is not None:
+            profile = self.cache.get(user_id)
+            if profile is not None:
+                return profile
+
+        profile = await self.collection.find_one({'_id': ObjectId(user_id)}, PROFILE_PROJECTION)
+        if profile is not None and self.cache is not None:
+            self.cache.set(user_id, profile)
+        return profile
+
+    def invalidate(self, user_id):
+        if self.cache is not None:
+            self.cache.delete(str(user_id))
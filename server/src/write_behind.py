@@ -0,0 +1,279 @@
+"""
+Write-behind queue for append-only documents nobody reads back right away
+(pomodoro history rows).
+
+put() appends the document to a local spill file and returns; a flusher
+thread writes queued documents with insert_many(ordered=False) once
+batch_size are waiting or every flush_interval seconds, and on shutdown.
+
+Every document gets its _id before it is spilled, so replaying a spill
+file after a crash can't insert a row twice: documents that made it to
+MongoDB fail with duplicate key errors, which are ignored.
+
+Spill files are per process ("<pid>-<token>-<n>.ndjson" in spill_dir,
+extended JSON, with a token that is new every time a process starts) and
+stay locked (flock) until every document in them is in MongoDB. On start,
+before it opens a spill file of its own, each process replays the unlocked
+files it finds: the ones left by workers that died. A restarted worker that
+gets a dead worker's pid never reopens that worker's file.
+"""
+import atexit
+import fcntl
+import os
+import threading
+import uuid
+from collections import deque
+
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError, PyMongoError
+
+DUPLICATE_KEY = 11000
+SPILL_SUFFIX = '.ndjson'
+
+
+class SpillFile:
+    """An append-only file of queued documents, locked while a process owns it"""
+
+    def __init__(self, path, sync=True, create=True):
+        self.path = path
+        self.sync = sync
+        # New files are never shared; replaying must not recreate a file
+        # another process just removed
+        self.file = open(path, 'xb' if create else 'rb')
+        try:
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.file.close()
+            raise
+
+    def append(self, doc):
+        self.file.write(json_util.dumps(doc).encode('utf-8') + b'\n')
+        self.file.flush()
+        if self.sync:
+            os.fsync(self.file.fileno())
+
+    def remove(self):
+        os.unlink(self.path)
+        self.file.close()
+
+
+def read_spill_file(path):
+    """Documents of a spill file; a line torn by a crash is skipped"""
+    docs = []
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                docs.append(json_util.loads(line))
+            except ValueError:
+                print(f"Skipping unreadable line in {path}")
+    return docs
+
+
+def insert_batch(collection, docs):
+    """insert_many(ordered=False) that treats already-inserted documents as done"""
+    try:
+        collection.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = [error for error in e.details.get('writeErrors', []) if error.get('code') != DUPLICATE_KEY]
+        if errors or e.details.get('writeConcernErrors'):
+            raise
+
+
+class WriteBehindQueue:
+    """
+    Bounded write-behind queue for one collection. When max_pending
+    documents are waiting (MongoDB is slow or down), put() flushes in the
+    caller instead of queueing more.
+
+    With flusher=False no thread is started: only flush(), recover() and
+    close() write.
+    """
+
+    def __init__(self, collection, spill_dir, batch_size=500, flush_interval=1.0,
+                 max_pending=10000, sync=True, flusher=True):
+        self.collection = collection
+        self.spill_dir = spill_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.sync = sync
+        self.flusher = flusher
+
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.recovered = 0
+
+        self._pending = deque()
+        self._spill = None
+        self._spilled = []  # rotated SpillFiles whose documents aren't all written yet
+        self._segment = 0
+        self._token = None
+        self._pid = None
+        self._recovered = False
+        self._closed = False
+        self._lock = threading.Lock()        # pending, spill file
+        self._flush_lock = threading.Lock()  # one flush at a time
+        self._wake = threading.Event()
+
+    # ==================== QUEUEING ====================
+
+    def put(self, doc):
+        """Queue a document (its _id is set here); it is durable once this returns"""
+        doc.setdefault('_id', ObjectId())
+        with self._lock:
+            self._ensure_started()
+            if self._closed:
+                # Shutting down: nothing would flush it any more
+                self.collection.insert_one(doc)
+                return
+            self._spill.append(doc)
+            self._pending.append(doc)
+            pending = len(self._pending)
+
+        if pending >= self.max_pending:
+            try:
+                self.flush()
+            except PyMongoError as e:
+                # The document is spilled already, the flusher will retry
+                print(f"Write-behind flush failed with {pending} documents queued: {str(e)}")
+        elif pending >= self.batch_size:
+            self._wake.set()
+
+    def stats(self):
+        return {
+            'pending': len(self._pending),
+            'flushed': self.flushed,
+            'batches': self.batches,
+            'failures': self.failures,
+            'recovered': self.recovered
+        }
+
+    def _ensure_started(self):
+        # Threads and locked files don't survive a fork: start once per process
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        if self._spill is not None:
+            # Inherited from the parent, which still owns it
+            self._spill.file.close()
+        self._pending.clear()
+        self._spilled = []
+        self._closed = False
+        self._token = uuid.uuid4().hex[:12]
+        os.makedirs(self.spill_dir, exist_ok=True)
+        # Replay what dead workers left before our own file exists; the
+        # flusher retries if MongoDB isn't reachable yet
+        try:
+            self.recover()
+            self._recovered = True
+        except PyMongoError as e:
+            self._recovered = False
+            print(f"Could not replay spilled documents, will retry: {str(e)}")
+        self._spill = self._open_spill()
+        if self.flusher:
+            threading.Thread(target=self._run, name='write-behind', daemon=True).start()
+        atexit.register(self.close)
+
+    def _open_spill(self):
+        self._segment += 1
+        path = os.path.join(self.spill_dir, f'{os.getpid()}-{self._token}-{self._segment}{SPILL_SUFFIX}')
+        return SpillFile(path, sync=self.sync)
+
+    # ==================== FLUSHING ====================
+
+    def _run(self):
+        while not self._closed:
+            if not self._recovered:
+                try:
+                    self.recover()
+                    self._recovered = True
+                except PyMongoError as e:
+                    print(f"Could not replay spilled documents, will retry: {str(e)}")
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except PyMongoError as e:
+                print(f"Write-behind flush failed, will retry: {str(e)}")
+
+    def flush(self):
+        """Write everything queued so far, batch_size documents per insert_many"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                docs = list(self._pending)
+                self._pending.clear()
+                # Documents queued from now on go to a new file
+                self._spilled.append(self._spill)
+                self._spill = self._open_spill()
+
+            written = 0
+            try:
+                for i in range(0, len(docs), self.batch_size):
+                    insert_batch(self.collection, docs[i:i + self.batch_size])
+                    written = i + self.batch_size
+                    self.batches += 1
+            except Exception:
+                self.failures += 1
+                # Keep the unwritten documents (and their files) for the next flush
+                with self._lock:
+                    self._pending.extendleft(reversed(docs[written:]))
+                raise
+
+            self.flushed += len(docs)
+            with self._lock:
+                spilled, self._spilled = self._spilled, []
+            for spill in spilled:
+                spill.remove()
+            return len(docs)
+
+    def recover(self):
+        """Write the documents of spill files left behind by dead processes"""
+        try:
+            names = sorted(os.listdir(self.spill_dir))
+        except FileNotFoundError:
+            return 0
+
+        recovered = 0
+        for name in names:
+            if not name.endswith(SPILL_SUFFIX):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            try:
+                spill = SpillFile(path, sync=False, create=False)
+            except OSError:
+                continue  # a live process owns it (or it was just replayed)
+            try:
+                # Another process may have replayed and removed it before we locked it
+                if not os.path.exists(path):
+                    continue
+                docs = read_spill_file(path)
+                for i in range(0, len(docs), self.batch_size):
+                    insert_batch(self.collection, docs[i:i + self.batch_size])
+                os.unlink(path)
+                recovered += len(docs)
+            finally:
+                spill.file.close()
+        if recovered:
+            print(f"Replayed {recovered} queued documents from {self.spill_dir}")
+        self.recovered += recovered
+        return recovered
+
+    def close(self):
+        """Flush on shutdown; whatever can't be written stays in the spill files"""
+        if self._closed or self._pid != os.getpid():
+            return
+        self._closed = True
+        self._wake.set()
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Write-behind flush on shutdown failed, {len(self._pending)} documents "
+                  f"left in {self.spill_dir}: {str(e)}")
+            return
+        with self._lock:
+            if not self._pending:
+                self._spill.remove()
@@ -0,0 +1,59 @@
+import os
+import sys
+
+# The server modules import each other by name (they run from server/src)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+# ...and so do the benchmark's (server/bench)
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bench'))
+
+from datetime import datetime, timedelta  # noqa: E402
+
+import pytest  # noqa: E402
+
+
+class Api:
+    """The Flask app on a fresh mongomock database"""
+
+    def __init__(self, appmod, database):
+        self.app = appmod
+        self.db = database
+        self.client = appmod.app.test_client()
+
+    def sign_in(self, email='ada@example.com', **fields):
+        """Insert a user and open a session; (user_id, auth headers)"""
+        user = {
+            'google_id': email, 'email': email, 'name': email.split('@')[0], 'picture': '',
+            'points': 0, 'pomodoro_sessions': 0, 'collection': {}, 'level': 1, 'experience': 0,
+            'settings': {'background_type': 'gradient', 'background_value': 'gradient-1', 'dark_mode': False},
+            'created_at': datetime.utcnow(), 'last_login': datetime.utcnow(),
+            'daily_points': {'date': '2000-01-01', 'points_earned': 0}
+        }
+        user.update(fields)
+        user_id = str(self.db.users.insert_one(user).inserted_id)
+        token = f'token-{user_id}'
+        self.app.sessions.save(token, {
+            'user_id': user_id, 'email': email, 'name': user['name'], 'picture': '',
+            'expires': datetime.utcnow() + timedelta(days=1)
+        })
+        return user_id, {'Authorization': f'Bearer {token}'}
+
+
+@pytest.fixture
+def api(monkeypatch):
+    import mongomock
+
+    # Read once, when app.py is first imported
+    os.environ.setdefault('SESSION_BACKEND', 'memory')
+    os.environ.setdefault('INDEX_BOOTSTRAP', 'off')
+    os.environ.setdefault('MIGRATIONS', 'off')
+    os.environ.setdefault('HISTORY_WRITE_BEHIND', 'off')
+    os.environ.setdefault('SESSION_SWEEPER', 'off')
+    import app as appmod
+    from timers import TimerScheduler
+
+    client = mongomock.MongoClient()
+    monkeypatch.setattr(appmod.mongo, '_client', client)
+    monkeypatch.setattr(appmod.mongo, '_pid', os.getpid())
+    # No thread loading timers from a database other tests are using
+    monkeypatch.setattr(appmod, 'timer_scheduler', TimerScheduler(appmod.notify_timer_finished))
+    return Api(appmod, appmod.mongo.database)
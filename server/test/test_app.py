@@ -0,0 +1,553 @@
+"""Routes of app.py on mongomock (see the `api` fixture in conftest.py)"""
+import io
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson.objectid import ObjectId
+
+from events import LocalBroker
+from indexes import IndexBootstrap
+
+
+# ==================== STARTUP ====================
+
+def test_legacy_friend_lists_are_migrated_at_startup(api):
+    friend_id, _ = api.sign_in('grace@example.com')
+    api.sign_in(friends=['grace@example.com'])
+
+    api.app.run_migrations()
+    api.app.run_migrations()  # every worker runs it
+
+    user = api.db.users.find_one({'email': 'ada@example.com'})
+    assert 'friends' not in user
+    assert [str(friend) for friend in user['friend_ids']] == [friend_id]
+
+
+def test_inline_backgrounds_are_moved_out_at_startup(api, monkeypatch):
+    stored = {}
+
+    def put(data, mimetype):
+        stored['abc123'] = (data, mimetype)
+        return 'abc123'
+
+    monkeypatch.setattr(api.app.image_store, 'put', put)
+    api.sign_in(settings={'background_type': 'image', 'background_value': 'data:image/png;base64,aGVsbG8='})
+
+    api.app.run_migrations()
+
+    user = api.db.users.find_one({'email': 'ada@example.com'})
+    assert user['settings']['background_value'] == '/api/images/abc123'
+    assert stored == {'abc123': (b'hello', 'image/png')}
+
+
+def test_recurring_copies_become_series_at_startup(api):
+    user_id, headers = api.sign_in()
+    start = datetime(2026, 3, 2, 9, 0, 0, 123000)
+    api.db.tasks.insert_many([
+        {'user_id': user_id, 'title': 'Stretch', 'recurring': True, 'completed': True,
+         'start': datetime(2026, 3, 1, 9), 'end': datetime(2026, 3, 1, 9, 15)},
+        {'user_id': user_id, 'title': 'Stretch', 'recurring': True, 'completed': False,
+         'start': start, 'end': datetime(2026, 3, 2, 9, 15)}
+    ])
+
+    api.app.run_migrations()
+
+    series = api.db.tasks.find_one({'recurrence': {'$exists': True}})
+    assert series['start'] == datetime(2026, 3, 2, 9)
+    assert api.db.tasks.count_documents({'recurrence': {'$exists': True}}) == 1
+    response = api.client.get('/api/tasks?start=2026-03-02T00:00:00Z&end=2026-03-05T00:00:00Z', headers=headers)
+    assert len(response.json['tasks']) == 3
+
+
+def test_the_session_sweeper_starts_once_on_the_first_request(api, monkeypatch):
+    started = []
+    monkeypatch.setattr(api.app, 'start_sweeper', lambda store, interval: started.append(store))
+    monkeypatch.setattr(api.app, 'session_sweeper', IndexBootstrap(api.app.sweep_sessions, mode='blocking'))
+    assert started == []
+
+    api.client.get('/health')
+    api.client.get('/health')
+
+    assert started == [api.app.sessions]
+
+
+# ==================== FRIENDS ====================
+
+def test_friend_ranking_events_drop_cached_boards(api):
+    user_id, headers = api.sign_in()
+    api.client.get('/health')  # the first request starts this worker's listener
+
+    # A board cached before another worker changed it
+    api.app.friend_boards._boards.set(user_id, [(user_id, {'name': 'stale'})])
+    api.app.event_broker.publish(user_id, api.app.FRIEND_RANKING_CHANGED, {'user_id': user_id})
+
+    assert api.app.friend_boards._boards.get(user_id) is None
+
+
+# ==================== POMODORO TIMERS ====================
+
+def expire_timer(api, user_id, seconds_ago=1):
+    api.db.timers.update_one({'_id': ObjectId(user_id)},
+                             {'$set': {'expires_at': datetime.utcnow() - timedelta(seconds=seconds_ago)}})
+
+
+def test_completion_is_rejected_before_the_timer_runs_out(api):
+    user_id, headers = api.sign_in()
+    assert api.client.post('/api/pomodoro/complete', headers=headers).json['error'] == 'No timer to complete'
+
+    api.client.post('/api/pomodoro/timer/start', headers=headers, json={'duration_minutes': 25})
+    response = api.client.post('/api/pomodoro/complete', headers=headers)
+
+    assert response.status_code == 400
+    assert response.json['error'] == 'Timer has not finished'
+    assert response.json['timer']['remaining_seconds'] > 1490
+    assert api.db.timers.count_documents({}) == 1
+    assert api.db.users.find_one({'_id': ObjectId(user_id)})['points'] == 0
+
+
+def test_completion_within_the_grace_period_counts(api):
+    user_id, headers = api.sign_in()
+    api.client.post('/api/pomodoro/timer/start', headers=headers, json={'duration_minutes': 25})
+    # Still a second to go: the client's clock or the request was a little ahead
+    expire_timer(api, user_id, seconds_ago=-1)
+
+    response = api.client.post('/api/pomodoro/complete', headers=headers)
+    assert response.status_code == 200
+    assert response.json['points_earned'] == 2
+
+
+def test_a_timer_pays_out_exactly_once(api):
+    user_id, headers = api.sign_in()
+    api.client.post('/api/pomodoro/timer/start', headers=headers,
+                    json={'duration_minutes': 50, 'label': 'Deep work'})
+    expire_timer(api, user_id)
+
+    first = api.client.post('/api/pomodoro/complete', headers=headers, json={'points': 1000})
+    second = api.client.post('/api/pomodoro/complete', headers=headers)
+
+    # Points come from the timer's duration, never from the request
+    assert (first.status_code, first.json['points_earned']) == (200, 2)
+    assert (second.status_code, second.json['error']) == (400, 'No timer to complete')
+    user = api.db.users.find_one({'_id': ObjectId(user_id)})
+    assert (user['points'], user['pomodoro_sessions']) == (2, 1)
+    [row] = api.db.pomodoro_sessions.find()
+    assert (row['label'], row['duration_minutes'], row['points_earned']) == ('Deep work', 50, 2)
+
+
+def test_pause_and_resume_keep_the_time_left(api):
+    user_id, headers = api.sign_in()
+    api.client.post('/api/pomodoro/timer/start', headers=headers, json={'duration_minutes': 25})
+
+    paused = api.client.post('/api/pomodoro/timer/pause', headers=headers).json['timer']
+    assert paused['state'] == 'paused'
+    assert api.client.post('/api/pomodoro/complete', headers=headers).status_code == 400
+
+    resumed = api.client.post('/api/pomodoro/timer/resume', headers=headers).json['timer']
+    assert resumed['state'] == 'running'
+    assert abs(resumed['remaining_seconds'] - paused['remaining_seconds']) < 1
+    assert api.db.timers.find_one()['generation'] == 3
+
+
+class StaleTimers:
+    """timers_collection whose find_one returns a copy read before another request changed it"""
+
+    def __init__(self, collection, stale):
+        self.collection = collection
+        self.stale = stale
+
+    def find_one(self, *args, **kwargs):
+        return dict(self.stale)
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_pause_and_resume_refuse_a_timer_that_changed_meanwhile(api, monkeypatch):
+    user_id, headers = api.sign_in()
+    api.client.post('/api/pomodoro/timer/start', headers=headers, json={'duration_minutes': 25})
+    running = api.db.timers.find_one()
+    api.client.post('/api/pomodoro/timer/start', headers=headers, json={'duration_minutes': 30})
+
+    monkeypatch.setattr(api.app, 'timers_collection', StaleTimers(api.db.timers, running))
+    assert api.client.post('/api/pomodoro/timer/pause', headers=headers).status_code == 409
+
+    monkeypatch.setattr(api.app, 'timers_collection', api.db.timers)
+    api.client.post('/api/pomodoro/timer/pause', headers=headers)
+    paused = api.db.timers.find_one()
+    api.client.post('/api/pomodoro/timer/resume', headers=headers)
+
+    monkeypatch.setattr(api.app, 'timers_collection', StaleTimers(api.db.timers, paused))
+    assert api.client.post('/api/pomodoro/timer/resume', headers=headers).status_code == 409
+    assert api.db.timers.find_one()['state'] == 'running'
+
+
+# ==================== RELEASING CHARACTERS ====================
+
+def record_events(api, monkeypatch, user_id):
+    """Events published to a user, through a broker of the test's own so its listener goes with it"""
+    events = []
+    broker = LocalBroker()
+    broker.listen(lambda to, event, data: events.append((event, data)) if to == user_id else None)
+    monkeypatch.setattr(api.app, 'event_broker', broker)
+    return events
+
+
+def test_releasing_some_copies_keeps_the_rest(api):
+    user_id, headers = api.sign_in(collection={'Tan': 3})
+
+    response = api.client.post('/api/collection/release', headers=headers, json={'character': 'Tan'})
+
+    assert response.status_code == 200
+    assert (response.json['xp_gained'], response.json['level'], response.json['leveled_up']) == (15, 1, False)
+    assert api.db.users.find_one({'_id': ObjectId(user_id)})['collection'] == {'Tan': 2}
+
+
+def test_releasing_whole_stacks_removes_them_and_levels_up(api, monkeypatch):
+    user_id, headers = api.sign_in(collection={'Tan': 3, 'Snow': 1, 'King': 1}, experience=90)
+    events = record_events(api, monkeypatch, user_id)
+
+    response = api.client.post('/api/collection/release/bulk', headers=headers,
+                               json={'characters': {'Tan': 3, 'Snow': 1}})
+
+    assert response.status_code == 200
+    assert response.json['collection'] == {'King': 1}
+    assert (response.json['total_xp'], response.json['level'], response.json['leveled_up']) == (235, 3, True)
+    assert response.json['xp_in_current_level'] == 35
+    user = api.db.users.find_one({'_id': ObjectId(user_id)})
+    assert (user['collection'], user['experience'], user['level']) == ({'King': 1}, 235, 3)
+    assert ('level_up', {'level': 3, 'experience': 235}) in events
+
+
+def test_release_is_refused_if_the_collection_changed_since_it_was_read(api, monkeypatch):
+    user_id, headers = api.sign_in(collection={'Tan': 2})
+    # What this worker read before a gacha roll elsewhere changed the count
+    monkeypatch.setattr(api.app.user_store, 'get', lambda *args, **kwargs: {'collection': {'Tan': 3}, 'level': 1})
+
+    response = api.client.post('/api/collection/release', headers=headers, json={'character': 'Tan', 'count': 3})
+
+    assert response.status_code == 409
+    user = api.db.users.find_one({'_id': ObjectId(user_id)})
+    assert (user['collection'], user['experience']) == ({'Tan': 2}, 0)
+
+
+def test_release_reads_the_collection_past_the_profile_cache(api):
+    user_id, headers = api.sign_in(collection={'Tan': 3})
+    assert api.client.get('/api/collection', headers=headers).json == {'collection': {'Tan': 3}}
+    # e.g. a gacha roll on another worker
+    api.db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'collection.Tan': 5}})
+
+    response = api.client.post('/api/collection/release', headers=headers, json={'character': 'Tan', 'count': 5})
+
+    assert response.status_code == 200
+    assert api.client.get('/api/collection', headers=headers).json == {'collection': {}}
+
+
+def test_displayed_characters_are_checked_past_the_profile_cache(api):
+    user_id, headers = api.sign_in(collection={'Tan': 1})
+    api.client.get('/api/collection', headers=headers)
+    api.db.users.update_one({'_id': ObjectId(user_id)}, {'$set': {'collection.King': 1}})
+
+    response = api.client.put('/api/user/displayed-characters', headers=headers,
+                              json={'displayed_characters': ['King', 'Tan']})
+
+    assert response.status_code == 200
+    assert api.db.users.find_one({'_id': ObjectId(user_id)})['displayed_characters'] == ['King', 'Tan']
+
+
+def test_release_checks_ownership_and_counts(api):
+    _, headers = api.sign_in(collection={'Tan': 1})
+
+    def release(body):
+        return api.client.post('/api/collection/release/bulk', headers=headers, json=body)
+
+    assert release({'characters': {'Tan': 2}}).json['error'] == 'Only own 1 Tan, cannot release 2'
+    assert release({'characters': {'Nobody': 1}}).status_code == 400
+    assert release({'characters': {'Tan': 0}}).status_code == 400
+    assert release({'characters': ['Tan']}).status_code == 400
+
+
+# ==================== DAILY POINTS ====================
+
+def today():
+    return str(datetime.now(timezone(timedelta(hours=-8))).date())  # app.PST
+
+
+def test_check_in_awards_points_once_a_day(api):
+    user_id, headers = api.sign_in(points=10)
+
+    first = api.client.post('/api/checkin', headers=headers)
+    second = api.client.post('/api/checkin', headers=headers)
+
+    assert first.json == {'success': True, 'points_earned': 5, 'total_points': 15}
+    assert (second.status_code, second.json['error']) == (400, 'Already checked in today')
+    user = api.db.users.find_one({'_id': ObjectId(user_id)})
+    assert user['points'] == 15
+    assert user['daily_points'] == {'date': today(), 'points_earned': 5, 'last_checkin_date': today()}
+
+
+def test_awards_stop_at_the_daily_cap(api):
+    user_id, headers = api.sign_in(points=100, daily_points={
+        'date': today(), 'points_earned': 48, 'last_award': 3  # left by older versions
+    })
+
+    assert api.client.post('/api/checkin', headers=headers).json['points_earned'] == 2
+    api.db.users.update_one({'_id': ObjectId(user_id)}, {'$unset': {'daily_points.last_checkin_date': ''}})
+    assert api.client.post('/api/checkin', headers=headers).json['points_earned'] == 0
+
+    user = api.db.users.find_one({'_id': ObjectId(user_id)})
+    assert user['points'] == 102
+    assert user['daily_points']['points_earned'] == 50
+    assert 'last_award' not in user['daily_points']
+    assert api.client.get('/api/user/daily-points', headers=headers).json['daily_points'] == 50
+
+
+def test_a_new_day_resets_the_allowance(api):
+    user_id, headers = api.sign_in(points=100, daily_points={
+        'date': '2000-01-01', 'points_earned': 50, 'last_checkin_date': '2000-01-01'
+    })
+
+    response = api.client.post('/api/checkin', headers=headers)
+
+    assert response.json['points_earned'] == 5
+    daily_points = api.db.users.find_one({'_id': ObjectId(user_id)})['daily_points']
+    assert (daily_points['date'], daily_points['points_earned']) == (today(), 5)
+
+
+# ==================== POMODORO HISTORY ====================
+
+def test_sessions_are_paged_by_default(api, monkeypatch):
+    user_id, headers = api.sign_in()
+    monkeypatch.setattr(api.app, 'MAX_SESSIONS_PER_PAGE', 2)
+    api.db.pomodoro_sessions.insert_many([
+        {'user_id': user_id, 'duration_minutes': 25, 'completed_at': datetime(2026, 3, day, 18)}
+        for day in (2, 3, 4)
+    ])
+
+    first = api.client.get('/api/pomodoro/sessions', headers=headers).json
+    rest = api.client.get(f"/api/pomodoro/sessions?cursor={first['next_cursor']}", headers=headers).json
+
+    assert [session['completed_at'] for session in first['sessions'] + rest['sessions']] == [
+        '2026-03-04T18:00:00+00:00', '2026-03-03T18:00:00+00:00', '2026-03-02T18:00:00+00:00'
+    ]
+    assert (len(first['sessions']), rest['next_cursor']) == (2, None)
+
+
+class WithoutTimezones:
+    """
+    Collection whose aggregate() drops $dateToString's timezone, which
+    mongomock doesn't implement; the pipelines it got are kept
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return self.collection.aggregate(self._strip(pipeline))
+
+    def _strip(self, value):
+        if isinstance(value, dict):
+            return {k: self._strip(v) for k, v in value.items() if k != 'timezone'}
+        if isinstance(value, list):
+            return [self._strip(v) for v in value]
+        return value
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def test_sessions_summary_totals_by_day_and_label(api, monkeypatch):
+    history = WithoutTimezones(api.db.pomodoro_sessions)
+    monkeypatch.setattr(api.app, 'readonly_pomodoro_collection', history)
+    user_id, headers = api.sign_in()
+    other_id, _ = api.sign_in('grace@example.com')
+    # Times that fall on the same day in UTC and PST
+    api.db.pomodoro_sessions.insert_many([
+        {'user_id': user_id, 'label': 'Focus', 'duration_minutes': 25, 'points_earned': 2,
+         'completed_at': datetime(2026, 3, 1, 18, 0)},
+        {'user_id': user_id, 'label': 'Focus', 'duration_minutes': 50, 'points_earned': 2,
+         'completed_at': datetime(2026, 3, 2, 18, 0)},
+        {'user_id': user_id, 'label': 'Reading', 'duration_minutes': 25, 'points_earned': 0,
+         'completed_at': datetime(2026, 3, 2, 19, 0)},
+        {'user_id': other_id, 'label': 'Focus', 'duration_minutes': 25, 'points_earned': 2,
+         'completed_at': datetime(2026, 3, 2, 19, 0)},
+    ])
+
+    summary = api.client.get('/api/pomodoro/sessions/summary', headers=headers).json
+
+    assert (summary['total_sessions'], summary['total_minutes'], summary['total_points']) == (3, 100, 4)
+    assert summary['by_day'] == [
+        {'date': '2026-03-01', 'sessions': 1, 'minutes': 25, 'points': 2},
+        {'date': '2026-03-02', 'sessions': 2, 'minutes': 75, 'points': 2},
+    ]
+    assert summary['by_label'] == [
+        {'label': 'Focus', 'sessions': 2, 'minutes': 75, 'points': 4},
+        {'label': 'Reading', 'sessions': 1, 'minutes': 25, 'points': 0},
+    ]
+    # Days are PST days on a real server
+    by_day = history.pipelines[0][1]['$facet']['by_day'][0]['$group']['_id']
+    assert by_day['$dateToString']['timezone'] == api.app.PST_UTC_OFFSET
+
+    window = api.client.get('/api/pomodoro/sessions/summary?start=2026-03-02T12:00:00Z', headers=headers).json
+    assert window['total_sessions'] == 2
+
+
+def test_sessions_summary_of_an_empty_history(api):
+    _, headers = api.sign_in()
+    assert api.client.get('/api/pomodoro/sessions/summary', headers=headers).json == {
+        'total_sessions': 0, 'total_minutes': 0, 'total_points': 0, 'by_day': [], 'by_label': []
+    }
+    assert api.client.get('/api/pomodoro/sessions/summary?start=soon', headers=headers).status_code == 400
+
+
+# ==================== TASKS ====================
+
+def test_tasks_are_paged_by_default(api, monkeypatch):
+    user_id, headers = api.sign_in()
+    monkeypatch.setattr(api.app, 'MAX_TASKS_PER_PAGE', 2)
+    api.db.tasks.insert_many([
+        {'user_id': user_id, 'title': f'Task {day}', 'completed': False,
+         'start': datetime(2026, 3, day, 9), 'end': datetime(2026, 3, day, 10)}
+        for day in (2, 3, 4)
+    ])
+
+    first = api.client.get('/api/tasks?start=2026-03-01T00:00:00Z', headers=headers).json
+    rest = api.client.get(f"/api/tasks?start=2026-03-01T00:00:00Z&cursor={first['next_cursor']}",
+                          headers=headers).json
+
+    assert [task['title'] for task in first['tasks']] == ['Task 2', 'Task 3']
+    assert [task['title'] for task in rest['tasks']] == ['Task 4']
+    assert rest['next_cursor'] is None
+
+
+
+def insert_series(api, user_id, **fields):
+    series = dict({'user_id': user_id, 'title': 'Stretch', 'points': 1, 'recurring': True,
+                   'completed': False, 'start': datetime(2026, 3, 2, 9), 'end': datetime(2026, 3, 2, 10),
+                   'recurrence': {'freq': 'daily', 'interval': 2, 'weekdays': None, 'until': None},
+                   'completed_occurrences': []}, **fields)
+    return str(api.db.tasks.insert_one(series).inserted_id)
+
+
+def test_completing_an_occurrence_records_it_once(api):
+    user_id, headers = api.sign_in()
+    series_id = insert_series(api, user_id)
+
+    first = api.client.post(f'/api/tasks/{series_id}_20260304T090000/complete', headers=headers)
+    second = api.client.post(f'/api/tasks/{series_id}_20260304T090000/complete', headers=headers)
+
+    assert first.json['points_earned'] == 1
+    assert (second.status_code, second.json['error']) == (400, 'Task already completed')
+    assert api.db.tasks.find_one()['completed_occurrences'] == [datetime(2026, 3, 4, 9)]
+
+
+def test_dates_off_the_series_are_never_recorded(api, monkeypatch):
+    user_id, headers = api.sign_in()
+    series_id = insert_series(api, user_id)
+    updates = []
+    monkeypatch.setattr(api.app.tasks_collection, 'find_one_and_update',
+                        lambda *args, **kwargs: updates.append(args))
+
+    response = api.client.post(f'/api/tasks/{series_id}_20260303T090000/complete', headers=headers)
+
+    assert response.status_code == 404
+    assert updates == []
+    assert api.db.tasks.find_one()['completed_occurrences'] == []
+
+
+def test_series_are_read_with_only_the_completions_in_the_window(api, monkeypatch):
+    user_id, headers = api.sign_in()
+    series_id = insert_series(api, user_id, completed_occurrences=[
+        datetime(2026, 3, 2, 9), datetime(2026, 5, 1, 9), datetime(2026, 5, 3, 9)
+    ])
+    read = []
+    original = api.app.tasks_collection.aggregate
+
+    def aggregate(pipeline):
+        read.extend(original(pipeline))
+        return iter(read)
+
+    monkeypatch.setattr(api.app.tasks_collection, 'aggregate', aggregate)
+
+    body = api.client.get('/api/tasks?start=2026-05-01T00:00:00Z&end=2026-05-05T00:00:00Z',
+                          headers=headers).json
+
+    assert [(task['_id'], task['completed']) for task in body['tasks']] == [
+        (f'{series_id}_20260501T090000', True),
+        (f'{series_id}_20260503T090000', True)
+    ]
+    assert read[0]['completed_occurrences'] == [datetime(2026, 5, 1, 9), datetime(2026, 5, 3, 9)]
+
+
+# ==================== DASHBOARD ====================
+
+def test_dashboard_returns_the_requested_sections(api):
+    user_id, headers = api.sign_in(points=42, collection={'Tan': 2})
+    api.db.tasks.insert_one({'user_id': user_id, 'title': 'Write', 'completed': False,
+                             'start': datetime(2026, 3, 2, 9), 'end': datetime(2026, 3, 2, 10)})
+
+    body = api.client.get('/api/dashboard?sections=points,collection', headers=headers).json
+    assert body == {'points': {'points': 42}, 'collection': {'collection': {'Tan': 2}}}
+
+    body = api.client.get('/api/dashboard?sections=tasks&start=2026-03-02T00:00:00Z'
+                          '&end=2026-03-03T00:00:00Z', headers=headers).json
+    assert list(body) == ['tasks']
+    assert [task['title'] for task in body['tasks']['tasks']] == ['Write']
+
+    body = api.client.get('/api/dashboard', headers=headers).json
+    assert set(body) == set(api.app.DASHBOARD_SECTIONS)
+    assert body['stats']['level'] == 1
+
+
+def test_dashboard_rejects_unknown_sections_and_missing_users(api):
+    user_id, headers = api.sign_in()
+
+    response = api.client.get('/api/dashboard?sections=points,secrets', headers=headers)
+    assert (response.status_code, response.json['error']) == (400, 'Unknown sections: secrets')
+
+    api.db.users.delete_one({'_id': ObjectId(user_id)})
+    assert api.client.get('/api/dashboard?sections=points', headers=headers).status_code == 404
+
+
+# ==================== BACKGROUND IMAGES ====================
+
+def test_oversized_uploads_are_refused_before_they_are_read(api, monkeypatch):
+    _, headers = api.sign_in()
+    monkeypatch.setitem(api.app.app.config, 'MAX_CONTENT_LENGTH', 1024)
+    monkeypatch.setattr(api.app, 'prepare_image', lambda *args: pytest.fail('upload was read'))
+
+    response = api.client.post('/api/settings/background-image', headers=headers,
+                               data={'image': (io.BytesIO(b'x' * 4096), 'big.png')})
+
+    assert response.status_code == 413
+    assert response.json['error'].startswith('Request too large')
+
+
+# ==================== METRICS ====================
+
+def test_metrics_need_the_token_or_an_allowed_address(api, monkeypatch):
+    monkeypatch.setattr(api.app, 'METRICS_TOKEN', 'scrape')
+    # mongomock has no connection pool
+    monkeypatch.setattr(api.app.mongo, 'stats', lambda: {'open': 1, 'checked_out': 0, 'pool_timeouts': 0})
+
+    def scrape(address, **headers):
+        return api.client.get('/metrics', headers=headers, environ_overrides={'REMOTE_ADDR': address})
+
+    assert scrape('127.0.0.1').status_code == 200
+    assert scrape('203.0.113.7').status_code == 401
+    assert scrape('203.0.113.7', Authorization='Bearer nope').status_code == 401
+    assert scrape('203.0.113.7', Authorization='Bearer scrape').status_code == 200
+
+
+def test_streamed_responses_are_timed_until_closed(api, monkeypatch):
+    _, headers = api.sign_in()
+    finished = []
+    monkeypatch.setattr(api.app.metrics, 'finish', lambda status, path=None: finished.append((status, path)))
+
+    response = api.client.get('/api/tasks?format=ndjson', headers=headers, buffered=False)
+    assert finished == []
+
+    response.get_data()
+    response.close()
+    assert finished == [(200, '/api/tasks')]
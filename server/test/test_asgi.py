@@ -0,0 +1,74 @@
+"""Native GET routes of asgi.py, on the mongomock database of the `api` fixture"""
+import asyncio
+import json
+
+import pytest
+from bson.objectid import ObjectId
+
+from user_store import AsyncUserStore
+
+
+class AsyncCollection:
+    """Awaitable find_one over a mongomock collection"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def find_one(self, *args, **kwargs):
+        return self.collection.find_one(*args, **kwargs)
+
+
+@pytest.fixture
+def asgi(api, monkeypatch):
+    import asgi
+
+    monkeypatch.setattr(asgi, 'users', AsyncUserStore(AsyncCollection(api.db.users)))
+
+    async def load_tasks(user_id, window):
+        return api.app.load_dashboard_tasks(user_id, window)
+
+    monkeypatch.setattr(asgi, 'load_tasks', load_tasks)
+    return asgi
+
+
+def get(asgi, path, headers):
+    """(status, JSON body) of a GET through the ASGI application"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode('latin-1'),
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()]
+    }
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.application(scope, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def test_dashboard_returns_the_requested_sections(api, asgi):
+    _, headers = api.sign_in(points=42, collection={'Tan': 2})
+
+    status, body = get(asgi, '/api/dashboard?sections=points,collection', headers)
+    assert status == 200
+    assert body == {'points': {'points': 42}, 'collection': {'collection': {'Tan': 2}}}
+
+    status, body = get(asgi, '/api/dashboard?sections=tasks', headers)
+    assert (status, body['tasks']['tasks']) == (200, [])
+
+    status, body = get(asgi, '/api/dashboard', headers)
+    assert set(body) == set(asgi.DASHBOARD_SECTIONS)
+
+
+def test_dashboard_rejects_unknown_sections_and_missing_users(api, asgi):
+    user_id, headers = api.sign_in()
+
+    assert get(asgi, '/api/dashboard?sections=secrets', headers) == (400, {'error': 'Unknown sections: secrets'})
+    assert get(asgi, '/api/dashboard', {})[0] == 401
+
+    api.db.users.delete_one({'_id': ObjectId(user_id)})
+    assert get(asgi, '/api/dashboard?sections=points', headers) == (404, {'error': 'User not found'})
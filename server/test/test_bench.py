@@ -0,0 +1,48 @@
+import random
+
+import mongomock
+
+from seed import TASKS_PER_USER, seed
+from workload import Mix, Sample, compare, percentile, summarize
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([7], 95) == 7
+    assert percentile([], 50) is None
+
+
+def test_seed_leaves_pending_tasks_for_active_users():
+    database = mongomock.MongoClient()['PomTimeBench']
+    users = seed(database, 50, random.Random(1), active=5, batch_size=20)
+
+    assert len(users) == 5
+    assert database.users.count_documents({}) == 50
+    assert database.tasks.count_documents({}) == 50 * TASKS_PER_USER
+    for user in users:
+        assert database.tasks.count_documents({
+            'user_id': user.user_id, 'completed': False, 'recurrence': {'$exists': False}
+        }) == len(user.pending_task_ids)
+
+
+def test_mix_falls_back_when_tasks_run_out():
+    users = seed(mongomock.MongoClient()['PomTimeBench'], 1, random.Random(1), active=1)
+    pending = len(users[0].pending_task_ids)
+    mix = Mix({'complete_task': 1})
+    routes = [mix.next_request(users[0], random.Random(2)).route for _ in range(pending + 2)]
+    assert routes[:pending] == ['POST /api/tasks/<id>/complete'] * pending
+    # A timer is started, then completed
+    assert routes[pending:] == ['POST /api/pomodoro/timer/start', 'POST /api/pomodoro/complete']
+
+
+def test_compare_flags_slower_routes_and_extra_round_trips():
+    baseline = summarize([Sample('GET /api/points', 200, 0.010, 1)] * 10, elapsed=1)
+    assert compare(baseline, baseline) == []
+
+    slower = summarize([Sample('GET /api/points', 200, 0.020, 2)] * 10, elapsed=2)
+    regressions = compare(baseline, slower)
+    assert 'GET /api/points: p95_ms 10.0 -> 20.0' in regressions
+    assert 'GET /api/points: round trips 1.0 -> 2.0' in regressions
+    assert 'throughput 10.0 -> 5.0 req/s' in regressions
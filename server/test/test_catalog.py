@@ -0,0 +1,30 @@
+import pytest
+
+from catalog import CATALOG, Catalog
+
+RARITIES = {5: {'rate': 0.006, 'xp': 1500}, 4: {'rate': 0.05, 'xp': 100}, 3: {'rate': 0.944, 'xp': 15}}
+
+
+def test_cumulative_weights_cover_every_character():
+    catalog = Catalog(RARITIES, {5: ['King', 'Angel'], 4: ['Snow'], 3: ['White', 'Brown']})
+    assert len(catalog.cum_weights) == 5
+    assert abs(catalog.cum_weights[-1] - 1.0) < 1e-9
+    assert abs(catalog.cum_weights[0] - 0.003) < 1e-9
+
+
+def test_lookup_by_name():
+    king = CATALOG.get('King')
+    assert (king.stars, king.xp, king.index) == (5, 1500, 0)
+    assert CATALOG.get('Tan').xp == 15
+    assert CATALOG.get('Nobody') is None
+    assert 'Moon' in CATALOG
+
+
+def test_catalog_is_read_only():
+    with pytest.raises(TypeError):
+        CATALOG.characters['Fake'] = None
+
+
+def test_rejects_duplicate_names():
+    with pytest.raises(ValueError):
+        Catalog(RARITIES, {5: ['King'], 4: ['King'], 3: ['Tan']})
@@ -0,0 +1,63 @@
+import asyncio
+import json
+
+import pytest
+
+from events import POINTS_CHANGED, EventHub, LocalBroker, create_event_broker, format_event
+
+
+def parse_frame(frame):
+    event, data = frame.decode('utf-8').rstrip('\n').split('\n')
+    return event.removeprefix('event: '), json.loads(data.removeprefix('data: '))
+
+
+def test_frames_are_server_sent_events():
+    frame = format_event(POINTS_CHANGED, {'points': 12, 'daily_points': 5})
+    assert frame.endswith(b'\n\n')
+    assert parse_frame(frame) == ('points', {'points': 12, 'daily_points': 5})
+
+
+def test_events_reach_only_their_users_streams():
+    async def run():
+        broker = LocalBroker()
+        hub = EventHub(broker)
+        hub.start(asyncio.get_running_loop())
+        phone, laptop, other = hub.subscribe('me'), hub.subscribe('me'), hub.subscribe('them')
+
+        # Routes publish from worker threads
+        await asyncio.to_thread(broker.publish, 'me', POINTS_CHANGED, {'points': 3})
+        await asyncio.to_thread(broker.publish, 'nobody', POINTS_CHANGED, {'points': 1})
+        await asyncio.sleep(0)
+
+        assert parse_frame(await phone.get()) == ('points', {'points': 3})
+        assert parse_frame(await laptop.get()) == ('points', {'points': 3})
+        assert other.empty()
+        assert hub.stats() == {'connections': 3, 'users': 2, 'delivered': 2, 'dropped': 0}
+
+        hub.unsubscribe('me', phone)
+        hub.unsubscribe('me', laptop)
+        assert hub.stats()['users'] == 1
+
+    asyncio.run(run())
+
+
+def test_slow_streams_keep_the_latest_events():
+    async def run():
+        broker = LocalBroker()
+        hub = EventHub(broker, queue_size=2)
+        hub.start(asyncio.get_running_loop())
+        queue = hub.subscribe('me')
+
+        for points in range(5):
+            broker.publish('me', POINTS_CHANGED, {'points': points})
+        await asyncio.sleep(0)
+
+        assert [parse_frame(queue.get_nowait())[1]['points'] for _ in range(2)] == [3, 4]
+        assert hub.stats()['dropped'] == 3
+
+    asyncio.run(run())
+
+
+def test_unknown_broker():
+    with pytest.raises(ValueError):
+        create_event_broker('kafka')
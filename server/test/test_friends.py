@@ -0,0 +1,63 @@
+from friends import FriendBoards, friends_board_pipeline
+
+
+class FakeUsers:
+    """Answers the friends board aggregation from an in-memory friend graph"""
+
+    name = 'users'
+
+    def __init__(self, users):
+        self.users = {u['_id']: u for u in users}
+        self.aggregations = 0
+
+    def aggregate(self, pipeline):
+        self.aggregations += 1
+        user = self.users[pipeline[0]['$match']['_id']]
+        if not user.get('friend_ids'):
+            return iter([])
+        members = [self.users[i] for i in user['friend_ids'] + [user['_id']]]
+        members.sort(key=lambda u: (-u['level'], -u['experience']))
+        return iter(members)
+
+
+def make_graph():
+    return FakeUsers([
+        {'_id': 'a', 'name': 'a', 'email': 'a@example.com', 'level': 3, 'experience': 250, 'friend_ids': ['b']},
+        {'_id': 'b', 'name': 'b', 'email': 'b@example.com', 'level': 5, 'experience': 400, 'friend_ids': []},
+        {'_id': 'c', 'name': 'c', 'email': 'c@example.com', 'level': 1, 'experience': 0, 'friend_ids': ['a', 'b']},
+    ])
+
+
+def test_pipeline_is_one_join_on_id():
+    pipeline = friends_board_pipeline('a')
+    lookup = pipeline[2]['$lookup']
+    assert pipeline[0]['$match']['_id'] == 'a'
+    assert (lookup['localField'], lookup['foreignField']) == ('member_ids', '_id')
+    assert pipeline[-1] == {'$sort': {'level': -1, 'experience': -1}}
+
+
+def test_board_is_ranked_and_cached():
+    users = make_graph()
+    boards = FriendBoards(users)
+    assert [e['name'] for e in boards.leaderboard('c')] == ['b', 'a', 'c']
+    assert boards.friend_emails('c') == ['b@example.com', 'a@example.com']
+    assert users.aggregations == 1
+    assert boards.leaderboard('b') == []
+
+
+def test_xp_change_drops_every_board_showing_the_user():
+    users = make_graph()
+    boards = FriendBoards(users)
+    boards.leaderboard('a')
+    boards.leaderboard('c')
+
+    users.users['a']['level'] = 9
+    boards.invalidate('a')
+    assert [e['name'] for e in boards.leaderboard('c')][0] == 'a'
+    assert [e['name'] for e in boards.leaderboard('a')] == ['a', 'b']
+    assert users.aggregations == 4
+
+    # Unrelated boards stay cached
+    boards.invalidate('c')
+    boards.leaderboard('a')
+    assert users.aggregations == 4
@@ -0,0 +1,27 @@
+from collections import Counter
+
+from catalog import Catalog
+from gacha import GachaEngine, count_by_name
+
+RARITIES = {5: {'rate': 0.006, 'xp': 1500}, 4: {'rate': 0.05, 'xp': 100}, 3: {'rate': 0.944, 'xp': 15}}
+CATALOG = Catalog(RARITIES, {5: ['King', 'Angel'], 4: ['Snow'], 3: ['White', 'Brown']})
+
+
+def test_seeded_engines_roll_the_same():
+    first = GachaEngine(CATALOG, seed=42).roll(50)
+    second = GachaEngine(CATALOG, seed=42).roll(50)
+    assert first == second
+    assert len(first) == 50
+
+
+def test_rates_are_respected():
+    results = GachaEngine(CATALOG, seed=7).roll(100000)
+    by_stars = Counter(r['stars'] for r in results)
+    assert 0.93 < by_stars[3] / 100000 < 0.96
+    assert 0.04 < by_stars[4] / 100000 < 0.06
+    assert by_stars[5] < 1000
+
+
+def test_count_by_name():
+    rolls = [{'name': 'Tan', 'stars': 3}, {'name': 'Tan', 'stars': 3}, {'name': 'King', 'stars': 5}]
+    assert count_by_name(rolls) == {'Tan': 2, 'King': 1}
@@ -0,0 +1,118 @@
+import time
+
+import pytest
+import rsa
+from google.auth import crypt, jwt
+
+from google_verifier import GoogleTokenVerifier, HTTPKeySource, StaticKeySource, cache_lifetime
+
+CLIENT_ID = 'test-client.apps.googleusercontent.com'
+
+
+class LocalIssuer:
+    """Stand-in for accounts.google.com that signs tokens with a local key"""
+
+    def __init__(self, kid='test-key'):
+        public_key, private_key = rsa.newkeys(1024)
+        self.signer = crypt.RSASigner.from_string(private_key.save_pkcs1(), key_id=kid)
+        self.certs = {kid: public_key.save_pkcs1().decode()}
+
+    def mint(self, **claims):
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com',
+            'aud': CLIENT_ID,
+            'sub': '1234',
+            'email': 'pom@example.com',
+            'iat': now,
+            'exp': now + 3600,
+        }
+        payload.update(claims)
+        return jwt.encode(self.signer, payload)
+
+
+@pytest.fixture(scope='module')
+def issuer():
+    return LocalIssuer()
+
+
+def test_verifies_locally_signed_token(issuer):
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=StaticKeySource(issuer.certs))
+    idinfo = verifier.verify(issuer.mint())
+    assert idinfo['sub'] == '1234'
+    assert idinfo['email'] == 'pom@example.com'
+
+
+def test_rejects_wrong_audience(issuer):
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=StaticKeySource(issuer.certs))
+    with pytest.raises(ValueError):
+        verifier.verify(issuer.mint(aud='someone-else'))
+
+
+def test_rejects_wrong_issuer(issuer):
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=StaticKeySource(issuer.certs))
+    with pytest.raises(ValueError):
+        verifier.verify(issuer.mint(iss='evil.example.com'))
+
+
+def test_refetches_keys_for_unknown_kid(issuer):
+    calls = []
+
+    def key_source(force=False):
+        calls.append(force)
+        return issuer.certs if force else {}
+
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=key_source)
+    verifier.verify(issuer.mint())
+    assert calls == [False, True]
+
+
+def test_cache_lifetime_honours_max_age():
+    assert cache_lifetime({'Cache-Control': 'public, max-age=19845, must-revalidate'}) == 19845
+    assert cache_lifetime({'Cache-Control': 'max-age=100', 'Age': '40'}) == 60
+
+
+class CertsSession:
+    """requests.Session stand-in that serves certs and counts requests"""
+
+    headers = {'Cache-Control': 'max-age=3600'}
+
+    def __init__(self, certs):
+        self.certs = certs
+        self.requests_made = 0
+
+    def get(self, url, timeout):
+        self.requests_made += 1
+        return self
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.certs
+
+
+def test_http_key_source_reuses_cached_certs(issuer):
+    session = CertsSession(issuer.certs)
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=HTTPKeySource(session=session))
+    for _ in range(3):
+        verifier.verify(issuer.mint())
+    assert session.requests_made == 1
+
+
+def test_unknown_kids_refetch_at_most_once_a_minute(issuer):
+    session = CertsSession(issuer.certs)
+    key_source = HTTPKeySource(session=session)
+    verifier = GoogleTokenVerifier(CLIENT_ID, key_source=key_source)
+    verifier.verify(issuer.mint())
+
+    forged = LocalIssuer(kid='made-up').mint()
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            verifier.verify(forged)
+    assert session.requests_made == 1
+
+    key_source._fetched_at -= 61
+    with pytest.raises(ValueError):
+        verifier.verify(forged)
+    assert session.requests_made == 2
@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from PIL import Image
+
+from images import ImageStore, ImageTooLarge, prepare_image
+
+
+def encode(width, height, image_format='PNG'):
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), 'orange').save(out, format=image_format)
+    return out.getvalue()
+
+
+class FakeFS:
+    def __init__(self):
+        self.files = {}
+
+    def exists(self, file_id):
+        return file_id in self.files
+
+    def put(self, data, _id, content_type):
+        self.files[_id] = (data, content_type)
+
+
+def test_small_images_are_stored_as_uploaded():
+    data = encode(800, 600)
+    assert prepare_image(data) == (data, 'image/png')
+
+
+def test_large_images_are_downscaled_to_a_standard_width():
+    data, mimetype = prepare_image(encode(4000, 2000, 'JPEG'), max_width=1280)
+    assert mimetype == 'image/jpeg'
+    assert Image.open(io.BytesIO(data)).size == (1280, 640)
+
+    data, _ = prepare_image(encode(4000, 2000))
+    assert Image.open(io.BytesIO(data)).size == (2560, 1280)
+
+
+def test_non_images_are_rejected():
+    with pytest.raises(ValueError):
+        prepare_image(b'<svg></svg>')
+
+
+def test_decompression_bombs_are_rejected(monkeypatch):
+    monkeypatch.setattr(Image, 'MAX_IMAGE_PIXELS', 1000)
+    with pytest.raises(ValueError):
+        prepare_image(encode(100, 100))
+
+
+def test_identical_uploads_are_stored_once():
+    fs = FakeFS()
+    store = ImageStore(lambda: None, max_bytes=1024)
+    store._fs = (None, fs)
+
+    first = store.put(b'same bytes', 'image/png')
+    assert store.put(b'same bytes', 'image/png') == first
+    assert len(fs.files) == 1
+
+    with pytest.raises(ImageTooLarge):
+        store.put(b'x' * 2048, 'image/png')
@@ -0,0 +1,57 @@
+from pymongo.errors import OperationFailure
+
+from indexes import INDEXES, Index, IndexBootstrap, ensure_indexes, index_name, winning_stages
+
+
+class FakeCollection:
+    def __init__(self, name, created, conflicts):
+        self.name = name
+        self.created = created
+        self.conflicts = conflicts
+
+    def create_index(self, keys, name, **options):
+        if name in self.conflicts:
+            raise OperationFailure('already exists with different options')
+        self.created.append((self.name, name, options))
+
+
+class FakeDatabase:
+    def __init__(self, conflicts=()):
+        self.created = []
+        self.conflicts = conflicts
+
+    def __getitem__(self, name):
+        return FakeCollection(name, self.created, self.conflicts)
+
+
+def test_registry_covers_the_route_queries():
+    names = {(index.collection, index_name(index.keys)) for index in INDEXES}
+    assert ('users', 'google_id_1') in names
+    assert ('users', 'level_-1_experience_-1') in names
+    assert ('tasks', 'user_id_1_start_1__id_1') in names
+    assert ('pomodoro_sessions', 'user_id_1_completed_at_-1__id_-1') in names
+
+
+def test_ensure_indexes_reports_conflicts():
+    database = FakeDatabase(conflicts={'email_1'})
+    indexes = [Index('users', [('google_id', 1)], {'unique': True}), Index('users', [('email', 1)], {})]
+    assert ensure_indexes(database, indexes) == ['email_1']
+    assert database.created == [('users', 'google_id_1', {'unique': True})]
+
+
+def test_bootstrap_runs_once_per_process():
+    runs = []
+    bootstrap = IndexBootstrap(lambda: runs.append(1), mode='blocking')
+    bootstrap()
+    bootstrap()
+    assert runs == [1]
+
+    IndexBootstrap(lambda: runs.append(2), mode='off')()
+    assert runs == [1]
+
+
+def test_winning_stages_finds_collection_scans():
+    plan = {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}
+    assert winning_stages(plan) == ['SORT', 'COLLSCAN']
+    plan = {'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN'}, {'stage': 'IXSCAN'}]}
+    assert 'COLLSCAN' not in winning_stages(plan)
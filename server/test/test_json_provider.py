@@ -0,0 +1,52 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import orjson
+import pytest
+from bson.decimal128 import Decimal128
+from bson.objectid import ObjectId
+from flask import Flask, jsonify
+
+from json_provider import MongoJSONProvider, dumps_bytes
+from pagination import ndjson_lines
+
+
+def test_mongo_types_are_serialized():
+    _id = ObjectId()
+    doc = {
+        '_id': _id,
+        'start': datetime(2026, 3, 1, 9, 30),
+        'end': datetime(2026, 3, 1, 10, 0, tzinfo=timezone.utc),
+        'price': Decimal128('12.50'),
+        'ratio': Decimal('0.25'),
+        'collection': {1: 'int keys are allowed'}
+    }
+    assert orjson.loads(dumps_bytes(doc)) == {
+        '_id': str(_id),
+        'start': '2026-03-01T09:30:00+00:00',
+        'end': '2026-03-01T10:00:00+00:00',
+        'price': '12.50',
+        'ratio': '0.25',
+        'collection': {'1': 'int keys are allowed'}
+    }
+
+
+def test_unknown_types_still_fail():
+    with pytest.raises(TypeError):
+        dumps_bytes({'value': object()})
+
+
+def test_jsonify_and_ndjson_use_the_provider():
+    app = Flask(__name__)
+    app.json = MongoJSONProvider(app)
+    _id = ObjectId()
+
+    with app.app_context():
+        response = jsonify({'task': {'_id': _id, 'start': datetime(2026, 3, 1)}})
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == {'task': {'_id': str(_id), 'start': '2026-03-01T00:00:00+00:00'}}
+
+        # Documents are streamed as read, without converting their _id first
+        doc = {'_id': _id}
+        assert list(ndjson_lines([doc], app.json.dumps)) == [f'{{"_id":"{_id}"}}\n']
+        assert doc['_id'] == _id
@@ -0,0 +1,65 @@
+from leaderboard import Leaderboard, mask_email
+
+
+class FakeUsers:
+    """Just enough of a pymongo collection for the leaderboard queries"""
+
+    def __init__(self, users):
+        self.users = users
+        self.finds = 0
+
+    def find(self, query, projection):
+        self.finds += 1
+        self._result = list(self.users)
+        return self
+
+    def sort(self, keys):
+        self._result.sort(key=lambda u: (-u.get('level', 1), -u.get('experience', 0)))
+        return self
+
+    def limit(self, n):
+        return iter(self._result[:n])
+
+    def count_documents(self, query):
+        level = query['$or'][0]['level']['$gt']
+        experience = query['$or'][1]['experience']['$gt']
+        return sum(1 for u in self.users
+                   if u['level'] > level or (u['level'] == level and u['experience'] > experience))
+
+
+def make_users(n):
+    return [{'_id': i, 'name': f'u{i}', 'email': f'u{i}@example.com', 'picture': '',
+             'level': 1 + i // 2, 'experience': i * 50} for i in range(n)]
+
+
+def test_mask_email():
+    assert mask_email('pom@example.com') == 'p***@example.com'
+    assert mask_email('nope') == '***'
+
+
+def test_snapshot_is_loaded_once_and_ordered():
+    users = FakeUsers(make_users(10))
+    board = Leaderboard(users, size=3, dumps=lambda body: body)
+    body = board.response_body()
+    board.response_body()
+    assert users.finds == 1
+    assert [e['name'] for e in body['leaderboard']] == ['u9', 'u8', 'u7']
+    assert body['leaderboard'][0]['email_display'] == 'u***@example.com'
+
+
+def test_xp_change_moves_user_into_top():
+    users = FakeUsers(make_users(10))
+    board = Leaderboard(users, size=3, dumps=lambda body: body)
+    board.response_body()
+    climber = dict(users.users[0], level=50, experience=5000)
+    board.record_xp_change(climber)
+    assert [e['name'] for e in board.response_body()['leaderboard']] == ['u0', 'u9', 'u8']
+    assert users.finds == 1
+
+
+def test_rank_inside_and_outside_snapshot():
+    users = FakeUsers(make_users(10))
+    board = Leaderboard(users, size=3, dumps=lambda body: body)
+    assert board.rank_of(users.users[9]) == 1
+    assert board.rank_of(users.users[7]) == 3
+    assert board.rank_of(users.users[2]) == 8
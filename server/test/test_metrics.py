@@ -0,0 +1,56 @@
+from types import SimpleNamespace
+
+from werkzeug.routing import Map, Rule
+
+from metrics import BACKGROUND_ROUTE, CommandMetrics, Histogram, Metrics
+
+
+def command_event(name, request_id, micros=0, collection='users'):
+    return SimpleNamespace(command_name=name, request_id=request_id,
+                           command={name: collection}, duration_micros=micros)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram((0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value)
+    assert histogram.samples('latency', 'route="/x"') == [
+        'latency_bucket{route="/x",le="0.1"} 2',
+        'latency_bucket{route="/x",le="1"} 3',
+        'latency_bucket{route="/x",le="+Inf"} 4',
+        'latency_sum{route="/x"} 3.65',
+        'latency_count{route="/x"} 4'
+    ]
+
+
+def test_routes_are_preallocated():
+    metrics = Metrics()
+    metrics.register_routes(Map([Rule('/api/points', methods=['GET'])]))
+    assert ('GET', '/api/points') in metrics.routes
+    assert 'pomtime_request_duration_seconds_count{method="GET",route="/api/points"} 0' \
+        in metrics.render()
+
+
+def test_commands_are_counted_per_request(capsys):
+    metrics = Metrics(slow_request_ms=0)
+    listener = CommandMetrics(metrics)
+
+    metrics.start('GET', '/api/dashboard')
+    listener.started(command_event('find', 1))
+    listener.started(command_event('find', 2, collection='tasks'))
+    listener.succeeded(command_event('find', 2, micros=3000))
+    listener.succeeded(command_event('find', 1, micros=1000))
+    metrics.finish(200, '/api/dashboard')
+
+    route = metrics.routes[('GET', '/api/dashboard')]
+    assert route.statuses[2] == 1
+    assert route.round_trips.sum == 2
+    assert route.commands['find'].counts[2] == 1  # 1ms
+    log = capsys.readouterr().out
+    assert 'GET /api/dashboard 200' in log
+    assert '2 DB commands in 4.0ms: find tasks 3.0ms, find users 1.0ms' in log
+
+    # Outside a request (e.g. the session sweeper)
+    listener.succeeded(command_event('delete', 3, micros=500))
+    assert 'delete' in metrics.background.commands
+    assert f'route="{BACKGROUND_ROUTE}",command="delete"' in metrics.render()
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+from pymongo import monitoring
+from pymongo.read_preferences import SecondaryPreferred
+
+import mongo
+from mongo import Mongo, PoolStats, client_options
+
+
+def test_client_options_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('MONGO_MAX_POOL_SIZE', '25')
+    monkeypatch.setenv('MONGO_COMPRESSORS', 'zlib')
+    options = client_options()
+    assert options['maxPoolSize'] == 25
+    assert options['compressors'] == 'zlib'
+    assert options['waitQueueTimeoutMS'] == 2000
+    assert 'socketTimeoutMS' not in options
+
+
+def test_pool_stats():
+    stats = PoolStats()
+    for _ in range(3):
+        stats.connection_created(None)
+        stats.connection_checked_out(None)
+    stats.connection_checked_in(None)
+    stats.connection_check_out_failed(
+        SimpleNamespace(reason=monitoring.ConnectionCheckOutFailedReason.TIMEOUT)
+    )
+    assert stats.snapshot(max_pool_size=4) == {
+        'open': 3, 'checked_out': 2, 'max_checked_out': 3,
+        'checkout_failures': 1, 'pool_timeouts': 1, 'utilization': 0.5
+    }
+
+
+def test_client_is_lazy_and_rebuilt_after_fork(monkeypatch):
+    db = Mongo('mongodb://localhost:27017', 'PomTimeTest')
+    users = db.collection('users')
+    readonly_users = db.collection('users', readonly=True)
+    assert db._client is None
+
+    assert users.name == 'users'
+    assert isinstance(readonly_users.read_preference, SecondaryPreferred)
+    first = db.client
+
+    monkeypatch.setattr(mongo.os, 'getpid', lambda: -1)
+    assert db.client is not first
+    assert users.database.client is db.client
+    first.close()
+    db.client.close()
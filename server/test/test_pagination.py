@@ -0,0 +1,48 @@
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+
+from pagination import decode_cursor, encode_cursor, keyset_filter, paginate, parse_limit
+
+
+def make_docs(n):
+    return [{'_id': ObjectId(), 'start': datetime(2025, 1, day)} for day in range(1, n + 1)]
+
+
+def test_cursor_round_trip():
+    doc = make_docs(1)[0]
+    assert decode_cursor(encode_cursor(doc, 'start')) == (doc['start'], doc['_id'])
+
+
+def test_bad_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor('not-a-cursor')
+
+
+def test_keyset_filter_breaks_ties_on_id():
+    doc = make_docs(1)[0]
+    clause = keyset_filter('start', encode_cursor(doc, 'start'), descending=True)
+    assert clause == {'$or': [
+        {'start': {'$lt': doc['start']}},
+        {'start': doc['start'], '_id': {'$lt': doc['_id']}}
+    ]}
+
+
+def test_paginate_stops_at_limit_with_next_cursor():
+    docs = make_docs(3)
+    page = list(paginate(iter(docs), 2, 'start'))
+    assert page[:2] == docs[:2]
+    assert decode_cursor(page[2]['next_cursor']) == (docs[1]['start'], docs[1]['_id'])
+
+
+def test_paginate_last_page_has_no_cursor():
+    docs = make_docs(2)
+    assert list(paginate(iter(docs), 2, 'start')) == docs
+    assert list(paginate(iter(docs), None, 'start')) == docs
+
+
+def test_parse_limit_clamps():
+    assert parse_limit(None, 50, 500) == 50
+    assert parse_limit('0', 50, 500) == 1
+    assert parse_limit('9999', 50, 500) == 500
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from bson.objectid import ObjectId
+
+from recurrence import (
+    DAILY, is_occurrence, merge_occurrences, occurrence_id, occurrence_ids, occurrences,
+    parse_rule, parse_task_id
+)
+
+# A Monday
+START = datetime(2026, 1, 5, 9, 0)
+
+
+def rule(**options):
+    return dict(DAILY, **options)
+
+
+def test_daily_occurrences_only_cover_the_window():
+    window = list(occurrences(rule(), START, datetime(2026, 3, 1), datetime(2026, 3, 4)))
+    assert window == [datetime(2026, 3, d, 9, 0) for d in (1, 2, 3)]
+
+    # Nothing before the series starts, nothing after `until` (inclusive)
+    assert list(occurrences(rule(until=datetime(2026, 1, 6, 9, 0)), START,
+                            datetime(2025, 12, 1), datetime(2026, 2, 1))) \
+        == [START, START + timedelta(days=1)]
+
+
+def test_interval_and_weekday_masks():
+    every_other_day = occurrences(rule(interval=2), START, datetime(2026, 1, 6), datetime(2026, 1, 10))
+    assert [d.day for d in every_other_day] == [7, 9]
+
+    weekdays = occurrences(rule(weekdays=[0, 1, 2, 3, 4]), START, START, datetime(2026, 1, 13))
+    assert [d.day for d in weekdays] == [5, 6, 7, 8, 9, 12]
+
+    biweekly = occurrences(rule(freq='weekly', interval=2, weekdays=[1, 3]), START,
+                           datetime(2026, 1, 6), datetime(2026, 2, 1))
+    assert [d.day for d in biweekly] == [6, 8, 20, 22]
+
+
+def test_parse_rule():
+    assert parse_rule({'recurring': True}) == DAILY
+    assert parse_rule({'recurring': False}) is None
+    assert parse_rule({'recurrence': {'freq': 'weekly', 'weekdays': [4, 0, 4],
+                                      'until': '2026-02-01T00:00:00Z'}}) == {
+        'freq': 'weekly', 'interval': 1, 'weekdays': [0, 4], 'until': datetime(2026, 2, 1)
+    }
+    for bad in ({'freq': 'hourly'}, {'interval': 0}, {'weekdays': [7]}, {'weekdays': []}):
+        with pytest.raises(ValueError):
+            parse_rule({'recurrence': bad})
+
+
+def test_occurrence_ids_round_trip():
+    series_id = ObjectId()
+    occurrence = datetime(2026, 3, 1, 9, 0)
+    assert parse_task_id(occurrence_id(series_id, occurrence)) == (series_id, occurrence)
+    assert parse_task_id(str(series_id)) == (series_id, None)
+    assert is_occurrence(DAILY, START, occurrence)
+    assert not is_occurrence(DAILY, START, occurrence + timedelta(hours=1))
+    with pytest.raises(ValueError):
+        parse_task_id(f'{series_id}_tomorrow')
+
+
+def test_stored_tasks_and_occurrences_are_merged_in_order():
+    series = {
+        '_id': ObjectId(), 'title': 'Stretch', 'start': START, 'end': START + timedelta(minutes=15),
+        'recurrence': rule(), 'completed_occurrences': [datetime(2026, 3, 2, 9, 0)]
+    }
+    stored = [{'_id': ObjectId(), 'title': 'Dentist', 'start': datetime(2026, 3, 2, 12, 0)}]
+    window = {'$gte': datetime(2026, 3, 1, tzinfo=timezone.utc), '$lt': datetime(2026, 3, 4, tzinfo=timezone.utc)}
+
+    docs = list(occurrence_ids(merge_occurrences(stored, [series], window)))
+    assert [doc['title'] for doc in docs] == ['Stretch', 'Stretch', 'Dentist', 'Stretch']
+    assert [doc['completed'] for doc in docs if doc['title'] == 'Stretch'] == [False, True, False]
+    assert docs[0]['_id'] == f"{series['_id']}_20260301T090000"
+    assert docs[0]['end'] == datetime(2026, 3, 1, 9, 15)
+
+    # Resuming after a cursor skips what was already returned
+    after = (datetime(2026, 3, 2, 9, 0), series['_id'])
+    docs = list(merge_occurrences(stored, [series], window, after))
+    assert [doc['start'].day for doc in docs] == [2, 3]
@@ -0,0 +1,163 @@
+import hashlib
+import time
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+from cache import TTLCache
+from session_store import MemorySessionStore, MongoSessionStore, SessionStore
+
+
+def make_session(email, days=7):
+    return {
+        'user_id': 'u-' + email,
+        'email': email,
+        'name': 'Test',
+        'picture': '',
+        'expires': datetime.utcnow() + timedelta(days=days)
+    }
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+    assert cache.get('a') == 1
+    assert cache.get('b') is None
+    assert cache.get('c') == 3
+
+
+def test_cache_expires_entries():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set('a', 1, ttl=0.01)
+    cache.set('b', 2, ttl=-5)
+    time.sleep(0.02)
+    assert cache.get('a') is None
+    assert cache.get('b') is None
+    assert len(cache) == 0
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(SessionStore):
+        def get(self, token):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+def test_memory_store_round_trip():
+    store = MemorySessionStore()
+    store.save('tok', make_session('a@example.com'))
+    assert store.get('tok')['email'] == 'a@example.com'
+    store.delete('tok')
+    assert store.get('tok') is None
+
+
+def test_memory_store_drops_expired_sessions():
+    store = MemorySessionStore()
+    store.save('old', make_session('a@example.com', days=-1))
+    assert store.get('old') is None
+
+
+def test_memory_store_delete_by_email():
+    store = MemorySessionStore()
+    store.save('t1', make_session('a@example.com'))
+    store.save('t2', make_session('a@example.com'))
+    store.save('t3', make_session('b@example.com'))
+    assert store.delete_by_email('a@example.com') == 2
+    assert store.get('t1') is None
+    assert store.get('t3') is not None
+
+
+def test_memory_store_delete_by_user():
+    store = MemorySessionStore()
+    store.save('t1', make_session('a@example.com'))
+    store.save('t2', make_session('b@example.com'))
+    assert store.delete_by_user('u-a@example.com') == 1
+    assert store.get('t1') is None
+    assert store.get('t2') is not None
+
+
+def test_sweep_purges_in_batches():
+    store = MemorySessionStore(max_ttl=0.01)
+    for i in range(5):
+        store.save(f't{i}', make_session(f'{i}@example.com'))
+    time.sleep(0.02)
+    assert store.sweep(limit=3) == 3
+    assert store.sweep(limit=3) == 2
+    assert store._by_email == {}
+
+
+def mongo_stores(count=2, cache_ttl=30):
+    """Stores of `count` workers sharing one sessions collection"""
+    collection = mongomock.MongoClient()['PomTimeDB']['sessions']
+    return [MongoSessionStore(collection, cache_ttl=cache_ttl) for _ in range(count)]
+
+
+def test_mongo_store_keeps_only_token_digests():
+    store, other_worker = mongo_stores()
+    store.save('secret-token', make_session('a@example.com'))
+
+    [doc] = store.collection.find()
+    assert doc['_id'] == hashlib.sha256(b'secret-token').hexdigest()
+    assert 'secret-token' not in str(doc)
+    # Any worker can look the session up by its token
+    assert other_worker.get('secret-token')['email'] == 'a@example.com'
+    assert '_id' not in other_worker.get('secret-token')
+    assert other_worker.get('guessed-token') is None
+
+
+def test_mongo_store_serves_reads_from_its_cache():
+    store, other_worker = mongo_stores()
+    store.save('tok', make_session('a@example.com'))
+    assert store.peek('tok') is not None
+    assert other_worker.peek('tok') is None
+
+    other_worker.get('tok')
+    store.collection.delete_many({})
+    # Logged out elsewhere: still cached here until the entry ages out
+    assert other_worker.get('tok') is not None
+    assert other_worker.peek('tok') is not None
+
+
+def test_mongo_store_cache_entries_age_out():
+    store, other_worker = mongo_stores(cache_ttl=0.01)
+    store.save('tok', make_session('a@example.com'))
+    other_worker.get('tok')
+    store.delete('tok')
+    assert other_worker.get('tok') is not None
+
+    time.sleep(0.02)
+    assert other_worker.get('tok') is None
+
+
+def test_mongo_store_expired_sessions_are_not_cached_and_get_swept():
+    store, = mongo_stores(count=1)
+    store.save('old', make_session('a@example.com', days=-1))
+    store.save('new', make_session('b@example.com'))
+
+    # The TTL index hasn't removed it yet; require_auth checks 'expires'
+    assert store.peek('old') is None
+    assert store.get('old')['expires'] < datetime.utcnow()
+    assert store.peek('old') is None
+
+    assert store.sweep() == 1
+    assert store.get('old') is None
+    assert store.get('new') is not None
+
+
+def test_mongo_store_delete_by_user_reaches_the_database_and_cache():
+    store, other_worker = mongo_stores()
+    store.save('t1', make_session('a@example.com'))
+    store.save('t2', make_session('a@example.com'))
+    store.save('t3', make_session('b@example.com'))
+
+    assert store.delete_by_user('u-a@example.com') == 2
+    assert store.peek('t1') is None
+    assert other_worker.get('t2') is None
+    assert other_worker.get('t3') is not None
+    assert store.collection.count_documents({}) == 1
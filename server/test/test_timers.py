@@ -0,0 +1,87 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from timers import PAUSED, RUNNING, TimerScheduler, epoch, timer_body
+
+# Far enough ahead that the scheduler thread never fires during these tests
+LATER = time.time() + 3600
+
+
+def test_due_timers_pop_in_expiry_order():
+    scheduler = TimerScheduler(on_expire=None)
+    scheduler.schedule('b', LATER + 20, 1)
+    scheduler.schedule('a', LATER + 10, 1)
+    scheduler.schedule('c', LATER + 30, 1)
+
+    assert scheduler.pop_due(LATER + 5) == []
+    assert scheduler.pop_due(LATER + 25) == [('a', 1), ('b', 1)]
+    assert len(scheduler) == 1
+
+
+def test_paused_and_restarted_timers_skip_their_old_entries():
+    scheduler = TimerScheduler(on_expire=None)
+    scheduler.schedule('paused', LATER + 10, 1)
+    scheduler.cancel('paused')
+    scheduler.schedule('restarted', LATER + 10, 1)
+    scheduler.schedule('restarted', LATER + 50, 2)
+
+    assert scheduler.pop_due(LATER + 20) == []
+    assert scheduler.pop_due(LATER + 60) == [('restarted', 2)]
+
+
+def test_cancelled_entries_are_compacted():
+    scheduler = TimerScheduler(on_expire=None)
+    for n in range(1000):
+        scheduler.schedule(f'user-{n}', LATER + n, 1)
+    for n in range(900):
+        scheduler.cancel(f'user-{n}')
+    assert len(scheduler) == 100
+    assert len(scheduler._heap) <= 200
+    assert [user_id for user_id, _ in scheduler.pop_due(LATER + 1000)] == [f'user-{n}' for n in range(900, 1000)]
+
+
+def test_scheduler_thread_fires_expired_and_loaded_timers():
+    fired = []
+    done = threading.Event()
+
+    def on_expire(user_id, generation):
+        fired.append((user_id, generation))
+        if len(fired) == 2:
+            done.set()
+
+    # A timer that was running before a restart, and one started since
+    scheduler = TimerScheduler(on_expire, loader=lambda: [('loaded', time.time() + 0.05, 3)])
+    scheduler.schedule('new', time.time() + 0.01, 1)
+
+    assert done.wait(2)
+    assert sorted(fired) == [('loaded', 3), ('new', 1)]
+    assert scheduler.fired == 2
+
+
+def test_loader_runs_again_to_take_over_orphaned_timers():
+    fired = threading.Event()
+    sweeps = []
+
+    def loader():
+        sweeps.append(1)
+        # Nothing to take over at first; a worker dies in between
+        return [('orphan', time.time() - 1, 4)] if len(sweeps) == 2 else []
+
+    scheduler = TimerScheduler(lambda user_id, generation: fired.set(), loader=loader, load_interval=0.05)
+    scheduler.start()
+
+    assert fired.wait(2)
+    assert scheduler.fired == 1
+
+
+def test_timer_body():
+    now = datetime(2026, 3, 1, 9, 0)
+    running = {'state': RUNNING, 'label': 'Focus', 'duration_seconds': 1500, 'started_at': now,
+               'expires_at': now + timedelta(seconds=1500)}
+    assert timer_body(running, now + timedelta(seconds=600))['remaining_seconds'] == 900
+    assert timer_body(running, now + timedelta(hours=1))['remaining_seconds'] == 0
+
+    paused = dict(running, state=PAUSED, remaining_seconds=42.5, expires_at=None)
+    assert timer_body(paused, now + timedelta(hours=1))['remaining_seconds'] == 42.5
+    assert epoch(datetime(1970, 1, 1, 0, 1)) == 60
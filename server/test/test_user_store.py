@@ -0,0 +1,125 @@
+import contextvars
+
+from bson.objectid import ObjectId
+from flask import Flask
+
+from profile_cache import MemoryProfileCache
+from user_store import PROFILE_PROJECTION, AsyncUserStore, RoundTripCounter, UserStore, reset_round_trips, round_trips
+
+USER_ID = ObjectId()
+
+
+class FakeUsers:
+    """Records the projection of every find_one"""
+
+    def __init__(self, user):
+        self.user = user
+        self.projections = []
+
+    def find_one(self, query, projection):
+        self.projections.append(projection)
+        if query['_id'] != self.user['_id']:
+            return None
+        if any(projection.values()):
+            return {k: v for k, v in self.user.items() if k in projection or k == '_id'}
+        return {k: v for k, v in self.user.items() if k not in projection}
+
+
+def make_store():
+    return UserStore(FakeUsers({
+        '_id': USER_ID, 'points': 12, 'collection': {'King': 1},
+        'settings': {'dark_mode': True}, 'friend_ids': [ObjectId()]
+    }))
+
+
+def test_accessors_fetch_only_their_fields():
+    store = make_store()
+    with Flask(__name__).test_request_context():
+        assert store.points(USER_ID) == 12
+        assert store.displayed_characters(USER_ID) == []
+    assert store.collection.projections == [
+        {'points': 1},
+        {'points': 1, 'displayed_characters': 1}
+    ]
+
+
+def test_user_is_memoized_within_a_request():
+    store = make_store()
+    app = Flask(__name__)
+    with app.test_request_context():
+        store.collection_of(USER_ID)
+        store.collection_of(USER_ID)
+        store.get(USER_ID, ('collection',))
+        assert len(store.collection.projections) == 1
+
+        user = store.get(USER_ID)
+        assert 'friend_ids' not in user
+        store.settings(USER_ID)
+        assert len(store.collection.projections) == 2
+
+    with app.test_request_context():
+        store.collection_of(USER_ID)
+        assert len(store.collection.projections) == 3
+
+
+def test_missing_user():
+    store = make_store()
+    with Flask(__name__).test_request_context():
+        assert store.points(ObjectId()) is None
+        assert not store.exists(ObjectId())
+
+
+def test_round_trips_are_counted_per_context():
+    counter = RoundTripCounter()
+
+    def request():
+        reset_round_trips()
+        counter.started(None)
+        counter.started(None)
+        return round_trips()
+
+    assert contextvars.copy_context().run(request) == 2
+    assert contextvars.copy_context().run(request) == 2
+
+
+def test_profile_fields_are_cached_across_requests():
+    store = make_store()
+    store.cache = MemoryProfileCache(ttl=60)
+    app = Flask(__name__)
+    with app.test_request_context():
+        assert store.points(USER_ID) == 12
+    with app.test_request_context():
+        assert store.collection_of(USER_ID) == {'King': 1}
+        assert store.settings(USER_ID) == {'dark_mode': True}
+    assert store.collection.projections == [PROFILE_PROJECTION]
+    assert store.cache.stats()['hits'] == 1
+
+    # Writes either refresh the cached profile or drop it
+    with app.test_request_context():
+        store.write_through(USER_ID, {'_id': USER_ID, 'points': 3, 'name': 'not cached'})
+        assert store.points(USER_ID) == 3
+        assert 'name' not in store.get(USER_ID, ('points',))
+        store.invalidate(USER_ID)
+        assert store.points(USER_ID) == 12
+    assert len(store.collection.projections) == 2
+
+
+def test_async_store_shares_the_profile_cache():
+    import asyncio
+
+    class AsyncUsers:
+        def __init__(self, users):
+            self.users = users
+
+        async def find_one(self, query, projection):
+            return await asyncio.to_thread(self.users.find_one, query, projection)
+
+    store = make_store()
+    store.cache = MemoryProfileCache(ttl=60)
+    async_store = AsyncUserStore(AsyncUsers(store.collection), cache=store.cache)
+
+    assert asyncio.run(async_store.profile(USER_ID))['points'] == 12
+    with Flask(__name__).test_request_context():
+        store.write_through(USER_ID, {'_id': USER_ID, 'points': 4})
+    assert asyncio.run(async_store.profile(USER_ID))['points'] == 4
+    assert store.collection.projections == [PROFILE_PROJECTION]
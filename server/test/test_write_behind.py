@@ -0,0 +1,129 @@
+import os
+from datetime import datetime
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_behind import SpillFile, WriteBehindQueue, read_spill_file
+
+
+class FakeCollection:
+    """Keeps documents by _id and rejects duplicates like a unique _id index"""
+
+    def __init__(self):
+        self.docs = {}
+        self.batches = []
+        self.down = False
+
+    def insert_many(self, docs, ordered=True):
+        if self.down:
+            raise AutoReconnect('connection refused')
+        self.batches.append(len(docs))
+        errors = []
+        for index, doc in enumerate(docs):
+            if doc['_id'] in self.docs:
+                errors.append({'index': index, 'code': 11000, 'errmsg': 'duplicate key'})
+            else:
+                self.docs[doc['_id']] = dict(doc)
+        if errors:
+            raise BulkWriteError({'writeErrors': errors, 'writeConcernErrors': [], 'nInserted': 0})
+
+    def insert_one(self, doc):
+        self.docs[doc['_id']] = dict(doc)
+
+
+def history_row(n):
+    return {'user_id': f'user-{n}', 'duration_minutes': 25, 'completed_at': datetime(2026, 3, 1, 9, n % 60)}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = WriteBehindQueue(FakeCollection(), str(tmp_path), batch_size=3, flusher=False)
+    yield queue
+    queue.close()
+
+
+def spill_files(queue):
+    return sorted(name for name in os.listdir(queue.spill_dir) if name.endswith('.ndjson'))
+
+
+def test_rows_are_spilled_then_written_in_batches(queue):
+    for n in range(7):
+        queue.put(history_row(n))
+
+    [name] = spill_files(queue)
+    spilled = read_spill_file(os.path.join(queue.spill_dir, name))
+    assert [doc['user_id'] for doc in spilled] == [f'user-{n}' for n in range(7)]
+    assert spilled[0]['completed_at'] == datetime(2026, 3, 1, 9, 0)
+    assert isinstance(spilled[0]['_id'], ObjectId)
+
+    assert queue.flush() == 7
+    assert queue.collection.batches == [3, 3, 1]
+    assert len(queue.collection.docs) == 7
+    # Only the (empty) file for rows queued from now on is left
+    assert len(spill_files(queue)) == 1
+    assert queue.stats()['pending'] == 0
+
+
+def test_failed_flush_keeps_rows_for_the_next_one(queue):
+    for n in range(4):
+        queue.put(history_row(n))
+    queue.collection.down = True
+    with pytest.raises(AutoReconnect):
+        queue.flush()
+    queue.put(history_row(4))
+    assert queue.stats()['pending'] == 5
+    assert len(spill_files(queue)) == 2
+
+    queue.collection.down = False
+    assert queue.flush() == 5
+    assert len(queue.collection.docs) == 5
+    assert queue.stats()['failures'] == 1
+
+
+def test_spill_files_of_dead_processes_are_replayed_once(queue, tmp_path):
+    written = history_row(0)
+    written['_id'] = ObjectId()
+    queue.collection.insert_one(written)
+
+    # A worker that died after spilling two rows, one of them already written
+    orphan = SpillFile(str(tmp_path / '99999-1.ndjson'))
+    orphan.append(written)
+    orphan.append(dict(history_row(1), _id=ObjectId()))
+    orphan.file.close()
+
+    # Replayed when the queue starts, before it opens its own spill file
+    queue.put(history_row(2))
+    assert queue.stats()['recovered'] == 2
+    assert len(queue.collection.docs) == 2
+    assert not (tmp_path / '99999-1.ndjson').exists()
+    assert queue.stats()['pending'] == 1
+
+    # Our own spill file is locked, so it's left alone
+    assert queue.recover() == 0
+    assert len(spill_files(queue)) == 1
+
+
+def test_restarted_worker_with_a_dead_workers_pid_keeps_its_rows(queue, tmp_path):
+    # Containers often hand a restarted worker the pid of the one that died
+    orphan_path = tmp_path / f'{os.getpid()}-1.ndjson'
+    orphan = SpillFile(str(orphan_path))
+    orphan.append(dict(history_row(0), _id=ObjectId()))
+    orphan.file.close()
+
+    queue.put(history_row(1))
+    assert not orphan_path.exists()
+
+    assert queue.flush() == 1
+    assert sorted(doc['user_id'] for doc in queue.collection.docs.values()) == ['user-0', 'user-1']
+
+
+def test_close_flushes_and_later_rows_are_written_directly(queue):
+    queue.put(history_row(0))
+    queue.close()
+    assert len(queue.collection.docs) == 1
+    assert spill_files(queue) == []
+
+    queue.put(history_row(1))
+    assert len(queue.collection.docs) == 2